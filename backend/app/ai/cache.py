@@ -0,0 +1,168 @@
+"""Persistent cache of LLM optimization results.
+
+Amended commits, rebases and hook reruns send the same code with the same
+findings again; a fresh generation costs seconds and tokens for an answer
+we already have. Results are keyed by
+
+    sha256(provider, model, PROMPT_VERSION, mode, language, sha256(code), findings)
+
+where ``mode`` is the output mode actually used (full, patch...) and
+``findings`` is the canonical (sorted) form of exactly the pattern
+fields the prompt shows the model. Entries live in the app's SQLite
+database and expire after ``OPTIMIZATION_CACHE_TTL_SECONDS``; the table is
+also capped at ``OPTIMIZATION_CACHE_MAX_ROWS`` least recently used rows.
+
+Failed generations (provider unavailable, original code returned) are
+never stored. ``bypass`` skips the lookup but still refreshes the entry.
+
+Identical requests that arrive while a generation is running (a CI
+fan-out, several developers pushing the same file) do not start their
+own: ``optimize`` is single-flight on the same key, so they share the one
+in-flight generation and its result. This applies with the cache
+disabled too. ``bypass`` requests share flights only with each other: a
+non-bypass leader may answer from the cache, which a bypass caller must
+not get.
+"""
+
+import dataclasses
+import hashlib
+import json
+
+import aiosqlite
+
+from app.ai.optimizer import run_optimization
+from app.ai.provider import PROMPT_VERSION, AIProvider, OptimizeResult
+from app.config import settings
+from app.db.database import get_cached_optimization, save_cached_optimization
+from app.metrics import OPTIMIZATION_CACHE_LOOKUPS
+from app.models import DetectedPattern
+from app.singleflight import SingleFlight
+
+
+def canonical_findings(patterns: list[DetectedPattern]) -> str:
+    """Order-independent form of the pattern fields used in the prompt."""
+    rows = sorted(
+        (p.line_start, p.line_end, p.name, p.description) for p in patterns
+    )
+    return json.dumps(rows, ensure_ascii=False)
+
+
+class OptimizationCache:
+    def __init__(
+        self, enabled: bool, ttl_seconds: int, max_rows: int, touch_after_seconds: int = 0
+    ):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.max_rows = max_rows
+        # A hit only bumps the row's last_used once it is this old.
+        self.touch_after_seconds = touch_after_seconds
+        self.hits = 0
+        self.misses = 0
+        self._flights: SingleFlight[OptimizeResult] = SingleFlight("optimize")
+
+    @staticmethod
+    def key(
+        provider: str,
+        model: str,
+        code: str,
+        patterns: list[DetectedPattern],
+        language: str,
+        mode: str = "full",
+    ) -> str:
+        h = hashlib.sha256()
+        for part in (provider, model, PROMPT_VERSION, mode, language):
+            h.update(part.encode())
+            h.update(b"\0")
+        h.update(hashlib.sha256(code.encode("utf-8", "surrogatepass")).digest())
+        h.update(canonical_findings(patterns).encode())
+        return h.hexdigest()
+
+    async def get(self, key: str) -> OptimizeResult | None:
+        try:
+            raw = await get_cached_optimization(
+                key, self.ttl_seconds, self.touch_after_seconds
+            )
+        except aiosqlite.Error:
+            # Best-effort, like the analysis cache: fall back to the LLM.
+            return None
+        if raw is None:
+            return None
+        return OptimizeResult(**json.loads(raw))
+
+    async def put(self, key: str, result: OptimizeResult) -> None:
+        if result.failed:
+            return
+        try:
+            await save_cached_optimization(
+                key,
+                json.dumps(dataclasses.asdict(result)),
+                self.ttl_seconds,
+                self.max_rows,
+            )
+        except aiosqlite.Error:
+            pass
+
+    async def lookup(
+        self,
+        provider: AIProvider,
+        provider_name: str,
+        code: str,
+        patterns: list[DetectedPattern],
+        language: str,
+        bypass: bool = False,
+        mode: str = "full",
+    ) -> tuple[str | None, OptimizeResult | None]:
+        """Return ``(key, cached result)``; the key is None when the cache is
+        disabled and the result None on a miss or bypass. Pass the key to
+        ``put`` once a fresh result is available."""
+        if not self.enabled:
+            return None, None
+        key = self.key(provider_name, provider.model, code, patterns, language, mode)
+        if bypass:
+            OPTIMIZATION_CACHE_LOOKUPS.inc(result="bypass")
+            return key, None
+        cached = await self.get(key)
+        if cached is not None:
+            self.hits += 1
+            OPTIMIZATION_CACHE_LOOKUPS.inc(result="hit")
+        else:
+            self.misses += 1
+            OPTIMIZATION_CACHE_LOOKUPS.inc(result="miss")
+        return key, cached
+
+    async def optimize(
+        self,
+        provider: AIProvider,
+        provider_name: str,
+        code: str,
+        patterns: list[DetectedPattern],
+        language: str,
+        bypass: bool = False,
+        mode: str = "full",
+    ) -> OptimizeResult:
+        """Return the cached optimization or run one in ``mode`` (a concrete
+        mode, see ``choose_mode``) and store it; concurrent identical calls
+        share one run."""
+
+        async def run() -> OptimizeResult:
+            key, result = await self.lookup(
+                provider, provider_name, code, patterns, language, bypass, mode
+            )
+            if result is None:
+                result = await run_optimization(provider, code, patterns, language, mode)
+                if key is not None:
+                    await self.put(key, result)
+            return result
+
+        flight = self.key(provider_name, provider.model, code, patterns, language, mode)
+        if bypass:
+            flight += ":bypass"
+        return await self._flights.do(flight, run)
+
+
+optimization_cache = OptimizationCache(
+    enabled=settings.OPTIMIZATION_CACHE_ENABLED,
+    ttl_seconds=settings.OPTIMIZATION_CACHE_TTL_SECONDS,
+    max_rows=settings.OPTIMIZATION_CACHE_MAX_ROWS,
+    touch_after_seconds=settings.OPTIMIZATION_CACHE_TOUCH_SECONDS,
+)
@@ -0,0 +1,238 @@
+"""Map-reduce optimization for files too large for one completion.
+
+Full mode inlines the whole file and asks for all of it back, so a large
+translation unit either overflows the context window or hits the output
+token limit and comes back truncated. Chunked mode instead:
+
+  1. map: cut the file into function-level units around the findings
+     (the outermost enclosing block that fits the per-call budget,
+     signature and decorators included), merging units that overlap;
+  2. optimize every unit in its own completion, concurrently (the
+     provider's limiter still bounds how many are in flight);
+  3. reduce: splice the rewritten units back bottom-up, add any new
+     includes/imports the units asked for after the file's existing ones,
+     and join the per-unit reasoning.
+
+A unit whose completion fails or has no code block keeps its original
+text; the result only counts as failed when every unit does.
+
+Token counts are estimated from character counts (no tokenizer
+dependency); ``fits_full`` uses the same estimate to pick the mode.
+"""
+
+import asyncio
+import math
+import re
+import textwrap
+from dataclasses import dataclass, field
+
+from app.ai.provider import (
+    SYSTEM_PROMPT,
+    _CODE_BLOCK_RE,
+    AIProvider,
+    OptimizeResult,
+    build_optimization_prompt,
+    failed_result,
+    parse_ai_response,
+)
+from app.analyzer.source import SourceModel
+from app.config import settings
+from app.models import DetectedPattern
+
+# Source code averages 3-4 characters per token across tokenizers; the
+# lower end over-estimates, which is the safe side for a budget.
+CHARS_PER_TOKEN = 3.5
+# Chain of thought + changes summary around the code in a response.
+RESPONSE_OVERHEAD_TOKENS = 1024
+# Lines of context added around a finding that sits outside any block.
+CONTEXT_LINES = 3
+
+CHUNK_SYSTEM_PROMPT = SYSTEM_PROMPT.replace(
+    "Return the COMPLETE optimized file, not just snippets",
+    "Return the COMPLETE optimized excerpt you were given, nothing outside it",
+)
+
+_IMPORT_RE = re.compile(r"^\s*(?:#\s*include\b|import\b|from\s+\S+\s+import\b|using\b)")
+_NEW_IMPORTS_RE = re.compile(r"NEW IMPORTS:\s*\n```[\w+#.-]*\n(.*?)```", re.DOTALL)
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def unit_budget() -> int:
+    """Largest unit (in estimated tokens) one completion can rewrite: its
+    echo must fit the output limit, and prompt plus output the context."""
+    by_output = settings.AI_MAX_OUTPUT_TOKENS - RESPONSE_OVERHEAD_TOKENS
+    by_context = (settings.AI_CONTEXT_TOKENS - settings.AI_MAX_OUTPUT_TOKENS) // 2
+    return max(1, min(by_output, by_context))
+
+
+def fits_full(code: str) -> bool:
+    """Whether full-file regeneration fits a single completion."""
+    return estimate_tokens(code) <= unit_budget()
+
+
+@dataclass
+class Unit:
+    start: int  # 1-indexed, inclusive
+    end: int
+    patterns: list[DetectedPattern] = field(default_factory=list)
+
+
+def _header_start(source: SourceModel, line: int) -> int:
+    """Extend a block header upwards over its signature/decorator lines."""
+    while line > 0:
+        above = source.code_lines[line - 1].strip()
+        if source.language == "python":
+            if not above.startswith("@"):
+                break
+        elif not above or above.endswith((";", "{", "}")) or above.startswith("#"):
+            break
+        line -= 1
+    return line
+
+
+def function_units(
+    code: str, patterns: list[DetectedPattern], language: str
+) -> list[Unit]:
+    """Merged, sorted units covering every finding."""
+    source = SourceModel.build(code, language)
+    blocks = source.blocks()
+    budget = unit_budget()
+    spans = []
+    for p in patterns:
+        first = max(0, min(p.line_start, p.line_end) - 1)
+        last = min(len(source) - 1, max(p.line_start, p.line_end) - 1)
+        containing = [
+            (_header_start(source, start), end)
+            for start, end in blocks
+            if start <= first and last <= end
+        ]
+        # Outermost first: the largest enclosing block that still fits.
+        span = None
+        for start, end in containing:
+            text = "\n".join(source.lines[start:end + 1])
+            if estimate_tokens(text) <= budget:
+                span = (start, end)
+                break
+        if span is None:
+            span = containing[-1] if containing else (
+                max(0, first - CONTEXT_LINES),
+                min(len(source) - 1, last + CONTEXT_LINES),
+            )
+        spans.append((span, p))
+
+    units: list[Unit] = []
+    for (start, end), p in sorted(spans, key=lambda s: s[0]):
+        if units and start < units[-1].end:
+            units[-1].end = max(units[-1].end, end + 1)
+            units[-1].patterns.append(p)
+        else:
+            units.append(Unit(start + 1, end + 1, [p]))
+    return units
+
+
+def build_unit_prompt(
+    code_lines: list[str], unit: Unit, language: str
+) -> str:
+    excerpt = "\n".join(code_lines[unit.start - 1:unit.end])
+    offset = unit.start - 1
+    local = [
+        p.model_copy(update={
+            "line_start": p.line_start - offset,
+            "line_end": p.line_end - offset,
+        })
+        for p in unit.patterns
+    ]
+    header = "\n".join(
+        line for line in code_lines[:unit.start - 1] if _IMPORT_RE.match(line)
+    )
+    return f"""This is an excerpt (lines {unit.start}-{unit.end}) of a {len(code_lines)}-line {language} file; \
+line numbers below are relative to the excerpt. Code outside the excerpt is unchanged.
+
+EXISTING INCLUDES/IMPORTS OF THE FILE:
+```{language}
+{header}
+```
+
+{build_optimization_prompt(excerpt, local, language)}
+
+If the optimized excerpt needs includes/imports the file does not have yet, add after the code:
+
+NEW IMPORTS:
+```{language}
+[One include/import per line]
+```"""
+
+
+def stitch(
+    code: str, rewrites: list[tuple[Unit, str]], imports: list[str]
+) -> str:
+    """Replace each unit with its rewrite (bottom-up) and insert the new
+    ``imports`` after the file's last leading include/import line."""
+    lines = code.split("\n")
+    for unit, text in sorted(rewrites, key=lambda r: r[0].start, reverse=True):
+        lines[unit.start - 1:unit.end] = text.split("\n")
+    existing = {line.strip() for line in lines}
+    new = list(dict.fromkeys(i for i in imports if i.strip() and i.strip() not in existing))
+    if new:
+        first_unit = min((u.start for u, _ in rewrites), default=len(lines) + 1)
+        at = 0
+        for i, line in enumerate(lines[:first_unit - 1]):
+            if _IMPORT_RE.match(line):
+                at = i + 1
+        lines[at:at] = new
+    return "\n".join(lines)
+
+
+async def _optimize_unit(
+    provider: AIProvider, code_lines: list[str], unit: Unit, language: str
+) -> tuple[OptimizeResult, list[str]] | None:
+    try:
+        raw = await provider.complete(
+            CHUNK_SYSTEM_PROMPT, build_unit_prompt(code_lines, unit, language)
+        )
+    except Exception:
+        return None
+    imports_match = _NEW_IMPORTS_RE.search(raw)
+    imports = imports_match.group(1).strip().split("\n") if imports_match else []
+    body = raw.split("NEW IMPORTS:", 1)[0]
+    code_match = _CODE_BLOCK_RE.search(body)
+    if code_match is None:
+        # No code block: the model ignored the format.
+        return None
+    # parse_ai_response strips the block, losing the first line's
+    # indentation; re-indent the rewrite to where the unit sits instead.
+    indent = re.match(r"[ \t]*", code_lines[unit.start - 1]).group()
+    text = textwrap.dedent(code_match.group(1).strip("\n").rstrip())
+    result = parse_ai_response(body)
+    result.optimized_code = textwrap.indent(text, indent)
+    return result, imports
+
+
+async def optimize_chunked(
+    provider: AIProvider, code: str, patterns: list[DetectedPattern], language: str
+) -> OptimizeResult:
+    """Optimize each unit concurrently and stitch the results; never raises."""
+    code_lines = code.split("\n")
+    units = function_units(code, patterns, language)
+    results = await asyncio.gather(
+        *(_optimize_unit(provider, code_lines, unit, language) for unit in units)
+    )
+    done = [(unit, r) for unit, r in zip(units, results) if r is not None]
+    if not done:
+        return failed_result(code, RuntimeError("no unit could be optimized"))
+
+    rewrites = [(unit, r.optimized_code) for unit, (r, _) in done]
+    imports = [line for _, (_, lines) in done for line in lines]
+    thoughts = [f"Lines {u.start}-{u.end}:\n{r.chain_of_thought}" for u, (r, _) in done]
+    summaries = [r.changes_summary for _, (r, _) in done]
+    skipped = [f"{u.start}-{u.end}" for u, r in zip(units, results) if r is None]
+    if skipped:
+        summaries.append(f"- Lines {', '.join(skipped)} left unchanged (optimization failed).")
+    return OptimizeResult(
+        optimized_code=stitch(code, rewrites, imports),
+        chain_of_thought="\n\n".join(thoughts),
+        changes_summary="\n".join(summaries),
+    )
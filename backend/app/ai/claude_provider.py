@@ -1,30 +1,38 @@
-from anthropic import AsyncAnthropic
-from app.ai.provider import (
-    AIProvider, OptimizeResult, SYSTEM_PROMPT,
-    build_optimization_prompt, parse_ai_response,
-)
-from app.models import DetectedPattern
+from typing import AsyncIterator
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+from app.ai.provider import PooledProvider, pool_limits
 from app.config import settings
 
 
-class ClaudeProvider(AIProvider):
-    async def optimize_code(
-        self, code: str, patterns: list[DetectedPattern], language: str
-    ) -> OptimizeResult:
-        prompt = build_optimization_prompt(code, patterns, language)
-        try:
-            client = AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
-            message = await client.messages.create(
-                model="claude-sonnet-4-6-20250220",
-                max_tokens=8192,
-                system=SYSTEM_PROMPT,
-                messages=[{"role": "user", "content": prompt}],
-            )
-            raw = message.content[0].text
-            return parse_ai_response(raw)
-        except Exception as e:
-            return OptimizeResult(
-                optimized_code=code,
-                chain_of_thought=f"AI optimization failed: {str(e)}. Original code returned.",
-                changes_summary="No changes - AI provider unavailable.",
-            )
+class ClaudeProvider(PooledProvider):
+    model = "claude-sonnet-4-6-20250220"
+
+    def _new_client(self) -> AsyncAnthropic:
+        return AsyncAnthropic(
+            api_key=settings.ANTHROPIC_API_KEY,
+            http_client=DefaultAsyncHttpxClient(
+                timeout=settings.AI_REQUEST_TIMEOUT, limits=pool_limits()
+            ),
+        )
+
+    async def _close_client(self, client: AsyncAnthropic) -> None:
+        await client.close()
+
+    async def complete(self, system: str, prompt: str) -> str:
+        message = await self.client().messages.create(
+            model=self.model,
+            max_tokens=settings.AI_MAX_OUTPUT_TOKENS,
+            system=system,
+            messages=[{"role": "user", "content": prompt}],
+        )
+        return message.content[0].text
+
+    async def stream_text(self, system: str, prompt: str) -> AsyncIterator[str]:
+        async with self.client().messages.stream(
+            model=self.model,
+            max_tokens=settings.AI_MAX_OUTPUT_TOKENS,
+            system=system,
+            messages=[{"role": "user", "content": prompt}],
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
@@ -1,40 +1,42 @@
+from typing import AsyncIterator
 from google import genai
 from google.genai import types
-from app.ai.provider import (
-    AIProvider,
-    OptimizeResult,
-    SYSTEM_PROMPT,
-    build_optimization_prompt,
-    parse_ai_response,
-)
-from app.models import DetectedPattern
+from app.ai.provider import PooledProvider
 from app.config import settings
 
 
-class GeminiProvider(AIProvider):
-    async def optimize_code(
-        self, code: str, patterns: list[DetectedPattern], language: str
-    ) -> OptimizeResult:
-        prompt = build_optimization_prompt(code, patterns, language)
-        try:
-            client = genai.Client(api_key=settings.GEMINI_API_KEY)
+class GeminiProvider(PooledProvider):
+    model = "gemini-2.5-flash"
 
-            response = await client.aio.models.generate_content(
-                model="gemini-2.5-flash",
-                config=types.GenerateContentConfig(
-                    system_instruction=SYSTEM_PROMPT,
-                    max_output_tokens=8192,
-                    temperature=0.7,
-                ),
-                contents=prompt,
-            )
+    def _new_client(self) -> genai.Client:
+        return genai.Client(api_key=settings.GEMINI_API_KEY)
 
-            raw = response.text
-            return parse_ai_response(raw)
+    async def _close_client(self, client: genai.Client) -> None:
+        # Only SDK releases with a pooled async transport expose aclose().
+        aclose = getattr(client.aio, "aclose", None)
+        if aclose is not None:
+            await aclose()
 
-        except Exception as e:
-            return OptimizeResult(
-                optimized_code=code,
-                chain_of_thought=f"Gemini optimization failed: {str(e)}. Original code returned.",
-                changes_summary="No changes - AI provider unavailable.",
-            )
+    @staticmethod
+    def _config(system: str) -> types.GenerateContentConfig:
+        return types.GenerateContentConfig(
+            system_instruction=system,
+            max_output_tokens=settings.AI_MAX_OUTPUT_TOKENS,
+            temperature=0.7,
+        )
+
+    async def complete(self, system: str, prompt: str) -> str:
+        response = await self.client().aio.models.generate_content(
+            model=self.model,
+            config=self._config(system),
+            contents=prompt,
+        )
+        return response.text
+
+    async def stream_text(self, system: str, prompt: str) -> AsyncIterator[str]:
+        stream = await self.client().aio.models.generate_content_stream(
+            model=self.model, config=self._config(system), contents=prompt
+        )
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
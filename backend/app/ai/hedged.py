@@ -0,0 +1,155 @@
+"""Hedged requests across providers (``AI_PROVIDER="gemini+ollama"``).
+
+A slow provider otherwise holds a commit for up to ``AI_REQUEST_TIMEOUT``
+before the original code comes back. ``HedgedProvider`` calls the first
+provider and, if it has not answered by its observed p95 latency
+(``AI_HEDGE_QUANTILE``), starts the next one as well; the first good
+answer wins and the calls still in flight are cancelled. A provider that
+fails (error, or a degraded result) hands over to the next one at once
+instead of waiting for the delay.
+
+Hedging costs at most one extra call for the slowest ~5% of requests,
+and cancelled calls release their provider limiter slot straight away.
+Member latencies come from each provider's ``LatencyWindow``; until a
+provider has ``AI_HEDGE_MIN_SAMPLES`` successes its delay is
+``AI_HEDGE_DEFAULT_DELAY``.
+"""
+
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+from app.ai.provider import AIProvider, OptimizeResult, _InstrumentedProvider
+from app.config import settings
+from app.metrics import PROVIDER_HEDGES
+from app.models import DetectedPattern
+
+T = TypeVar("T")
+
+
+class _Degraded(Exception):
+    """A member returned the graceful-degradation result."""
+
+    def __init__(self, result: OptimizeResult):
+        super().__init__(result.chain_of_thought)
+        self.result = result
+
+
+def hedge_delay(provider: AIProvider) -> float:
+    """Seconds to wait on ``provider`` before starting the next one."""
+    latency = getattr(provider, "latency", None)
+    if latency is None or len(latency) < settings.AI_HEDGE_MIN_SAMPLES:
+        return settings.AI_HEDGE_DEFAULT_DELAY
+    return max(settings.AI_HEDGE_MIN_DELAY, latency.quantile(settings.AI_HEDGE_QUANTILE))
+
+
+class HedgedProvider(AIProvider):
+    """Composite over registry providers, tried in order."""
+
+    def __init__(self, providers: list[AIProvider]):
+        if len(providers) < 2:
+            raise ValueError("hedging needs at least two providers")
+        self.providers = providers
+        self._names = [
+            p.name if isinstance(p, _InstrumentedProvider) else type(p).__name__
+            for p in providers
+        ]
+        self.name = "+".join(self._names)
+
+    @property
+    def model(self) -> str:
+        # Either member's answer can end up in the optimization cache.
+        return "+".join(p.model for p in self.providers)
+
+    async def _race(self, call: Callable[[int], Awaitable[T]]) -> tuple[int, T]:
+        """Run ``call(i)`` for providers in order, hedged; return the index
+        and value of the first call that succeeds, else raise the first
+        provider's error."""
+        pending: dict[asyncio.Task, int] = {}
+        # Provider index -> its error; the primary's is the one raised.
+        errors: dict[int, BaseException] = {}
+        launched = 0
+
+        def launch() -> None:
+            nonlocal launched
+            pending[asyncio.create_task(call(launched))] = launched
+            launched += 1
+
+        launch()
+        try:
+            while pending:
+                more = launched < len(self.providers)
+                delay = hedge_delay(self.providers[launched - 1]) if more else None
+                done, _ = await asyncio.wait(
+                    pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # Tail latency: hedge with the next provider.
+                    launch()
+                    continue
+                for task in done:
+                    i = pending.pop(task)
+                    if task.exception() is None:
+                        PROVIDER_HEDGES.inc(
+                            provider=self.name,
+                            winner=self._names[i],
+                            hedged=str(launched > 1).lower(),
+                        )
+                        return i, task.result()
+                    errors[i] = task.exception()
+                    if launched < len(self.providers):
+                        # Failed outright: fall back without waiting.
+                        launch()
+            PROVIDER_HEDGES.inc(provider=self.name, winner="none", hedged="true")
+            raise errors[min(errors)]
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def complete(self, system: str, prompt: str) -> str:
+        _, text = await self._race(lambda i: self.providers[i].complete(system, prompt))
+        return text
+
+    async def optimize_code(
+        self, code: str, patterns: list[DetectedPattern], language: str
+    ) -> OptimizeResult:
+        async def attempt(i: int) -> OptimizeResult:
+            result = await self.providers[i].optimize_code(code, patterns, language)
+            if result.failed:
+                raise _Degraded(result)
+            return result
+
+        try:
+            _, result = await self._race(attempt)
+        except _Degraded as e:
+            return e.result
+        return result
+
+    async def stream_completion(
+        self, code: str, patterns: list[DetectedPattern], language: str
+    ) -> AsyncIterator[str]:
+        """Hedged on time to first delta; the winner then streams alone."""
+        streams: dict[int, AsyncIterator[str]] = {}
+
+        async def first_delta(i: int) -> str:
+            stream = streams[i] = self.providers[i].stream_completion(
+                code, patterns, language
+            )
+            return await stream.__anext__()
+
+        try:
+            winner, first = await self._race(first_delta)
+            for i, stream in list(streams.items()):
+                if i != winner:
+                    await stream.aclose()
+                    del streams[i]
+            yield first
+            async for delta in streams[winner]:
+                yield delta
+        finally:
+            for stream in streams.values():
+                await stream.aclose()
+
+    async def aclose(self) -> None:
+        # Members are registry entries and are closed by the registry.
+        pass
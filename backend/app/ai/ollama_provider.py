@@ -1,38 +1,57 @@
+import json
+from typing import AsyncIterator
 import httpx
-from app.ai.provider import (
-    AIProvider,
-    OptimizeResult,
-    SYSTEM_PROMPT,
-    build_optimization_prompt,
-    parse_ai_response,
-)
-from app.models import DetectedPattern
+from app.ai.provider import PooledProvider, pool_limits
 from app.config import settings
 
 
-class OllamaProvider(AIProvider):
-    async def optimize_code(
-        self, code: str, patterns: list[DetectedPattern], language: str
-    ) -> OptimizeResult:
-        prompt = build_optimization_prompt(code, patterns, language)
-        try:
-            async with httpx.AsyncClient(timeout=120.0) as client:
-                response = await client.post(
-                    f"{settings.OLLAMA_URL}/api/generate",
-                    json={
-                        "model": settings.OLLAMA_MODEL,
-                        "prompt": prompt,
-                        "system": SYSTEM_PROMPT,
-                        "stream": False,
-                    },
-                )
-                response.raise_for_status()
-                raw = response.json()["response"]
-                return parse_ai_response(raw)
-        except Exception as e:
-            # Graceful degradation: return original code with error note
-            return OptimizeResult(
-                optimized_code=code,
-                chain_of_thought=f"AI optimization failed: {str(e)}. Original code returned.",
-                changes_summary="No changes - AI provider unavailable.",
-            )
+class OllamaProvider(PooledProvider):
+    @property
+    def model(self) -> str:
+        return settings.OLLAMA_MODEL
+
+    def _new_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=settings.OLLAMA_URL,
+            timeout=settings.AI_REQUEST_TIMEOUT,
+            limits=pool_limits(),
+        )
+
+    async def _close_client(self, client: httpx.AsyncClient) -> None:
+        await client.aclose()
+
+    def _payload(self, system: str, prompt: str, stream: bool) -> dict:
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "system": system,
+            "stream": stream,
+            # Ollama's default context is far smaller than the budget the
+            # optimizer plans with, and it truncates the prompt silently.
+            "options": {
+                "num_predict": settings.AI_MAX_OUTPUT_TOKENS,
+                "num_ctx": settings.AI_CONTEXT_TOKENS,
+            },
+        }
+
+    async def complete(self, system: str, prompt: str) -> str:
+        response = await self.client().post(
+            "/api/generate", json=self._payload(system, prompt, stream=False)
+        )
+        response.raise_for_status()
+        return response.json()["response"]
+
+    async def stream_text(self, system: str, prompt: str) -> AsyncIterator[str]:
+        # Ollama streams one JSON object per line: {"response": ..., "done": ...}
+        async with self.client().stream(
+            "POST", "/api/generate", json=self._payload(system, prompt, stream=True)
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    break
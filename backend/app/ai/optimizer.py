@@ -0,0 +1,72 @@
+"""Chooses how a file is sent to the model and runs that optimization.
+
+Modes (the request's ``output_mode``, else ``AI_OUTPUT_MODE``):
+  - ``full``:    the model regenerates the whole file (``optimize_code``);
+    the default. A file whose estimate overflows one completion is
+    ``chunked`` instead, since the regenerated file would be cut off.
+  - ``patch``:   the model returns hunks for the flagged regions only
+    (``app.ai.patch``); invalid hunks fall back to ``full``, or to
+    ``chunked`` when the file is too large for one completion.
+  - ``chunked``: function-level units around the findings are optimized in
+    parallel completions and stitched back (``app.ai.chunked``).
+  - ``auto``:    ``full`` for small files that fit the token budget,
+    ``patch`` from ``AI_PATCH_MIN_LINES`` lines (or when the file does not
+    fit) as long as the flagged regions do, else ``chunked``.
+"""
+
+from app.ai.chunked import estimate_tokens, fits_full, optimize_chunked, unit_budget
+from app.ai.patch import PatchError, editable_regions, optimize_with_patches
+from app.ai.provider import AIProvider, OptimizeResult, failed_result
+from app.config import settings
+from app.metrics import OPTIMIZATIONS
+from app.models import DetectedPattern
+
+
+def choose_mode(
+    code: str, patterns: list[DetectedPattern], requested: str = ""
+) -> str:
+    """Resolve ``auto`` (or the configured default) to a concrete mode,
+    from token estimates made before any provider call."""
+    mode = requested or settings.AI_OUTPUT_MODE
+    if mode == "full":
+        return "full" if fits_full(code) else "chunked"
+    if mode != "auto":
+        return mode
+    lines = code.split("\n")
+    if len(lines) < settings.AI_PATCH_MIN_LINES and fits_full(code):
+        return "full"
+    regions = editable_regions(len(lines), patterns)
+    region_tokens = sum(
+        estimate_tokens("\n".join(lines[start - 1:end])) for start, end in regions
+    )
+    return "patch" if region_tokens <= unit_budget() else "chunked"
+
+
+async def run_optimization(
+    provider: AIProvider,
+    code: str,
+    patterns: list[DetectedPattern],
+    language: str,
+    mode: str,
+) -> OptimizeResult:
+    """Optimize in the concrete ``mode``; never raises."""
+    if mode == "patch":
+        try:
+            result = await optimize_with_patches(provider, code, patterns, language)
+            OPTIMIZATIONS.inc(mode=mode, outcome="ok")
+            return result
+        except PatchError:
+            # The model ignored the format or strayed outside the regions.
+            OPTIMIZATIONS.inc(mode=mode, outcome="fallback")
+            if not fits_full(code):
+                mode = "chunked"
+        except Exception as e:
+            OPTIMIZATIONS.inc(mode=mode, outcome="failed")
+            return failed_result(code, e)
+    if mode == "chunked":
+        result = await optimize_chunked(provider, code, patterns, language)
+    else:
+        mode = "full"
+        result = await provider.optimize_code(code, patterns, language)
+    OPTIMIZATIONS.inc(mode=mode, outcome="failed" if result.failed else "ok")
+    return result
@@ -0,0 +1,175 @@
+"""Patch-format optimization: the model rewrites only the flagged regions.
+
+Full-file regeneration makes the model echo every untouched line, and
+output tokens dominate both latency and cost. In patch mode the prompt
+shows the file's flagged ``line_start``..``line_end`` regions (plus a few
+lines of context and the file header, so includes/imports can be added),
+numbered as in the original file, and asks for replacement hunks:
+
+    @@ 12-20 @@
+    ```cpp
+    <new text for original lines 12..20>
+    ```
+
+The server validates every hunk (in range, inside an editable region, no
+overlaps) and applies them bottom-up. Anything that does not validate
+raises ``PatchError`` so the caller can fall back to full regeneration.
+"""
+
+import re
+from dataclasses import dataclass
+
+from app.ai.provider import AIProvider, OptimizeResult, parse_ai_response
+from app.models import DetectedPattern
+
+# Lines of context shown (and editable) around each flagged region, and
+# the number of leading lines always shown for includes/imports.
+CONTEXT_LINES = 3
+HEADER_LINES = 15
+
+PATCH_SYSTEM_PROMPT = """You are a Green Code Optimizer specializing in energy-efficient programming.
+Your task is to refactor code to reduce energy consumption while maintaining correctness.
+
+Rules:
+1. Only modify code related to the detected energy anti-patterns
+2. Maintain the same function signatures and external behavior
+3. Explain your reasoning step by step (chain of thought)
+4. Return ONLY replacement hunks for the regions you change, never the whole file
+5. Use modern C++ best practices (STL algorithms, smart pointers, etc.)"""
+
+_HUNK_RE = re.compile(
+    r"@@\s*(\d+)\s*-\s*(\d+)\s*@@[^\n]*\n```[\w+#.-]*\n(.*?)```", re.DOTALL
+)
+_NUMBERED_RE = re.compile(r"^\s*\d+\| ?")
+
+
+class PatchError(ValueError):
+    """The model's hunks are missing, malformed or outside the editable
+    regions."""
+
+
+@dataclass
+class Hunk:
+    start: int  # 1-indexed, inclusive
+    end: int
+    lines: list[str]
+
+
+def editable_regions(
+    total_lines: int, patterns: list[DetectedPattern]
+) -> list[tuple[int, int]]:
+    """Merged 1-indexed inclusive ranges the model may rewrite."""
+    ranges = [(1, min(HEADER_LINES, total_lines))]
+    for p in patterns:
+        start = max(1, min(p.line_start, p.line_end) - CONTEXT_LINES)
+        end = min(total_lines, max(p.line_start, p.line_end) + CONTEXT_LINES)
+        if start <= end:
+            ranges.append((start, end))
+    merged: list[tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def build_patch_prompt(
+    code: str,
+    patterns: list[DetectedPattern],
+    language: str,
+    regions: list[tuple[int, int]],
+) -> str:
+    lines = code.split("\n")
+    pattern_descriptions = "\n".join(
+        f"- Line {p.line_start}-{p.line_end}: {p.name} -- {p.description}"
+        for p in patterns
+    )
+    excerpts = "\n\n".join(
+        f"REGION {start}-{end}:\n```{language}\n"
+        + "\n".join(f"{i:>5}| {lines[i - 1]}" for i in range(start, end + 1))
+        + "\n```"
+        for start, end in regions
+    )
+    return f"""Optimize the flagged regions of this {language} file ({len(lines)} lines) for energy efficiency.
+
+DETECTED ANTI-PATTERNS:
+{pattern_descriptions}
+
+EDITABLE REGIONS (numbered as in the original file; the rest of the file is unchanged and not shown):
+{excerpts}
+
+Provide your response in this EXACT format:
+
+CHAIN OF THOUGHT:
+[Your step-by-step reasoning about each optimization]
+
+CHANGES SUMMARY:
+[Brief bullet list of what you changed and why]
+
+HUNKS:
+@@ <first line>-<last line> @@
+```{language}
+[New code replacing those original lines, without line numbers]
+```
+
+Each hunk replaces a range of original lines that lies inside one REGION.
+Hunks must not overlap. To insert lines, replace a line and repeat it."""
+
+
+def parse_hunks(raw: str) -> list[Hunk]:
+    body = raw.split("HUNKS:", 1)[-1]
+    hunks = []
+    for match in _HUNK_RE.finditer(body):
+        text = match.group(3)
+        if text.endswith("\n"):
+            text = text[:-1]
+        lines = text.split("\n") if text else []
+        # Tolerate the model echoing the prompt's "  12| " prefixes.
+        if lines and all(_NUMBERED_RE.match(line) for line in lines):
+            lines = [_NUMBERED_RE.sub("", line, count=1) for line in lines]
+        hunks.append(Hunk(int(match.group(1)), int(match.group(2)), lines))
+    return hunks
+
+
+def apply_hunks(
+    code: str, hunks: list[Hunk], regions: list[tuple[int, int]]
+) -> str:
+    """Apply validated ``hunks`` to ``code``; raise ``PatchError`` otherwise."""
+    if not hunks:
+        raise PatchError("response contains no hunks")
+    lines = code.split("\n")
+    ordered = sorted(hunks, key=lambda h: h.start)
+    previous_end = 0
+    for hunk in ordered:
+        if not 1 <= hunk.start <= hunk.end <= len(lines):
+            raise PatchError(f"hunk {hunk.start}-{hunk.end} is out of range")
+        if not any(s <= hunk.start and hunk.end <= e for s, e in regions):
+            raise PatchError(f"hunk {hunk.start}-{hunk.end} is outside the editable regions")
+        if hunk.start <= previous_end:
+            raise PatchError(f"hunk {hunk.start}-{hunk.end} overlaps the previous hunk")
+        previous_end = hunk.end
+    for hunk in reversed(ordered):
+        lines[hunk.start - 1:hunk.end] = hunk.lines
+    return "\n".join(lines)
+
+
+async def optimize_with_patches(
+    provider: AIProvider, code: str, patterns: list[DetectedPattern], language: str
+) -> OptimizeResult:
+    """One patch-mode completion, validated and applied.
+
+    Provider errors propagate; invalid hunks raise ``PatchError``.
+    """
+    regions = editable_regions(len(code.split("\n")), patterns)
+    raw = await provider.complete(
+        PATCH_SYSTEM_PROMPT, build_patch_prompt(code, patterns, language, regions)
+    )
+    optimized = apply_hunks(code, parse_hunks(raw), regions)
+    # Chain of thought and summary use the same headers as full mode.
+    sections = parse_ai_response(raw.split("HUNKS:", 1)[0])
+    return OptimizeResult(
+        optimized_code=optimized,
+        chain_of_thought=sections.chain_of_thought,
+        changes_summary=sections.changes_summary,
+    )
@@ -1,6 +1,14 @@
+import asyncio
+import math
 import re
+import time
 from abc import ABC, abstractmethod
+from collections import deque
 from dataclasses import dataclass
+from typing import AsyncIterator
+import httpx
+from app.config import settings
+from app.metrics import PROVIDER_REQUESTS, PROVIDER_SECONDS
 from app.models import DetectedPattern
 
 
@@ -9,6 +17,14 @@ class OptimizeResult:
     optimized_code: str
     chain_of_thought: str
     changes_summary: str
+    # Set by the graceful-degradation path (original code returned); such
+    # results are never cached.
+    failed: bool = False
+
+
+# Bump whenever SYSTEM_PROMPT, build_optimization_prompt or
+# parse_ai_response change, so cached optimizations are not reused.
+PROMPT_VERSION = "1"
 
 
 SYSTEM_PROMPT = """You are a Green Code Optimizer specializing in energy-efficient programming.
@@ -53,31 +69,30 @@ OPTIMIZED CODE:
 ```"""
 
 
+_COT_RE = re.compile(
+    r"CHAIN OF THOUGHT:\s*\n(.*?)(?=CHANGES SUMMARY:|OPTIMIZED CODE:|$)", re.DOTALL
+)
+_SUMMARY_RE = re.compile(r"CHANGES SUMMARY:\s*\n(.*?)(?=OPTIMIZED CODE:|$)", re.DOTALL)
+_CODE_BLOCK_RE = re.compile(r"```\w*\n(.*?)```", re.DOTALL)
+
+
 def parse_ai_response(raw: str) -> OptimizeResult:
     chain_of_thought = ""
     changes_summary = ""
     optimized_code = ""
 
     # Extract chain of thought
-    cot_match = re.search(
-        r"CHAIN OF THOUGHT:\s*\n(.*?)(?=CHANGES SUMMARY:|OPTIMIZED CODE:|$)",
-        raw,
-        re.DOTALL,
-    )
+    cot_match = _COT_RE.search(raw)
     if cot_match:
         chain_of_thought = cot_match.group(1).strip()
 
     # Extract changes summary
-    cs_match = re.search(
-        r"CHANGES SUMMARY:\s*\n(.*?)(?=OPTIMIZED CODE:|$)",
-        raw,
-        re.DOTALL,
-    )
+    cs_match = _SUMMARY_RE.search(raw)
     if cs_match:
         changes_summary = cs_match.group(1).strip()
 
     # Extract optimized code from code block
-    code_match = re.search(r"```\w*\n(.*?)```", raw, re.DOTALL)
+    code_match = _CODE_BLOCK_RE.search(raw)
     if code_match:
         optimized_code = code_match.group(1).strip()
     elif "OPTIMIZED CODE:" in raw:
@@ -95,15 +110,284 @@ def parse_ai_response(raw: str) -> OptimizeResult:
     )
 
 
+SECTIONS = ("chain_of_thought", "changes_summary", "optimized_code")
+
+
+class IncrementalResponseParser:
+    """``parse_ai_response`` for a completion that arrives in pieces.
+
+    ``feed`` returns the ``(section, text)`` pairs that became complete with
+    that delta: the chain of thought once the next header starts, the
+    summary once ``OPTIMIZED CODE:`` starts, the code once its fence closes.
+    ``close`` parses the whole text with ``parse_ai_response`` (the
+    authoritative result) and returns it with any sections not sent yet.
+    The regexes only re-run when a delta brings in a header or a fence.
+    """
+
+    _MARKER_WINDOW = len("CHANGES SUMMARY:")
+
+    def __init__(self):
+        self._parts: list[str] = []
+        self._tail = ""
+        self._text: str | None = ""
+        self._sent: dict[str, str] = {}
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = "".join(self._parts)
+        return self._text
+
+    def feed(self, delta: str) -> list[tuple[str, str]]:
+        self._parts.append(delta)
+        self._text = None
+        window = self._tail + delta
+        self._tail = window[-self._MARKER_WINDOW:]
+        sent = self._sent
+        ready: list[tuple[str, str]] = []
+
+        summary_started = "CHANGES SUMMARY:" in window
+        code_started = "OPTIMIZED CODE:" in window
+        if "chain_of_thought" not in sent and (summary_started or code_started):
+            match = _COT_RE.search(self.text)
+            if match:
+                ready.append(("chain_of_thought", match.group(1).strip()))
+        if "changes_summary" not in sent and code_started:
+            match = _SUMMARY_RE.search(self.text)
+            if match:
+                ready.append(("changes_summary", match.group(1).strip()))
+        if "optimized_code" not in sent and "`" in delta:
+            text = self.text
+            header = text.find("OPTIMIZED CODE:")
+            match = _CODE_BLOCK_RE.search(text)
+            if header >= 0 and match and match.start() > header:
+                ready.append(("optimized_code", match.group(1).strip()))
+
+        sent.update(ready)
+        return ready
+
+    def close(self) -> tuple[list[tuple[str, str]], OptimizeResult]:
+        result = parse_ai_response(self.text)
+        rest = [
+            (section, getattr(result, section))
+            for section in SECTIONS
+            if section not in self._sent
+        ]
+        self._sent.update(rest)
+        return rest, result
+
+
+def pool_limits() -> httpx.Limits:
+    """Keep-alive connection pool limits shared by every provider client."""
+    return httpx.Limits(
+        max_connections=settings.AI_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.AI_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=settings.AI_POOL_KEEPALIVE_EXPIRY,
+    )
+
+
+def failed_result(code: str, error: Exception) -> OptimizeResult:
+    """Graceful degradation: the original code with an error note."""
+    return OptimizeResult(
+        optimized_code=code,
+        chain_of_thought=f"AI optimization failed: {str(error)}. Original code returned.",
+        changes_summary="No changes - AI provider unavailable.",
+        failed=True,
+    )
+
+
 class AIProvider(ABC):
-    @abstractmethod
+    """A model behind ``complete``/``stream_text``.
+
+    Concrete providers implement those two (errors raised); the
+    optimization entry points build the prompts on top of them.
+    """
+
+    # Model identifier; part of the optimization cache key.
+    model: str = ""
+
+    async def complete(self, system: str, prompt: str) -> str:
+        """Return the raw completion for ``prompt``."""
+        raise NotImplementedError(f"{type(self).__name__} has no completion API")
+
+    def stream_text(self, system: str, prompt: str) -> AsyncIterator[str]:
+        """Yield the raw completion for ``prompt`` as text deltas."""
+        raise NotImplementedError(f"{type(self).__name__} does not stream")
+
     async def optimize_code(
         self, code: str, patterns: list[DetectedPattern], language: str
     ) -> OptimizeResult:
+        """Regenerate the whole file; never raises."""
+        prompt = build_optimization_prompt(code, patterns, language)
+        try:
+            raw = await self.complete(SYSTEM_PROMPT, prompt)
+        except Exception as e:
+            return failed_result(code, e)
+        return parse_ai_response(raw)
+
+    def stream_completion(
+        self, code: str, patterns: list[DetectedPattern], language: str
+    ) -> AsyncIterator[str]:
+        """Yield the full-file completion as text deltas (unparsed, errors
+        raised). Feed the deltas to ``IncrementalResponseParser``."""
+        return self.stream_text(SYSTEM_PROMPT, build_optimization_prompt(code, patterns, language))
+
+    async def aclose(self) -> None:
+        """Release long-lived resources (connection pools)."""
+
+
+class PooledProvider(AIProvider):
+    """Provider that reuses one SDK/HTTP client, and so one keep-alive
+    connection pool, across calls instead of building one per request.
+
+    The client is created on first use so a missing API key still degrades
+    to the "AI provider unavailable" result instead of failing at startup.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @abstractmethod
+    def _new_client(self):
         pass
 
+    async def _close_client(self, client) -> None:
+        pass
 
-def get_provider(name: str) -> AIProvider:
+    def client(self):
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            # Pooled connections belong to the loop that opened them.
+            self._client = self._new_client()
+            self._loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        client, loop = self._client, self._loop
+        self._client = self._loop = None
+        if client is not None and loop is asyncio.get_running_loop():
+            await self._close_client(client)
+
+
+class ProviderLimiter:
+    """Bounds one provider's concurrent calls and, optionally, its call rate.
+
+    Calls beyond ``max_concurrency`` wait for a slot; with ``per_minute`` set,
+    call starts are additionally spaced at least ``60 / per_minute`` seconds
+    apart. State is per event loop, like the pooled clients.
+    """
+
+    def __init__(self, max_concurrency: int, per_minute: float = 0.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._next_start = 0.0
+
+    def _bind(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._next_start = 0.0
+        return loop
+
+    async def __aenter__(self) -> None:
+        loop = self._bind()
+        await self._semaphore.acquire()
+        if self.interval:
+            now = loop.time()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+            if start > now:
+                try:
+                    await asyncio.sleep(start - now)
+                except BaseException:
+                    self._semaphore.release()
+                    raise
+
+    async def __aexit__(self, *exc) -> None:
+        self._semaphore.release()
+
+
+class LatencyWindow:
+    """The last ``size`` successful call latencies of one provider, for
+    quantiles (the metrics histogram's buckets are too coarse to hedge on)."""
+
+    def __init__(self, size: int = 200):
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> float | None:
+        """Nearest-rank quantile, or None without samples."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class _InstrumentedProvider(AIProvider):
+    """Applies the provider's limiter and records call count and latency
+    (excluding time spent waiting for the limiter). Successful calls also
+    feed ``latency``, which hedging reads."""
+
+    def __init__(
+        self, provider: AIProvider, name: str, limiter: ProviderLimiter | None = None
+    ):
+        self.provider = provider
+        self.name = name
+        self.limiter = limiter or ProviderLimiter(
+            settings.AI_MAX_CONCURRENCY, settings.AI_RATE_LIMIT_PER_MINUTE
+        )
+        self.latency = LatencyWindow()
+
+    @property
+    def model(self) -> str:
+        return self.provider.model
+
+    async def optimize_code(
+        self, code: str, patterns: list[DetectedPattern], language: str
+    ) -> OptimizeResult:
+        async with self.limiter:
+            PROVIDER_REQUESTS.inc(provider=self.name)
+            start = time.perf_counter()
+            with PROVIDER_SECONDS.time(provider=self.name):
+                result = await self.provider.optimize_code(code, patterns, language)
+            if not result.failed:
+                self.latency.observe(time.perf_counter() - start)
+            return result
+
+    async def complete(self, system: str, prompt: str) -> str:
+        async with self.limiter:
+            PROVIDER_REQUESTS.inc(provider=self.name)
+            start = time.perf_counter()
+            with PROVIDER_SECONDS.time(provider=self.name):
+                text = await self.provider.complete(system, prompt)
+            self.latency.observe(time.perf_counter() - start)
+            return text
+
+    async def stream_completion(
+        self, code: str, patterns: list[DetectedPattern], language: str
+    ) -> AsyncIterator[str]:
+        async with self.limiter:
+            PROVIDER_REQUESTS.inc(provider=self.name)
+            with PROVIDER_SECONDS.time(provider=self.name):
+                async for delta in self.provider.stream_completion(
+                    code, patterns, language
+                ):
+                    yield delta
+
+    async def aclose(self) -> None:
+        await self.provider.aclose()
+
+
+def _create_provider(name: str) -> AIProvider:
     if name == "ollama":
         from app.ai.ollama_provider import OllamaProvider
 
@@ -117,3 +401,57 @@ def get_provider(name: str) -> AIProvider:
 
         return GeminiProvider()
     raise ValueError(f"Unknown AI provider: {name}")
+
+
+class ProviderRegistry:
+    """One long-lived provider per name, shared by every request.
+
+    The app lifespan creates the configured default at startup and closes
+    all providers (and their connection pools) on shutdown.
+    """
+
+    def __init__(self):
+        self._providers: dict[str, AIProvider] = {}
+
+    def get(self, name: str) -> AIProvider:
+        """``name`` is a provider, or ``a+b[+c...]`` for a hedged composite
+        (see ``app.ai.hedged``) over the registry's ``a``, ``b``..."""
+        provider = self._providers.get(name)
+        if provider is None:
+            if "+" in name:
+                from app.ai.hedged import HedgedProvider
+
+                provider = HedgedProvider([self.get(part) for part in name.split("+")])
+            else:
+                provider = _InstrumentedProvider(_create_provider(name), name)
+            self._providers[name] = provider
+        return provider
+
+    def warm(self, name: str) -> None:
+        """Create ``name``'s client now, on the running loop, so the first
+        request does not pay for it. Failures (e.g. a missing API key) are
+        left for that request to report."""
+        if "+" in name:
+            for part in name.split("+"):
+                self.warm(part)
+            return
+        provider = self.get(name)
+        if isinstance(provider, _InstrumentedProvider):
+            provider = provider.provider
+        if isinstance(provider, PooledProvider):
+            try:
+                provider.client()
+            except Exception:
+                pass
+
+    async def aclose(self) -> None:
+        providers, self._providers = self._providers, {}
+        for provider in providers.values():
+            await provider.aclose()
+
+
+providers = ProviderRegistry()
+
+
+def get_provider(name: str) -> AIProvider:
+    return providers.get(name)
@@ -0,0 +1,142 @@
+"""Content-addressed cache of analysis results.
+
+Identical file contents reach /api/analyze and /api/hook over and over
+(re-commits, CI reruns, "Try It" retries). Results are keyed by
+
+    sha256(language, engine fingerprint, code)
+
+where the engine fingerprint changes whenever the registered detectors or
+their rule versions change, so stale findings are never served.
+
+Two tiers:
+  1. In-memory LRU bounded by total serialized size (UTF-8 bytes).
+  2. Optional persistent tier in the app's SQLite database, shared across
+     restarts; hits are promoted back into memory.
+
+Only detected patterns are cached. Energy figures depend on the live
+carbon intensity and are cheap to recompute, so callers still derive them.
+"""
+
+import hashlib
+from collections import OrderedDict
+
+import aiosqlite
+from pydantic import TypeAdapter
+
+from app.config import settings
+from app.db.database import get_cached_analysis, save_cached_analysis
+from app.models import DetectedPattern
+
+_PATTERNS = TypeAdapter(list[DetectedPattern])
+
+
+class AnalysisCache:
+    def __init__(self, max_bytes: int, persistent: bool = False):
+        self.max_bytes = max_bytes
+        self.persistent = persistent
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._bytes = 0
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(code: str, language: str, fingerprint: str) -> str:
+        h = hashlib.sha256()
+        h.update(language.encode())
+        h.update(b"\0")
+        h.update(fingerprint.encode())
+        h.update(b"\0")
+        h.update(code.encode("utf-8", "surrogatepass"))
+        return h.hexdigest()
+
+    # ------------------------------------------------------------------ #
+    # In-memory LRU tier
+    # ------------------------------------------------------------------ #
+
+    def _memory_get(self, key: str) -> bytes | None:
+        raw = self._entries.get(key)
+        if raw is not None:
+            self._entries.move_to_end(key)
+        return raw
+
+    def _memory_put(self, key: str, raw: bytes) -> None:
+        size = len(raw)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        self._entries[key] = raw
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    # ------------------------------------------------------------------ #
+    # Public API
+    # ------------------------------------------------------------------ #
+
+    async def get(self, key: str) -> list[DetectedPattern] | None:
+        raw = self._memory_get(key)
+        if raw is not None:
+            self.memory_hits += 1
+            return _PATTERNS.validate_json(raw)
+        if self.persistent:
+            try:
+                stored = await get_cached_analysis(
+                    key, settings.ANALYSIS_CACHE_TOUCH_SECONDS
+                )
+            except aiosqlite.Error:
+                # The persistent tier is best-effort; fall back to analysis.
+                stored = None
+            if stored is not None:
+                self.persistent_hits += 1
+                raw = stored.encode()
+                self._memory_put(key, raw)
+                return _PATTERNS.validate_json(raw)
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, patterns: list[DetectedPattern]) -> None:
+        raw = _PATTERNS.dump_json(patterns)
+        self._memory_put(key, raw)
+        if self.persistent:
+            try:
+                await save_cached_analysis(key, raw.decode(), settings.ANALYSIS_CACHE_MAX_ROWS)
+            except aiosqlite.Error:
+                pass
+
+    async def analyze(self, engine, code: str, language: str) -> list[DetectedPattern]:
+        """Return cached findings for ``code`` or run ``engine`` and store them."""
+        key = self.key(code, language, engine.fingerprint)
+        patterns = await self.get(key)
+        if patterns is None:
+            patterns = await engine.analyze_async(code, language)
+            await self.put(key, patterns)
+        return patterns
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.persistent_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "persistent": self.persistent,
+        }
+
+
+analysis_cache = AnalysisCache(
+    max_bytes=settings.ANALYSIS_CACHE_MAX_BYTES,
+    persistent=settings.ANALYSIS_CACHE_PERSISTENT,
+)
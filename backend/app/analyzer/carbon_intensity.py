@@ -6,20 +6,46 @@ Supported sources (in priority order):
   2. Electricity Maps API     (free tier, requires API key, global)
      https://api.electricitymap.org/
   3. Static fallback           (regional averages from IEA 2023 data)
+
+Live readings are also stored in SQLite (``carbon_readings``) with their
+source and timestamp. Workers share them: a refresh first looks for a
+reading another worker stored recently, so N workers make about one API
+call per location per refresh interval instead of N. A restarted worker
+restores the latest readings at startup, and the stored series lets
+estimates be recomputed offline against the intensity at the time.
 """
 
+import asyncio
 import time
 import httpx
 
 from app.config import settings
+from app.db.database import (
+    get_latest_carbon_readings,
+    save_carbon_reading,
+)
+from app.singleflight import SingleFlight
 
 # ------------------------------------------------------------------ #
 # Cache: carbon intensity doesn't change second-by-second.
-# We cache for 30 minutes.
+#
+# Stale-while-revalidate: the request path only ever reads the cache. An
+# entry older than the TTL is still served while one background refresh
+# per location (single-flight) fetches a new value; a location never seen
+# before is served its regional average meanwhile. The app lifespan keeps
+# the configured locations warm (``keep_warm``), so requests normally
+# find a fresh entry.
 # ------------------------------------------------------------------ #
 
 _cache: dict[str, tuple[float, float]] = {}  # key -> (value, timestamp)
-_CACHE_TTL = 1800  # 30 minutes
+_CACHE_TTL = settings.CARBON_INTENSITY_TTL_SECONDS
+# After a failed refresh, try again this much later rather than a full TTL.
+_RETRY_AFTER = 60
+
+_refreshes: SingleFlight[float] = SingleFlight("carbon_intensity")
+_background: set[asyncio.Task] = set()
+_client: httpx.AsyncClient | None = None
+_client_loop: asyncio.AbstractEventLoop | None = None
 
 
 def _get_cached(key: str) -> float | None:
@@ -30,8 +56,43 @@ def _get_cached(key: str) -> float | None:
     return None
 
 
-def _set_cached(key: str, value: float) -> None:
-    _cache[key] = (value, time.time())
+def _set_cached(key: str, value: float, ts: float | None = None) -> None:
+    _cache[key] = (value, time.time() if ts is None else ts)
+
+
+def _http() -> httpx.AsyncClient:
+    """One keep-alive client for both APIs, per event loop."""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        _client = httpx.AsyncClient(timeout=5.0)
+        _client_loop = loop
+    return _client
+
+
+async def restore() -> None:
+    """Seed the cache from the stored readings (lifespan startup), keeping
+    their original timestamps so old ones are still refreshed."""
+    try:
+        readings = await get_latest_carbon_readings()
+    except Exception:
+        return
+    for r in readings:
+        key = f"ci_{r['location']}"
+        if key not in _cache or _cache[key][1] < r["fetched_at"]:
+            _set_cached(key, r["value"], r["fetched_at"])
+
+
+async def aclose() -> None:
+    """Stop background refreshes and close the HTTP client."""
+    global _client, _client_loop
+    for task in list(_background):
+        task.cancel()
+    await asyncio.gather(*_background, return_exceptions=True)
+    client, loop = _client, _client_loop
+    _client = _client_loop = None
+    if client is not None and loop is asyncio.get_running_loop():
+        await client.aclose()
 
 
 # ------------------------------------------------------------------ #
@@ -59,10 +120,20 @@ REGIONAL_AVERAGES: dict[str, float] = {
 }
 
 
+def _has_live_source(loc: str) -> bool:
+    return loc in ("GB", "UK") or bool(settings.ELECTRICITY_MAPS_API_KEY)
+
+
+def _static(loc: str) -> float:
+    return REGIONAL_AVERAGES.get(loc, REGIONAL_AVERAGES["EU"])
+
+
 async def get_carbon_intensity_gco2_kwh(location: str | None = None) -> float:
     """Return the current carbon intensity in gCO2/kWh.
 
-    Tries live APIs first, falls back to static regional averages.
+    Never waits for a carbon API: serves the cached value (stale or not)
+    or the static regional average, and leaves fetching to a background
+    refresh.
     """
     loc = (location or settings.CARBON_INTENSITY_LOCATION).upper()
     cache_key = f"ci_{loc}"
@@ -71,42 +142,107 @@ async def get_carbon_intensity_gco2_kwh(location: str | None = None) -> float:
     if cached is not None:
         return cached
 
+    if not _has_live_source(loc):
+        value = _static(loc)
+        _set_cached(cache_key, value)
+        return value
+
+    _refresh_in_background(loc)
+    stale = _cache.get(cache_key)
+    return stale[0] if stale is not None else _static(loc)
+
+
+def _refresh_in_background(loc: str) -> None:
+    task = asyncio.create_task(refresh_carbon_intensity(loc))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def refresh_carbon_intensity(location: str) -> float:
+    """Fetch ``location`` now and update the cache; concurrent calls for
+    the same location share one fetch."""
+    loc = location.upper()
+    return await _refreshes.do(loc, lambda: _fetch(loc))
+
+
+async def _stored_reading(loc: str) -> dict | None:
+    """A reading for ``loc`` stored by any worker within the last half
+    TTL (the keep-warm interval), else None."""
+    try:
+        readings = await get_latest_carbon_readings(loc)
+    except Exception:
+        return None
+    if readings and time.time() - readings[0]["fetched_at"] < _CACHE_TTL / 2:
+        return readings[0]
+    return None
+
+
+async def _store_reading(loc: str, value: float, source: str, fetched_at: float) -> None:
+    try:
+        await save_carbon_reading(
+            loc, value, source, fetched_at, settings.CARBON_HISTORY_RETENTION_SECONDS
+        )
+    except Exception:
+        # The shared store is best effort; the in-memory value still serves.
+        pass
+
+
+async def _fetch(loc: str) -> float:
+    cache_key = f"ci_{loc}"
+
+    # 0. Another worker refreshed this location recently.
+    stored = await _stored_reading(loc)
+    if stored is not None:
+        _set_cached(cache_key, stored["value"], stored["fetched_at"])
+        return stored["value"]
+
+    value, source = None, ""
     # 1. Try UK Carbon Intensity API (free, no auth)
     if loc in ("GB", "UK"):
-        value = await _fetch_uk_carbon_intensity()
-        if value is not None:
-            _set_cached(cache_key, value)
-            return value
+        value, source = await _fetch_uk_carbon_intensity(), "carbonintensity.org.uk"
 
     # 2. Try Electricity Maps API (needs API key)
-    if settings.ELECTRICITY_MAPS_API_KEY:
-        value = await _fetch_electricity_maps(loc)
-        if value is not None:
-            _set_cached(cache_key, value)
-            return value
+    if value is None and settings.ELECTRICITY_MAPS_API_KEY:
+        value, source = await _fetch_electricity_maps(loc), "electricitymaps"
+
+    if value is not None:
+        now = time.time()
+        _set_cached(cache_key, value, now)
+        await _store_reading(loc, value, source, now)
+        return value
 
-    # 3. Static fallback
-    value = REGIONAL_AVERAGES.get(loc, REGIONAL_AVERAGES["EU"])
-    _set_cached(cache_key, value)
+    # 3. Static fallback, unless an earlier live value is still around:
+    # keep serving that and retry sooner than a full TTL.
+    previous = _cache.get(cache_key)
+    value = previous[0] if previous is not None else _static(loc)
+    _set_cached(cache_key, value, time.time() - _CACHE_TTL + _RETRY_AFTER)
     return value
 
 
+async def keep_warm(locations: list[str]) -> None:
+    """Lifespan task: refresh ``locations`` now and then every half TTL,
+    so request-path lookups find fresh entries."""
+    while True:
+        await asyncio.gather(
+            *(refresh_carbon_intensity(loc) for loc in locations),
+            return_exceptions=True,
+        )
+        await asyncio.sleep(_CACHE_TTL / 2)
+
+
 async def _fetch_uk_carbon_intensity() -> float | None:
     """Fetch current carbon intensity from api.carbonintensity.org.uk.
 
     Returns gCO2/kWh or None on failure.
     """
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            resp = await client.get(
-                "https://api.carbonintensity.org.uk/intensity"
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            # Response: { "data": [{ "intensity": { "actual": 185, "forecast": 190, "index": "moderate" } }] }
-            intensity = data["data"][0]["intensity"]
-            # Prefer actual, fall back to forecast
-            return float(intensity.get("actual") or intensity.get("forecast"))
+        resp = await _http().get("https://api.carbonintensity.org.uk/intensity")
+        resp.raise_for_status()
+        data = resp.json()
+        # Response: { "data": [{ "intensity": { "actual": 185, "forecast": 190, "index": "moderate" } }] }
+        intensity = data["data"][0]["intensity"]
+        # Prefer actual, fall back to forecast
+        return float(intensity.get("actual") or intensity.get("forecast"))
     except Exception:
         return None
 
@@ -118,14 +254,13 @@ async def _fetch_electricity_maps(zone: str) -> float | None:
     Returns gCO2/kWh or None on failure.
     """
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            resp = await client.get(
-                "https://api.electricitymap.org/v3/carbon-intensity/latest",
-                params={"zone": zone},
-                headers={"auth-token": settings.ELECTRICITY_MAPS_API_KEY},
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            return float(data["carbonIntensity"])
+        resp = await _http().get(
+            "https://api.electricitymap.org/v3/carbon-intensity/latest",
+            params={"zone": zone},
+            headers={"auth-token": settings.ELECTRICITY_MAPS_API_KEY},
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        return float(data["carbonIntensity"])
     except Exception:
         return None
@@ -12,9 +12,12 @@ CO2 intensity is fetched live from:
   3. IEA 2023 regional averages (offline fallback)
 """
 
+from collections import Counter
+
 from app.models import DetectedPattern
 from app.config import settings
 from app.analyzer.carbon_intensity import get_carbon_intensity_gco2_kwh
+from app.metrics import ENERGY_ESTIMATE_SECONDS
 
 # Reference hardware power consumption
 _CPU_TDP_WATTS = 150.0     # Typical cloud instance CPU power draw
@@ -107,6 +110,33 @@ def _kwh_per_run(profile: dict) -> float:
     return total_joules / 3_600_000  # J -> kWh
 
 
+# ------------------------------------------------------------------ #
+# Per-pattern kWh, computed once when the profiles load.
+#
+# Estimates work on pattern counts per column: one column per profiled
+# pattern id, then one for every other id (DEFAULT_PROFILE). The batch
+# estimator (app/analyzer/energy_batch.py) uses the same columns and
+# the same arithmetic, so both paths give identical results.
+# ------------------------------------------------------------------ #
+
+COLUMNS: tuple[str, ...] = (*PATTERN_ENERGY_PROFILES, "other")
+_COLUMN_INDEX = {pattern_id: i for i, pattern_id in enumerate(COLUMNS[:-1])}
+_PROFILES = [*PATTERN_ENERGY_PROFILES.values(), DEFAULT_PROFILE]
+# kWh per run, and kWh per run the fix saves, for each column.
+COLUMN_KWH_PER_RUN: tuple[float, ...] = tuple(_kwh_per_run(p) for p in _PROFILES)
+COLUMN_SAVED_KWH_PER_RUN: tuple[float, ...] = tuple(
+    kwh * p["savings_factor"] for kwh, p in zip(COLUMN_KWH_PER_RUN, _PROFILES)
+)
+
+
+def pattern_counts(patterns: list[DetectedPattern]) -> list[int]:
+    """Count ``patterns`` per column of ``COLUMNS``."""
+    counts = [0] * len(COLUMNS)
+    for pattern_id, n in Counter(p.pattern_id for p in patterns).items():
+        counts[_COLUMN_INDEX.get(pattern_id, len(COLUMNS) - 1)] += n
+    return counts
+
+
 def estimate_energy(patterns: list[DetectedPattern]) -> dict:
     """Estimate energy impact using pattern profiles and static CO2 factor.
 
@@ -123,8 +153,19 @@ async def estimate_energy_live(
 
     Fetches real-time gCO2/kWh from Carbon Intensity APIs.
     """
-    carbon_intensity = await get_carbon_intensity_gco2_kwh(location)
-    return _compute_energy(patterns, carbon_intensity)
+    with ENERGY_ESTIMATE_SECONDS.time():
+        carbon_intensity = await get_carbon_intensity_gco2_kwh(location)
+        return _compute_energy(patterns, carbon_intensity)
+
+
+def estimate_energy_at(
+    patterns: list[DetectedPattern], carbon_intensity_gco2_kwh: float
+) -> dict:
+    """Estimate energy impact at an already fetched carbon intensity.
+
+    Lets batch callers do one live lookup for many files.
+    """
+    return _compute_energy(patterns, carbon_intensity_gco2_kwh)
 
 
 def _compute_energy(
@@ -143,11 +184,12 @@ def _compute_energy(
     total_kwh_per_run = 0.0
     total_savings_kwh_per_run = 0.0
 
-    for p in patterns:
-        profile = PATTERN_ENERGY_PROFILES.get(p.pattern_id, DEFAULT_PROFILE)
-        kwh = _kwh_per_run(profile)
-        total_kwh_per_run += kwh
-        total_savings_kwh_per_run += kwh * profile["savings_factor"]
+    for n, kwh, saved_kwh in zip(
+        pattern_counts(patterns), COLUMN_KWH_PER_RUN, COLUMN_SAVED_KWH_PER_RUN
+    ):
+        if n:
+            total_kwh_per_run += n * kwh
+            total_savings_kwh_per_run += n * saved_kwh
 
     runs_per_year = settings.ASSUMED_RUNS_PER_DAY * 365
     annual_kwh = total_kwh_per_run * runs_per_year
@@ -163,6 +205,20 @@ def _compute_energy(
     energy_score = min(100.0, 10.0 + annual_kwh * 1000)
     optimized_score = max(10.0, energy_score - annual_savings_kwh * 1000)
 
+    return _rounded(
+        energy_score, optimized_score, annual_kwh, annual_co2, annual_eur,
+        carbon_intensity_gco2_kwh,
+    )
+
+
+def _rounded(
+    energy_score: float,
+    optimized_score: float,
+    annual_kwh: float,
+    annual_co2: float,
+    annual_eur: float,
+    carbon_intensity_gco2_kwh: float,
+) -> dict:
     return {
         "total_energy_score": round(energy_score, 1),
         "optimized_energy_score": round(optimized_score, 1),
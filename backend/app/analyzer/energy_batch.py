@@ -0,0 +1,100 @@
+"""Vectorized energy estimates for many files at once.
+
+Input is a pattern-count matrix: one row per file, one column per entry
+of ``COLUMNS`` (see app/analyzer/energy.py). Each column step below is
+the scalar ``_compute_energy`` step over all rows, in the same order, so
+``estimate_batch(counts, ci).record(i)`` equals
+``estimate_energy_at(patterns_i, ci)`` exactly, and ``total()`` equals
+the estimate for all files' patterns together.
+
+Used for roll-ups over many files: the ``/api/analyze/batch`` summary and
+the per-module totals of the scan CLI.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.analyzer.energy import (
+    COLUMN_KWH_PER_RUN,
+    COLUMN_SAVED_KWH_PER_RUN,
+    COLUMNS,
+    _rounded,
+    pattern_counts,
+)
+from app.config import settings
+from app.models import DetectedPattern
+
+
+def count_matrix(files: list[list[DetectedPattern]]) -> np.ndarray:
+    """Pattern-count matrix for the findings of each file."""
+    return np.array(
+        [pattern_counts(patterns) for patterns in files], dtype=np.int64
+    ).reshape(len(files), len(COLUMNS))
+
+
+@dataclass
+class BatchEnergy:
+    """Unrounded per-file estimates (arrays of one value per row)."""
+
+    counts: np.ndarray
+    carbon_intensity_gco2_kwh: float
+    energy_score: np.ndarray
+    optimized_score: np.ndarray
+    kwh: np.ndarray
+    co2_kg: np.ndarray
+    cost_eur: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.kwh)
+
+    def record(self, i: int) -> dict:
+        """File ``i`` as the scalar estimate reports it."""
+        # float() first: round() on a NumPy scalar rounds differently.
+        return _rounded(
+            float(self.energy_score[i]),
+            float(self.optimized_score[i]),
+            float(self.kwh[i]),
+            float(self.co2_kg[i]),
+            float(self.cost_eur[i]),
+            self.carbon_intensity_gco2_kwh,
+        )
+
+    def total(self) -> dict:
+        """All files together, as the scalar estimate reports it."""
+        totals = _annual(self.counts.sum(axis=0, keepdims=True), self.carbon_intensity_gco2_kwh)
+        return totals.record(0)
+
+
+def _annual(counts: np.ndarray, carbon_intensity_gco2_kwh: float) -> BatchEnergy:
+    rows = counts.shape[0]
+    total_kwh_per_run = np.zeros(rows)
+    total_savings_kwh_per_run = np.zeros(rows)
+    for j, (kwh, saved_kwh) in enumerate(zip(COLUMN_KWH_PER_RUN, COLUMN_SAVED_KWH_PER_RUN)):
+        total_kwh_per_run += counts[:, j] * kwh
+        total_savings_kwh_per_run += counts[:, j] * saved_kwh
+
+    runs_per_year = settings.ASSUMED_RUNS_PER_DAY * 365
+    annual_kwh = total_kwh_per_run * runs_per_year
+    annual_savings_kwh = total_savings_kwh_per_run * runs_per_year
+
+    co2_kg_per_kwh = carbon_intensity_gco2_kwh / 1000.0
+    energy_score = np.minimum(100.0, 10.0 + annual_kwh * 1000)
+    return BatchEnergy(
+        counts=counts,
+        carbon_intensity_gco2_kwh=carbon_intensity_gco2_kwh,
+        energy_score=energy_score,
+        optimized_score=np.maximum(10.0, energy_score - annual_savings_kwh * 1000),
+        kwh=annual_kwh,
+        co2_kg=annual_kwh * co2_kg_per_kwh,
+        cost_eur=annual_kwh * settings.COST_PER_KWH,
+    )
+
+
+def estimate_batch(counts, carbon_intensity_gco2_kwh: float) -> BatchEnergy:
+    """Estimate every row of ``counts`` (files x ``COLUMNS``) at one
+    carbon intensity."""
+    counts = np.asarray(counts, dtype=np.int64)
+    if counts.ndim != 2 or counts.shape[1] != len(COLUMNS):
+        raise ValueError(f"counts must have shape (files, {len(COLUMNS)})")
+    return _annual(counts, carbon_intensity_gco2_kwh)
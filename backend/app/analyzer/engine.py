@@ -1,16 +1,274 @@
+import asyncio
+import hashlib
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Awaitable, Callable, TypeVar
 from app.analyzer.patterns.base import PatternDetector
+from app.analyzer.rules import RulePlan
+from app.analyzer.source import SourceModel
+from app.config import settings
+from app.metrics import (
+    ANALYSIS_LINES,
+    ANALYSIS_PREFILTER_SKIPS,
+    ANALYSIS_SECONDS,
+    DETECTOR_FINDINGS,
+    DETECTOR_LINES,
+    DETECTOR_SECONDS,
+    REGISTRY,
+)
 from app.models import DetectedPattern
 
+EXECUTION_MODES = ("inline", "thread", "process")
+
+T = TypeVar("T")
+
+
+class EngineSaturated(Exception):
+    """Raised when the bounded in-flight queue is full (mapped to HTTP 503)."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Analysis engine is saturated, retry later")
+        self.retry_after = retry_after
+
+
+# ------------------------------------------------------------------ #
+# Process-pool worker side: each worker process rebuilds the engine once
+# from the pickled detectors, then serves analyze() calls. Other process
+# pools (the scan CLI) use init_worker as their initializer and call
+# worker_engine() in the worker.
+# ------------------------------------------------------------------ #
+
+_worker_engine: "AnalysisEngine | None" = None
+
+
+def init_worker(detectors: list[PatternDetector]) -> None:
+    """Process pool initializer: build this worker's inline engine."""
+    global _worker_engine
+    # A forked worker inherits the parent's samples; only ship its own.
+    REGISTRY.reset()
+    _worker_engine = AnalysisEngine(mode="inline")
+    for detector in detectors:
+        _worker_engine.register(detector)
+
+
+def worker_engine() -> "AnalysisEngine":
+    """The engine ``init_worker`` built in this worker process."""
+    if _worker_engine is None:
+        raise RuntimeError("init_worker() has not run in this process")
+    return _worker_engine
+
+
+def _call_in_worker(method: str, *args):
+    result = getattr(_worker_engine, method)(*args)
+    return result, REGISTRY.snapshot_and_reset()
+
 
 class AnalysisEngine:
-    def __init__(self):
+    """Runs the registered detectors over a file.
+
+    ``mode`` controls where ``analyze_async`` does the CPU-bound work:
+      - ``inline``:  on the calling thread (blocks the event loop)
+      - ``thread``:  in a thread pool, keeping the event loop responsive
+      - ``process``: in a process pool, using all cores
+
+    Off-loop modes bound the number of queued + running analyses to
+    ``max_in_flight``; beyond that ``EngineSaturated`` is raised.
+    """
+
+    def __init__(
+        self,
+        mode: str | None = None,
+        max_workers: int | None = None,
+        max_in_flight: int | None = None,
+    ):
+        self.mode = mode or settings.ANALYSIS_EXECUTION_MODE
+        if self.mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown analysis execution mode: {self.mode}")
+        self.max_workers = max_workers or settings.ANALYSIS_MAX_WORKERS or os.cpu_count() or 1
+        self.max_in_flight = (
+            max_in_flight or settings.ANALYSIS_MAX_IN_FLIGHT or self.max_workers * 4
+        )
         self.detectors: list[PatternDetector] = []
+        self._plans: dict[str, RulePlan] = {}
+        self._fingerprint: str | None = None
+        self._executor: Executor | None = None
+        self._in_flight = 0
 
     def register(self, detector: PatternDetector):
         self.detectors.append(detector)
+        self._plans.clear()
+        self._fingerprint = None
+        # Process workers hold a copy of the detectors; start fresh ones.
+        self.shutdown()
+
+    @property
+    def fingerprint(self) -> str:
+        """Identifies the registered detector set and rule versions; part of
+        every analysis cache key."""
+        if self._fingerprint is None:
+            parts = [
+                f"{type(d).__module__}.{type(d).__qualname__}:{d.version}"
+                for d in self.detectors
+            ]
+            self._fingerprint = hashlib.sha256("|".join(parts).encode()).hexdigest()[:16]
+        return self._fingerprint
+
+    @property
+    def file_scoped_patterns(self) -> frozenset[str]:
+        return frozenset().union(*(d.file_scoped_patterns for d in self.detectors))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _plan(self, language: str) -> RulePlan:
+        plan = self._plans.get(language)
+        if plan is None:
+            plan = self._plans[language] = RulePlan(self.detectors, language)
+        return plan
 
     def analyze(self, code: str, language: str) -> list[DetectedPattern]:
+        with ANALYSIS_SECONDS.time(language=language):
+            plan = self._plan(language)
+            # Fast path: most files in a commit contain none of the keywords
+            # any rule is anchored on, so skip the pre-pass entirely.
+            if not plan.matches(code):
+                ANALYSIS_PREFILTER_SKIPS.inc(language=language)
+                return []
+            # One shared pre-pass (split, comment/string masking, keyword
+            # prefilter) instead of every detector re-scanning the file.
+            source = plan.build_source(code)
+            ANALYSIS_LINES.inc(len(source), language=language)
+            return self._run_detectors(plan, source)
+
+    def analyze_changes(
+        self, code: str, language: str, changed_lines: list[int]
+    ) -> tuple[list[DetectedPattern], list[tuple[int, int]]]:
+        """Analyze only the loop blocks touching ``changed_lines`` (0-indexed).
+
+        Returns ``(patterns, regions)``: block findings inside ``regions``
+        plus all file-scoped findings, and the 0-indexed half-open line
+        ranges that were re-analyzed.
+        """
+        with ANALYSIS_SECONDS.time(language=language):
+            plan = self._plan(language)
+            if not plan.matches(code):
+                ANALYSIS_PREFILTER_SKIPS.inc(language=language)
+                return [], []
+            source = plan.build_source(code)
+            ANALYSIS_LINES.inc(len(source), language=language)
+            source.scope = source.loop_regions(changed_lines)
+            return self._run_detectors(plan, source), source.scope
+
+    def analyze_segment(
+        self, code: str, language: str
+    ) -> tuple[list[DetectedPattern], list[dict | None]]:
+        """Analyze one top-level segment of a streamed file.
+
+        Returns the segment's block findings (segment-relative lines) and
+        one file-scoped state per registered detector, to be merged across
+        segments (see ``PatternDetector.merge_file_state``). File-scoped
+        state is collected even for detectors the prefilter skips, since a
+        segment with only ``free`` calls still matters to the whole file.
+        """
+        with ANALYSIS_SECONDS.time(language=language):
+            plan = self._plan(language)
+            source = plan.build_source(code)
+            ANALYSIS_LINES.inc(len(source), language=language)
+            active = plan.active_detectors(source) if plan.matches(code) else []
+            file_scoped = self.file_scoped_patterns
+            patterns = [
+                p
+                for detector in active
+                for p in self._detect(detector, source)
+                if p.pattern_id not in file_scoped
+            ]
+            return patterns, [d.file_state(source) for d in self.detectors]
+
+    def _run_detectors(self, plan: RulePlan, source: SourceModel) -> list[DetectedPattern]:
         all_patterns = []
-        for detector in self.detectors:
-            all_patterns.extend(detector.detect(code, language))
+        for detector in plan.active_detectors(source):
+            all_patterns.extend(self._detect(detector, source))
         return all_patterns
+
+    @staticmethod
+    def _detect(detector: PatternDetector, source: SourceModel) -> list[DetectedPattern]:
+        name = type(detector).__name__
+        start = time.perf_counter()
+        patterns = detector.detect_source(source)
+        DETECTOR_SECONDS.observe(time.perf_counter() - start, detector=name)
+        DETECTOR_LINES.inc(len(source), detector=name)
+        DETECTOR_FINDINGS.inc(len(patterns), detector=name)
+        return patterns
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.mode == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    initializer=init_worker,
+                    initargs=(self.detectors,),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="analysis",
+                )
+        return self._executor
+
+    async def _run(self, method: str, *args):
+        """Run ``self.<method>(*args)`` according to ``mode``."""
+        if self.mode == "inline":
+            return getattr(self, method)(*args)
+        if self._in_flight >= self.max_in_flight:
+            raise EngineSaturated(settings.ANALYSIS_RETRY_AFTER_SECONDS)
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            if self.mode == "process":
+                result, samples = await loop.run_in_executor(
+                    self._get_executor(), _call_in_worker, method, *args
+                )
+                REGISTRY.merge(samples)
+                return result
+            return await loop.run_in_executor(
+                self._get_executor(), getattr(self, method), *args
+            )
+        finally:
+            self._in_flight -= 1
+
+    async def analyze_async(self, code: str, language: str) -> list[DetectedPattern]:
+        """Analyze without blocking the event loop (per ``mode``)."""
+        return await self._run("analyze", code, language)
+
+    async def analyze_changes_async(
+        self, code: str, language: str, changed_lines: list[int]
+    ) -> tuple[list[DetectedPattern], list[tuple[int, int]]]:
+        return await self._run("analyze_changes", code, language, changed_lines)
+
+    async def analyze_segment_async(
+        self, code: str, language: str
+    ) -> tuple[list[DetectedPattern], list[dict | None]]:
+        return await self._run("analyze_segment", code, language)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+async def retry_saturated(call: Callable[[], Awaitable[T]], max_wait: float | None = None) -> T:
+    """Await ``call()``, retrying after the engine's Retry-After delay while
+    it is saturated; re-raises ``EngineSaturated`` once ``max_wait`` seconds
+    (default ``ANALYSIS_SATURATED_MAX_WAIT_SECONDS``) have passed."""
+    if max_wait is None:
+        max_wait = settings.ANALYSIS_SATURATED_MAX_WAIT_SECONDS
+    deadline = time.monotonic() + max_wait
+    while True:
+        try:
+            return await call()
+        except EngineSaturated as exc:
+            if time.monotonic() + exc.retry_after > deadline:
+                raise
+            await asyncio.sleep(exc.retry_after)
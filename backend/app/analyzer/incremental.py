@@ -0,0 +1,325 @@
+"""Diff-aware incremental analysis for the pre-commit hook.
+
+The hook sends the staged diff against HEAD plus the base blob SHA instead
+of whole files. The server keeps recently seen file contents keyed by git
+blob SHA, so it can rebuild the staged file from the base and the diff.
+
+Only the loop blocks that overlap changed lines are re-analyzed
+(``AnalysisEngine.analyze_changes``). Block findings for untouched code are
+taken from the base revision's (usually cached) results and shifted to
+their new line numbers. File-scoped findings such as the alloc/free
+balance are always recomputed from the new file.
+
+Edits that can re-pair braces or change what is comment/string (brace
+balance differs, block comment or triple-quote delimiters touched) fall
+back to a full analysis of the new file, as do indentation changes in
+languages where indentation delimits blocks.
+"""
+
+import hashlib
+import re
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+
+from app.analyzer.cache import analysis_cache
+from app.models import DetectedPattern
+
+_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+_STRUCTURAL_TOKENS = ("/*", "*/", '"""', "'''", "`")
+_LINE_LIST_RE = re.compile(r"line\(s\) ([\d, ]+)")
+# Languages whose blocks end where the indentation does.
+_INDENT_LANGUAGES = ("python",)
+
+
+class DiffError(ValueError):
+    """The diff does not apply cleanly to the base content."""
+
+
+def git_blob_sha(code: str) -> str:
+    """SHA-1 git assigns to a blob with this content."""
+    data = code.encode("utf-8", "surrogatepass")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+@dataclass
+class AppliedDiff:
+    code: str
+    changed_lines: list[int]  # 0-indexed lines of the new file that changed
+    removed: list[int]  # 0-indexed base lines deleted or replaced
+    inserted: list[int]  # base line each added line was inserted before
+    structural: bool
+    # Added and removed lines differ in indentation (ignoring blank lines).
+    indent_changed: bool = False
+
+
+@dataclass
+class IncrementalResult:
+    code: str
+    patterns: list[DetectedPattern]  # every finding for the new revision
+    changed_patterns: list[DetectedPattern]  # findings introduced/touched by the diff
+    full_rescan: bool
+
+
+def apply_unified_diff(base: str, diff: str) -> AppliedDiff:
+    """Apply a single-file unified diff (any context size) to ``base``."""
+    base_lines = base.split("\n")
+    base_has_eol = base.endswith("\n") or base == ""
+    real_base = len(base_lines) - 1 if base_has_eol else len(base_lines)
+
+    out: list[str] = []
+    changed: list[int] = []
+    removed: list[int] = []
+    inserted: list[int] = []
+    removed_text: list[str] = []
+    added_text: list[str] = []
+    old_missing_eol = new_missing_eol = False
+    pos = 0
+
+    diff_lines = diff.split("\n")
+    idx = 0
+    while idx < len(diff_lines):
+        m = _HUNK_RE.match(diff_lines[idx])
+        idx += 1
+        if not m:
+            continue  # file headers, index lines, etc.
+        # 1-indexed; a count of 0 means the hunk sits *after* ``old_start``.
+        old_start = int(m.group(1))
+        old_count = int(m.group(2)) if m.group(2) is not None else 1
+        new_count = int(m.group(4)) if m.group(4) is not None else 1
+        target = old_start if old_count == 0 else old_start - 1
+        if target < pos or target > real_base:
+            raise DiffError(f"Hunk at line {old_start} out of order or range")
+        out.extend(base_lines[pos:target])
+        pos = target
+
+        old_seen = new_seen = 0
+        last_tag = ""
+        while idx < len(diff_lines) and (
+            old_seen < old_count
+            or new_seen < new_count
+            or diff_lines[idx].startswith("\\")
+        ):
+            line = diff_lines[idx]
+            idx += 1
+            if line.startswith("\\"):
+                # "\ No newline at end of file" applies to the previous line
+                if last_tag in (" ", "-"):
+                    old_missing_eol = True
+                if last_tag in (" ", "+"):
+                    new_missing_eol = True
+                continue
+            tag, text = (line[:1] or " "), line[1:]
+            if tag in (" ", "-"):
+                if pos >= real_base or base_lines[pos] != text:
+                    raise DiffError(f"Diff does not match base at line {pos + 1}")
+                if tag == " ":
+                    out.append(text)
+                    new_seen += 1
+                else:
+                    removed.append(pos)
+                    removed_text.append(text)
+                    changed.append(len(out))
+                pos += 1
+                old_seen += 1
+            elif tag == "+":
+                inserted.append(pos)
+                changed.append(len(out))
+                out.append(text)
+                added_text.append(text)
+                new_seen += 1
+            else:
+                raise DiffError(f"Unexpected diff line: {line[:40]!r}")
+            last_tag = tag
+        if old_seen != old_count or new_seen != new_count:
+            raise DiffError("Truncated hunk")
+
+    out.extend(base_lines[pos:])
+    code = "\n".join(out)
+
+    if new_missing_eol:
+        new_has_eol = False
+    elif old_missing_eol:
+        new_has_eol = True
+    else:
+        new_has_eol = base_has_eol
+    if new_has_eol and code and not code.endswith("\n"):
+        code += "\n"
+    elif not new_has_eol and code.endswith("\n"):
+        code = code[:-1]
+
+    last_line = max(0, code.count("\n") - (1 if code.endswith("\n") else 0))
+    changed_lines = sorted({min(i, last_line) for i in changed})
+    return AppliedDiff(
+        code=code,
+        changed_lines=changed_lines,
+        removed=removed,
+        inserted=inserted,
+        structural=_is_structural(removed_text, added_text),
+        indent_changed=_indents(removed_text) != _indents(added_text),
+    )
+
+
+def _is_structural(removed: list[str], added: list[str]) -> bool:
+    def balance(lines):
+        return sum(line.count("{") - line.count("}") for line in lines)
+
+    if balance(removed) != balance(added):
+        return True
+    return any(tok in line for line in removed + added for tok in _STRUCTURAL_TOKENS)
+
+
+def _indents(lines: list[str]) -> list[int]:
+    return sorted(len(line) - len(line.lstrip()) for line in lines if line.strip())
+
+
+# ------------------------------------------------------------------ #
+# Carrying base findings over to the new revision
+# ------------------------------------------------------------------ #
+
+
+def _touches(p: DetectedPattern, applied: AppliedDiff) -> bool:
+    """True if the diff removes or inserts base lines inside ``p``'s span."""
+    first, last = p.line_start - 1, p.line_end - 1
+    removed = applied.removed
+    k = bisect_left(removed, first)
+    if k < len(removed) and removed[k] <= last:
+        return True
+    # An insertion before ``first`` only shifts the finding.
+    inserted = applied.inserted
+    k = bisect_right(inserted, first)
+    return k < len(inserted) and inserted[k] <= last
+
+
+def _shift_for(line: int, applied: AppliedDiff) -> int:
+    """Line-number delta for an unchanged base line (1-indexed)."""
+    return bisect_right(applied.inserted, line - 1) - bisect_left(
+        applied.removed, line - 1
+    )
+
+
+def shift_pattern(p: DetectedPattern, delta: int) -> DetectedPattern:
+    """Move a block finding (and the line numbers in its text) by ``delta``."""
+    if delta == 0:
+        return p
+
+    def renumber(m: re.Match) -> str:
+        numbers = (int(n) + delta for n in m.group(1).split(",") if n.strip())
+        return "line(s) " + ", ".join(str(n) for n in numbers)
+
+    return p.model_copy(
+        update={
+            "line_start": p.line_start + delta,
+            "line_end": p.line_end + delta,
+            "description": _LINE_LIST_RE.sub(renumber, p.description),
+        }
+    )
+
+
+def _surviving_lines(p: DetectedPattern, applied: AppliedDiff) -> list[int]:
+    """0-indexed new-file lines of the base lines in ``p``'s span that the
+    diff kept."""
+    removed = set(applied.removed)
+    return [
+        line - 1 + _shift_for(line, applied)
+        for line in range(p.line_start, p.line_end + 1)
+        if line - 1 not in removed
+    ]
+
+
+def _overlaps_lines(p: DetectedPattern, lines: list[int]) -> bool:
+    """``lines`` are 0-indexed and sorted."""
+    k = bisect_left(lines, p.line_start - 1)
+    return k < len(lines) and lines[k] <= p.line_end - 1
+
+
+def _overlaps_ranges(p: DetectedPattern, ranges: list[tuple[int, int]]) -> bool:
+    """``ranges`` are 0-indexed half-open."""
+    return any(start < p.line_end and p.line_start - 1 < end for start, end in ranges)
+
+
+def _sort_key(p: DetectedPattern):
+    return (p.line_start, p.line_end, p.pattern_id)
+
+
+def _drop_known_file_scoped(
+    patterns: list[DetectedPattern],
+    base_patterns: list[DetectedPattern],
+    file_scoped: frozenset[str],
+) -> list[DetectedPattern]:
+    """``patterns`` minus file-scoped findings the base already had: they
+    span the file, so any diff overlaps them without changing them."""
+    base_file_ids = {p.pattern_id for p in base_patterns if p.pattern_id in file_scoped}
+    return [
+        p
+        for p in patterns
+        if p.pattern_id not in file_scoped or p.pattern_id not in base_file_ids
+    ]
+
+
+async def analyze_diff(
+    engine, base_code: str, diff: str, language: str
+) -> IncrementalResult:
+    """Analyze ``base_code`` + ``diff`` re-running detectors only where needed."""
+    applied = apply_unified_diff(base_code, diff)
+    key = analysis_cache.key(applied.code, language, engine.fingerprint)
+
+    structural = applied.structural or (
+        language in _INDENT_LANGUAGES and applied.indent_changed
+    )
+    cached = await analysis_cache.get(key)
+    if cached is not None or structural:
+        full_rescan = cached is None
+        if full_rescan:
+            cached = await analysis_cache.analyze(engine, applied.code, language)
+        patterns = sorted(cached, key=_sort_key)
+        changed_patterns = [
+            p for p in patterns if _overlaps_lines(p, applied.changed_lines)
+        ]
+        file_scoped = engine.file_scoped_patterns
+        if any(p.pattern_id in file_scoped for p in changed_patterns):
+            base_patterns = await analysis_cache.analyze(engine, base_code, language)
+            changed_patterns = _drop_known_file_scoped(
+                changed_patterns, base_patterns, file_scoped
+            )
+        return IncrementalResult(
+            code=applied.code,
+            patterns=patterns,
+            changed_patterns=changed_patterns,
+            full_rescan=full_rescan,
+        )
+
+    base_patterns = await analysis_cache.analyze(engine, base_code, language)
+    file_scoped = engine.file_scoped_patterns
+    # A base finding the diff touches is dropped, so re-analyze the block
+    # its remaining lines now sit in too: the edit may have moved the
+    # changed lines out of that block (e.g. its last body line deleted).
+    touched = [
+        p for p in base_patterns if p.pattern_id not in file_scoped and _touches(p, applied)
+    ]
+    changed_lines = sorted(
+        set(applied.changed_lines).union(
+            *(_surviving_lines(p, applied) for p in touched)
+        )
+    )
+    rescanned, regions = await engine.analyze_changes_async(
+        applied.code, language, changed_lines
+    )
+
+    kept = []
+    for p in base_patterns:
+        if p.pattern_id in file_scoped or _touches(p, applied):
+            continue
+        moved = shift_pattern(p, _shift_for(p.line_start, applied))
+        if not _overlaps_ranges(moved, regions):
+            kept.append(moved)
+
+    patterns = sorted(kept + rescanned, key=_sort_key)
+    await analysis_cache.put(key, patterns)
+
+    changed_patterns = _drop_known_file_scoped(rescanned, base_patterns, file_scoped)
+    return IncrementalResult(
+        code=applied.code,
+        patterns=patterns,
+        changed_patterns=sorted(changed_patterns, key=_sort_key),
+        full_rescan=False,
+    )
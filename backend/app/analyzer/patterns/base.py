@@ -1,12 +1,60 @@
 from abc import ABC, abstractmethod
+from app.analyzer.source import SourceModel
 from app.models import DetectedPattern
 
 
 class PatternDetector(ABC):
-    @abstractmethod
+    # Bump when a detector's rules change so cached results are invalidated
+    # (see AnalysisEngine.fingerprint).
+    version: str = "1"
+    # Pattern ids computed over the whole file (e.g. alloc/free balance)
+    # rather than per loop block. Incremental analysis always recomputes
+    # these instead of reusing them from the base revision.
+    file_scoped_patterns: frozenset[str] = frozenset()
+
     def detect(self, code: str, language: str) -> list[DetectedPattern]:
+        """Convenience entry point for callers that hold raw code.
+
+        The engine builds one SourceModel per request and calls
+        ``detect_source`` directly on every detector instead.
+        """
+        return self.detect_source(SourceModel.build(code, language))
+
+    @abstractmethod
+    def detect_source(self, source: SourceModel) -> list[DetectedPattern]:
         pass
 
+    # ------------------------------------------------------------------ #
+    # File-scoped rules as mergeable state. Streaming analysis sees a file
+    # one segment at a time: it collects ``file_state`` per segment, folds
+    # the states together with ``merge_file_state`` and only reports
+    # ``file_findings`` once the whole file has been read. Detectors
+    # without file-scoped rules keep the no-op defaults.
+    # ------------------------------------------------------------------ #
+
+    def file_state(self, source: SourceModel) -> dict | None:
+        """State of the file-scoped rules for ``source`` (1-indexed lines)."""
+        return None
+
+    def merge_file_state(
+        self, state: dict | None, segment: dict | None, offset: int
+    ) -> dict | None:
+        """Fold the state of a segment starting at line ``offset + 1``."""
+        return state
+
+    def file_findings(self, state: dict | None, total_lines: int) -> list[DetectedPattern]:
+        return []
+
+    def keywords(self, language: str) -> frozenset[str] | None:
+        """Literal tokens at least one of which must occur for this detector
+        to report anything in ``language``.
+
+        Used by the engine's prefilter. An empty set means the detector does
+        not handle ``language``; ``None`` (the default) disables prefiltering
+        and always runs the detector.
+        """
+        return None
+
     @property
     @abstractmethod
     def pattern_id(self) -> str:
@@ -1,85 +1,96 @@
 import re
+from bisect import bisect_left
 from app.analyzer.patterns.base import PatternDetector
+from app.analyzer.source import SourceModel
 from app.models import DetectedPattern, PatternSeverity
 
 
 class MemoryPatternDetector(PatternDetector):
+    version = "2"
+    _LANGUAGES = ("cpp", "c")
+    _LOOP_KEYWORDS = ("for", "while")
+    _ALLOC_KEYWORDS = ("new", "malloc", "calloc", "realloc")
+    _DEALLOC_KEYWORDS = ("delete", "free")
+    file_scoped_patterns = frozenset({"memory_leak"})
+
     @property
     def pattern_id(self) -> str:
         return "excessive_alloc"
 
-    def detect(self, code: str, language: str) -> list[DetectedPattern]:
-        if language not in ("cpp", "c"):
+    def keywords(self, language: str) -> frozenset[str]:
+        # Both rules need an allocation to report anything.
+        if language not in self._LANGUAGES:
+            return frozenset()
+        return frozenset(self._ALLOC_KEYWORDS)
+
+    def detect_source(self, source: SourceModel) -> list[DetectedPattern]:
+        if source.language not in self._LANGUAGES:
             return []
         patterns = []
-        lines = code.split("\n")
-        patterns.extend(self._detect_alloc_in_loops(lines))
-        patterns.extend(self._detect_memory_leaks(lines))
+        patterns.extend(self._detect_alloc_in_loops(source))
+        patterns.extend(self._detect_memory_leaks(source))
         return patterns
 
-    def _detect_alloc_in_loops(self, lines: list[str]) -> list[DetectedPattern]:
+    def _detect_alloc_in_loops(self, source: SourceModel) -> list[DetectedPattern]:
         results = []
         loop_re = re.compile(r"\b(for|while)\s*\(")
         alloc_re = re.compile(r"\b(new\s+\w+|malloc\s*\(|calloc\s*\(|realloc\s*\()")
+        lines = source.code_lines
+        alloc_hits = [
+            j
+            for j in source.candidates(self._ALLOC_KEYWORDS)
+            if alloc_re.search(lines[j])
+        ]
+        if not alloc_hits:
+            return results
 
-        i = 0
-        while i < len(lines):
-            line = lines[i]
-            if loop_re.search(line):
-                loop_start = i + 1
-                brace_depth = 0
-                j = i
-
-                # Find loop body
-                while j < len(lines):
-                    brace_depth += lines[j].count("{") - lines[j].count("}")
-                    if brace_depth > 0:
-                        j += 1
-                        break
-                    j += 1
-
-                alloc_lines = []
-                loop_end = j
-
-                while j < len(lines) and brace_depth > 0:
-                    current = lines[j]
-                    brace_depth += current.count("{") - current.count("}")
-                    if alloc_re.search(current):
-                        alloc_lines.append(j + 1)
-                    if brace_depth <= 0:
-                        loop_end = j + 1
-                        break
-                    j += 1
+        resume = 0
+        for i in source.scoped_candidates(self._LOOP_KEYWORDS):
+            if i < resume:
+                continue
+            match = loop_re.search(lines[i])
+            if not match:
+                continue
+            loop_start = i + 1
+            body_start, loop_end = source.brace_body(i, match.end())
+            alloc_lines = [
+                j + 1
+                for j in alloc_hits[
+                    bisect_left(alloc_hits, body_start):bisect_left(alloc_hits, loop_end)
+                ]
+            ]
 
-                if alloc_lines:
-                    results.append(
-                        DetectedPattern(
-                            pattern_id=self.pattern_id,
-                            name="Heap Allocation Inside Loop",
-                            severity=PatternSeverity.HIGH,
-                            line_start=loop_start,
-                            line_end=loop_end,
-                            description=(
-                                f"Memory allocation (new/malloc) detected inside loop body "
-                                f"at line(s) {', '.join(str(l) for l in alloc_lines)}. "
-                                f"This causes repeated heap allocations which are expensive."
-                            ),
-                            suggestion=(
-                                "Pre-allocate memory before the loop or use stack allocation. "
-                                "Consider std::vector::reserve() or allocating a buffer once "
-                                "and reusing it across iterations."
-                            ),
-                            estimated_energy_cost=75.0,
-                            estimated_energy_saved=50.0,
-                        )
+            if alloc_lines:
+                results.append(
+                    DetectedPattern(
+                        pattern_id=self.pattern_id,
+                        name="Heap Allocation Inside Loop",
+                        severity=PatternSeverity.HIGH,
+                        line_start=loop_start,
+                        line_end=loop_end,
+                        description=(
+                            f"Memory allocation (new/malloc) detected inside loop body "
+                            f"at line(s) {', '.join(str(l) for l in alloc_lines)}. "
+                            f"This causes repeated heap allocations which are expensive."
+                        ),
+                        suggestion=(
+                            "Pre-allocate memory before the loop or use stack allocation. "
+                            "Consider std::vector::reserve() or allocating a buffer once "
+                            "and reusing it across iterations."
+                        ),
+                        estimated_energy_cost=75.0,
+                        estimated_energy_saved=50.0,
                     )
-                i = max(loop_end, i + 1)
-                continue
-            i += 1
+                )
+            resume = max(loop_end, i + 1)
         return results
 
-    def _detect_memory_leaks(self, lines: list[str]) -> list[DetectedPattern]:
-        results = []
+    def _detect_memory_leaks(self, source: SourceModel) -> list[DetectedPattern]:
+        return self.file_findings(self.file_state(source), len(source))
+
+    def file_state(self, source: SourceModel) -> dict | None:
+        if source.language not in self._LANGUAGES:
+            return None
         alloc_re = re.compile(r"\b(new\s+\w+|malloc\s*\(|calloc\s*\()")
         dealloc_re = re.compile(r"\b(delete\s*\[?\]?\s*\w+|free\s*\()")
 
@@ -87,17 +98,49 @@ class MemoryPatternDetector(PatternDetector):
         dealloc_count = 0
         alloc_first_line = None
 
-        for i, line in enumerate(lines):
-            # Skip comments
-            stripped = line.strip()
-            if stripped.startswith("//") or stripped.startswith("/*"):
-                continue
-            if alloc_re.search(line):
+        # code_lines has comments and string literals blanked, so commented-out
+        # or quoted "new"/"free" never count.
+        lines = source.code_lines
+        for i in source.candidates(self._ALLOC_KEYWORDS):
+            if alloc_re.search(lines[i]):
                 alloc_count += 1
                 if alloc_first_line is None:
                     alloc_first_line = i + 1
-            if dealloc_re.search(line):
+        for i in source.candidates(self._DEALLOC_KEYWORDS):
+            if dealloc_re.search(lines[i]):
                 dealloc_count += 1
+        return {
+            "allocs": alloc_count,
+            "deallocs": dealloc_count,
+            "first_alloc": alloc_first_line,
+        }
+
+    def merge_file_state(
+        self, state: dict | None, segment: dict | None, offset: int
+    ) -> dict | None:
+        if segment is None:
+            return state
+        first = segment["first_alloc"]
+        segment = dict(segment, first_alloc=None if first is None else first + offset)
+        if state is None:
+            return segment
+        return {
+            "allocs": state["allocs"] + segment["allocs"],
+            "deallocs": state["deallocs"] + segment["deallocs"],
+            "first_alloc": (
+                state["first_alloc"]
+                if state["first_alloc"] is not None
+                else segment["first_alloc"]
+            ),
+        }
+
+    def file_findings(self, state: dict | None, total_lines: int) -> list[DetectedPattern]:
+        results = []
+        if state is None:
+            return results
+        alloc_count = state["allocs"]
+        dealloc_count = state["deallocs"]
+        alloc_first_line = state["first_alloc"]
 
         if alloc_count > dealloc_count and alloc_first_line is not None:
             results.append(
@@ -106,7 +149,7 @@ class MemoryPatternDetector(PatternDetector):
                     name="Potential Memory Leak",
                     severity=PatternSeverity.MEDIUM,
                     line_start=alloc_first_line,
-                    line_end=len(lines),
+                    line_end=total_lines,
                     description=(
                         f"Found {alloc_count} allocation(s) but only {dealloc_count} "
                         f"deallocation(s). Memory may be leaking."
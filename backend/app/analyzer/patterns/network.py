@@ -1,5 +1,7 @@
 import re
+from bisect import bisect_left
 from app.analyzer.patterns.base import PatternDetector
+from app.analyzer.source import SourceModel
 from app.models import DetectedPattern, PatternSeverity
 
 
@@ -8,20 +10,30 @@ class NetworkPatternDetector(PatternDetector):
 
     Covers C/C++ (libcurl, sockets, Boost.Beast), Python (requests, httpx,
     urllib, aiohttp), and JavaScript/TypeScript (fetch, axios, XMLHttpRequest).
+    Python files that parse are analyzed from their AST
+    (``SourceModel.python_facts``); everything else uses the regex rules.
     """
 
+    version = "2"
+    _LANGUAGES = ("cpp", "c", "python", "javascript", "typescript")
+    file_scoped_patterns = frozenset({"duplicate_network_call"})
+
     @property
     def pattern_id(self) -> str:
         return "network_waste"
 
-    def detect(self, code: str, language: str) -> list[DetectedPattern]:
-        if language not in ("cpp", "c", "python", "javascript", "typescript"):
+    def keywords(self, language: str) -> frozenset[str]:
+        if language not in self._LANGUAGES:
+            return frozenset()
+        return frozenset(self._NETWORK_KEYWORDS[language] + self._URL_CALL_KEYWORDS)
+
+    def detect_source(self, source: SourceModel) -> list[DetectedPattern]:
+        if source.language not in self._LANGUAGES:
             return []
         patterns = []
-        lines = code.split("\n")
-        patterns.extend(self._detect_network_in_loops(lines, language))
-        patterns.extend(self._detect_polling_pattern(lines, language))
-        patterns.extend(self._detect_repeated_identical_calls(lines, language))
+        patterns.extend(self._detect_network_in_loops(source))
+        patterns.extend(self._detect_polling_pattern(source))
+        patterns.extend(self._detect_repeated_identical_calls(source))
         return patterns
 
     # ------------------------------------------------------------------ #
@@ -70,208 +82,263 @@ class NetworkPatternDetector(PatternDetector):
     }
     _SLEEP_RE["typescript"] = _SLEEP_RE["javascript"]
 
+    _WHILE_TRUE_RE = re.compile(r"\b(while)\s*\(?\s*(true|True|1|TRUE)\s*\)?")
+    _FOR_EVER_RE = re.compile(r"\bfor\s*\(\s*;\s*;\s*\)")
+
+    # Literal anchors for the engine prefilter. Every regex above needs at
+    # least one of these on the line (``send`` also covers ``sendto``).
+    _LOOP_KEYWORDS = ("for", "while")
+    _NETWORK_KEYWORDS = {
+        "cpp": (
+            "curl_easy_perform", "send", "recv", "boost::beast",
+            "http::async_", "httplib::Client", "cpr::",
+        ),
+        "c": ("curl_easy_perform", "send", "recv"),
+        "python": (
+            "requests.", "httpx.", "urlopen", "aiohttp.ClientSession", "session.",
+        ),
+        "javascript": (
+            "fetch", "axios.", "XMLHttpRequest", ".open", "http.request",
+            "https.request",
+        ),
+    }
+    _NETWORK_KEYWORDS["typescript"] = _NETWORK_KEYWORDS["javascript"]
+    _SLEEP_KEYWORDS = {
+        "cpp": ("sleep", "Sleep"),
+        "c": ("sleep", "Sleep"),
+        "python": ("sleep",),
+        "javascript": ("setTimeout", "setInterval", "sleep"),
+    }
+    _SLEEP_KEYWORDS["typescript"] = _SLEEP_KEYWORDS["javascript"]
+    _URL_CALL_KEYWORDS = ("requests.", "httpx.", "fetch", "axios.", "CURLOPT_URL")
+
+    @staticmethod
+    def _confirmed(
+        source: SourceModel, keywords: tuple[str, ...], pattern: re.Pattern
+    ) -> list[int]:
+        """Candidate lines for ``keywords`` that ``pattern`` really matches."""
+        text_lines = source.text_lines
+        return [i for i in source.candidates(keywords) if pattern.search(text_lines[i])]
+
+    @staticmethod
+    def _hits_between(hits: list[int], start: int, end: int) -> list[int]:
+        return hits[bisect_left(hits, start):bisect_left(hits, end)]
+
     # ------------------------------------------------------------------ #
     # 1. Network calls inside loops
     # ------------------------------------------------------------------ #
 
-    def _get_loop_body(
-        self, lines: list[str], start: int, language: str
-    ) -> tuple[int, int]:
-        """Return (body_start, body_end) indices for the loop starting at `start`.
-
-        For brace-delimited languages, tracks { } depth.
-        For Python, uses indentation to determine the block.
-        """
-        if language == "python":
-            # Python: loop body is the indented block after the `:`
-            header = lines[start]
-            if ":" not in header:
-                return start + 1, start + 1
-            body_start = start + 1
-            if body_start >= len(lines):
-                return body_start, body_start
-            # Determine indent of first body line
-            first_body = lines[body_start]
-            indent = len(first_body) - len(first_body.lstrip())
-            if indent == 0 and first_body.strip() == "":
-                # skip blank lines to find first real body line
-                while body_start < len(lines) and lines[body_start].strip() == "":
-                    body_start += 1
-                if body_start >= len(lines):
-                    return body_start, body_start
-                first_body = lines[body_start]
-                indent = len(first_body) - len(first_body.lstrip())
-            j = body_start
-            while j < len(lines):
-                ln = lines[j]
-                if ln.strip() == "":
-                    j += 1
-                    continue
-                cur_indent = len(ln) - len(ln.lstrip())
-                if cur_indent < indent:
-                    break
-                j += 1
-            return body_start, j
-        else:
-            # Brace-delimited languages
-            brace_depth = 0
-            j = start
-            while j < len(lines):
-                brace_depth += lines[j].count("{") - lines[j].count("}")
-                if brace_depth > 0:
-                    j += 1
-                    break
-                j += 1
-            body_start = j
-            while j < len(lines) and brace_depth > 0:
-                brace_depth += lines[j].count("{") - lines[j].count("}")
-                if brace_depth <= 0:
-                    j += 1
-                    break
-                j += 1
-            return body_start, j
-
-    def _detect_network_in_loops(
-        self, lines: list[str], language: str
-    ) -> list[DetectedPattern]:
+    def _detect_network_in_loops(self, source: SourceModel) -> list[DetectedPattern]:
         results = []
-        net_re = self._NETWORK_CALL_RE.get(language)
-        if net_re is None:
+        # The keyword prefilter is a superset of what the AST accepts, so
+        # files without candidates never pay for a parse.
+        if not source.candidates(self._NETWORK_KEYWORDS.get(source.language, ())):
+            return results
+        facts = source.python_facts
+        if facts is not None:
+            # AST path: each outermost loop whose body makes a network call.
+            for k in facts.outermost():
+                loop = facts.loops[k]
+                net_call_lines = facts.network_calls.get(k)
+                if net_call_lines and source.in_scope(loop.line - 1):
+                    results.append(
+                        self._network_in_loop(loop.line, loop.end, net_call_lines)
+                    )
             return results
 
-        i = 0
-        while i < len(lines):
-            line = lines[i]
-            if self._LOOP_RE.search(line):
-                loop_start = i + 1  # 1-indexed
-                body_start, loop_end = self._get_loop_body(lines, i, language)
+        net_re = self._NETWORK_CALL_RE.get(source.language)
+        if net_re is None:
+            return results
 
-                net_call_lines = []
-                for j in range(body_start, loop_end):
-                    if net_re.search(lines[j]):
-                        net_call_lines.append(j + 1)
+        # Structure is matched on code_lines; call regexes need literal
+        # contents (e.g. XHR verbs) so they run on text_lines.
+        lines = source.code_lines
+        net_hits = self._confirmed(
+            source, self._NETWORK_KEYWORDS[source.language], net_re
+        )
+        if not net_hits:
+            return results
 
-                if net_call_lines:
-                    results.append(
-                        DetectedPattern(
-                            pattern_id=self.pattern_id,
-                            name="Network Call Inside Loop",
-                            severity=PatternSeverity.HIGH,
-                            line_start=loop_start,
-                            line_end=loop_end,
-                            description=(
-                                f"Network/HTTP call detected inside loop body at "
-                                f"line(s) {', '.join(str(l) for l in net_call_lines)}. "
-                                f"Each iteration incurs network latency and energy "
-                                f"overhead from NIC wake-ups and TCP handshakes."
-                            ),
-                            suggestion=(
-                                "Batch requests into a single call where possible. "
-                                "Use bulk/batch API endpoints, or collect parameters "
-                                "and make one request after the loop. This reduces "
-                                "network round-trips and radio/NIC energy consumption."
-                            ),
-                            estimated_energy_cost=90.0,
-                            estimated_energy_saved=65.0,
-                        )
-                    )
-                i = max(loop_end, i + 1)
+        resume = 0
+        for i in source.scoped_candidates(self._LOOP_KEYWORDS):
+            if i < resume:
                 continue
-            i += 1
+            match = self._LOOP_RE.search(lines[i])
+            if not match:
+                continue
+            loop_start = i + 1  # 1-indexed
+            body_start, loop_end = source.loop_body(i, match.start())
+            net_call_lines = [
+                j + 1 for j in self._hits_between(net_hits, body_start, loop_end)
+            ]
+
+            if net_call_lines:
+                results.append(
+                    self._network_in_loop(loop_start, loop_end, net_call_lines)
+                )
+            resume = max(loop_end, i + 1)
         return results
 
+    def _network_in_loop(
+        self, loop_start: int, loop_end: int, net_call_lines: list[int]
+    ) -> DetectedPattern:
+        return DetectedPattern(
+            pattern_id=self.pattern_id,
+            name="Network Call Inside Loop",
+            severity=PatternSeverity.HIGH,
+            line_start=loop_start,
+            line_end=loop_end,
+            description=(
+                f"Network/HTTP call detected inside loop body at "
+                f"line(s) {', '.join(str(l) for l in net_call_lines)}. "
+                f"Each iteration incurs network latency and energy "
+                f"overhead from NIC wake-ups and TCP handshakes."
+            ),
+            suggestion=(
+                "Batch requests into a single call where possible. "
+                "Use bulk/batch API endpoints, or collect parameters "
+                "and make one request after the loop. This reduces "
+                "network round-trips and radio/NIC energy consumption."
+            ),
+            estimated_energy_cost=90.0,
+            estimated_energy_saved=65.0,
+        )
+
     # ------------------------------------------------------------------ #
     # 2. Polling pattern (loop + sleep + network call)
     # ------------------------------------------------------------------ #
 
-    def _detect_polling_pattern(
-        self, lines: list[str], language: str
-    ) -> list[DetectedPattern]:
+    def _detect_polling_pattern(self, source: SourceModel) -> list[DetectedPattern]:
         results = []
-        net_re = self._NETWORK_CALL_RE.get(language)
-        sleep_re = self._SLEEP_RE.get(language)
+        if not source.candidates(
+            self._NETWORK_KEYWORDS.get(source.language, ())
+        ) or not source.candidates(self._SLEEP_KEYWORDS.get(source.language, ())):
+            return results
+        facts = source.python_facts
+        if facts is not None:
+            # AST path: outermost ``while True`` loops with sleep + network.
+            for k in facts.outermost(lambda loop: loop.infinite):
+                loop = facts.loops[k]
+                if (
+                    k in facts.sleep_calls
+                    and k in facts.network_calls
+                    and source.in_scope(loop.line - 1)
+                ):
+                    results.append(self._polling(loop.line, loop.end))
+            return results
+
+        net_re = self._NETWORK_CALL_RE.get(source.language)
+        sleep_re = self._SLEEP_RE.get(source.language)
         if net_re is None or sleep_re is None:
             return results
 
-        i = 0
-        while i < len(lines):
+        lines = source.code_lines
+        net_hits = self._confirmed(
+            source, self._NETWORK_KEYWORDS[source.language], net_re
+        )
+        if not net_hits:
+            return results
+        sleep_hits = self._confirmed(
+            source, self._SLEEP_KEYWORDS[source.language], sleep_re
+        )
+        if not sleep_hits:
+            return results
+
+        resume = 0
+        for i in source.scoped_candidates(self._LOOP_KEYWORDS):
+            if i < resume:
+                continue
             line = lines[i]
             # Look for while(true)-style loops (True for Python, true for C/JS)
-            is_while_loop = re.search(
-                r"\b(while)\s*\(?\s*(true|True|1|TRUE)\s*\)?", line
-            )
-            is_for_ever = re.search(r"\bfor\s*\(\s*;\s*;\s*\)", line)
-
-            if is_while_loop or is_for_ever:
-                loop_start = i + 1
-                body_start, loop_end = self._get_loop_body(lines, i, language)
-
-                has_sleep = False
-                has_net_call = False
-
-                for j in range(body_start, loop_end):
-                    current = lines[j]
-                    if sleep_re.search(current):
-                        has_sleep = True
-                    if net_re.search(current):
-                        has_net_call = True
-
-                if has_sleep and has_net_call:
-                    results.append(
-                        DetectedPattern(
-                            pattern_id="polling_pattern",
-                            name="Polling Instead of Event-Driven",
-                            severity=PatternSeverity.HIGH,
-                            line_start=loop_start,
-                            line_end=loop_end,
-                            description=(
-                                "Infinite loop with sleep + network call detected. "
-                                "This polling pattern keeps the CPU and NIC active "
-                                "even when no new data is available, wasting energy."
-                            ),
-                            suggestion=(
-                                "Replace polling with an event-driven approach: "
-                                "use WebSockets, server-sent events (SSE), OS-level "
-                                "select/epoll/kqueue, or message queues (MQTT, AMQP). "
-                                "This lets the CPU sleep until data arrives, reducing "
-                                "energy consumption by 60-90%."
-                            ),
-                            estimated_energy_cost=95.0,
-                            estimated_energy_saved=70.0,
-                        )
-                    )
-                i = max(loop_end, i + 1)
+            match = self._WHILE_TRUE_RE.search(line) or self._FOR_EVER_RE.search(line)
+            if not match:
                 continue
-            i += 1
+            loop_start = i + 1
+            body_start, loop_end = source.loop_body(i, match.start())
+            has_sleep = bool(self._hits_between(sleep_hits, body_start, loop_end))
+            has_net_call = bool(self._hits_between(net_hits, body_start, loop_end))
+
+            if has_sleep and has_net_call:
+                results.append(self._polling(loop_start, loop_end))
+            resume = max(loop_end, i + 1)
         return results
 
+    def _polling(self, loop_start: int, loop_end: int) -> DetectedPattern:
+        return DetectedPattern(
+            pattern_id="polling_pattern",
+            name="Polling Instead of Event-Driven",
+            severity=PatternSeverity.HIGH,
+            line_start=loop_start,
+            line_end=loop_end,
+            description=(
+                "Infinite loop with sleep + network call detected. "
+                "This polling pattern keeps the CPU and NIC active "
+                "even when no new data is available, wasting energy."
+            ),
+            suggestion=(
+                "Replace polling with an event-driven approach: "
+                "use WebSockets, server-sent events (SSE), OS-level "
+                "select/epoll/kqueue, or message queues (MQTT, AMQP). "
+                "This lets the CPU sleep until data arrives, reducing "
+                "energy consumption by 60-90%."
+            ),
+            estimated_energy_cost=95.0,
+            estimated_energy_saved=70.0,
+        )
+
     # ------------------------------------------------------------------ #
     # 3. Repeated identical network calls (same URL/endpoint)
     # ------------------------------------------------------------------ #
 
     def _detect_repeated_identical_calls(
-        self, lines: list[str], language: str
+        self, source: SourceModel
     ) -> list[DetectedPattern]:
-        results = []
-        # Match calls with a URL string argument
-        url_call_re = re.compile(
-            r"""(?:requests\.(?:get|post|put|delete|patch)|"""
-            r"""httpx\.(?:get|post|put|delete|patch)|"""
-            r"""fetch|axios\.(?:get|post|put|delete|patch)|"""
-            r"""curl_easy_setopt\s*\([^,]+,\s*CURLOPT_URL)\s*\(\s*"""
-            r"""(['"])(https?://[^'"]+)\1"""
-        )
+        return self.file_findings(self.file_state(source), len(source))
 
+    # Match calls with a URL string argument
+    _URL_CALL_RE = re.compile(
+        r"""(?:requests\.(?:get|post|put|delete|patch)|"""
+        r"""httpx\.(?:get|post|put|delete|patch)|"""
+        r"""fetch|axios\.(?:get|post|put|delete|patch)|"""
+        r"""curl_easy_setopt\s*\([^,]+,\s*CURLOPT_URL)\s*\(\s*"""
+        r"""(['"])(https?://[^'"]+)\1"""
+    )
+
+    def file_state(self, source: SourceModel) -> dict | None:
+        if source.language not in self._LANGUAGES:
+            return None
+        if not source.candidates(self._URL_CALL_KEYWORDS):
+            return {"urls": {}}
+        facts = source.python_facts
+        if facts is not None:
+            return {"urls": {url: list(lines) for url, lines in facts.urls.items()}}
         seen_urls: dict[str, list[int]] = {}
 
-        for i, line in enumerate(lines):
-            stripped = line.strip()
-            if stripped.startswith("//") or stripped.startswith("#"):
-                continue
-            match = url_call_re.search(line)
+        # text_lines has comments blanked but keeps the URL literals.
+        text_lines = source.text_lines
+        for i in source.candidates(self._URL_CALL_KEYWORDS):
+            match = self._URL_CALL_RE.search(text_lines[i])
             if match:
                 url = match.group(2)
                 seen_urls.setdefault(url, []).append(i + 1)
+        return {"urls": seen_urls}
+
+    def merge_file_state(
+        self, state: dict | None, segment: dict | None, offset: int
+    ) -> dict | None:
+        if segment is None:
+            return state
+        if state is None:
+            state = {"urls": {}}
+        for url, line_nums in segment["urls"].items():
+            state["urls"].setdefault(url, []).extend(l + offset for l in line_nums)
+        return state
+
+    def file_findings(self, state: dict | None, total_lines: int) -> list[DetectedPattern]:
+        results = []
+        if state is None:
+            return results
+        seen_urls: dict[str, list[int]] = state["urls"]
 
         for url, line_nums in seen_urls.items():
             if len(line_nums) >= 2:
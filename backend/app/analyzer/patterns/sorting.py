@@ -1,22 +1,37 @@
 import re
+from bisect import bisect_left, bisect_right
 from app.analyzer.patterns.base import PatternDetector
+from app.analyzer.source import SourceModel
 from app.models import DetectedPattern, PatternSeverity
 
 
 class SortingPatternDetector(PatternDetector):
+    version = "2"
+    _LANGUAGES = ("cpp", "c", "python")
+    _LOOP_KEYWORDS = ("for", "while")
+
     @property
     def pattern_id(self) -> str:
         return "inefficient_sort"
 
-    def detect(self, code: str, language: str) -> list[DetectedPattern]:
-        if language not in ("cpp", "c", "python"):
+    def keywords(self, language: str) -> frozenset[str]:
+        if language not in self._LANGUAGES:
+            return frozenset()
+        return frozenset(self._LOOP_KEYWORDS)
+
+    def detect_source(self, source: SourceModel) -> list[DetectedPattern]:
+        if source.language not in self._LANGUAGES:
             return []
         patterns = []
-        lines = code.split("\n")
-        patterns.extend(self._detect_nested_loops(lines, language))
+        patterns.extend(self._detect_nested_loops(source))
         return patterns
 
-    def _detect_nested_loops(self, lines: list[str], language: str) -> list[DetectedPattern]:
+    def _detect_nested_loops(self, source: SourceModel) -> list[DetectedPattern]:
+        # Nesting needs two loop headers; skip the parse otherwise.
+        if len(source.candidates(self._LOOP_KEYWORDS)) < 2:
+            return []
+        if source.python_facts is not None:
+            return self._detect_nested_loops_ast(source)
         results = []
         loop_re = re.compile(r"\b(for|while)\s*\(")
         swap_re = re.compile(
@@ -25,95 +40,112 @@ class SortingPatternDetector(PatternDetector):
         )
         size_re = re.compile(r"(\.size\(\)|\.length\(\)|\bn\b|\blen\b|\bsize\b)")
 
-        i = 0
-        while i < len(lines):
-            line = lines[i]
-            if loop_re.search(line):
-                outer_start = i + 1
-                brace_depth = 0
-                has_opening = "{" in line
-                if has_opening:
-                    brace_depth = line.count("{") - line.count("}")
+        lines = source.code_lines
+        # Loop headers: full regex only on the prefilter's candidate lines.
+        headers = []
+        for i in source.scoped_candidates(self._LOOP_KEYWORDS):
+            match = loop_re.search(lines[i])
+            if match:
+                headers.append((i, match))
+        header_lines = [i for i, _ in headers]
 
-                j = i + 1
-                if not has_opening:
-                    # Find opening brace
-                    while j < len(lines):
-                        if "{" in lines[j]:
-                            brace_depth = lines[j].count("{") - lines[j].count("}")
-                            j += 1
-                            break
-                        j += 1
+        resume = 0
+        for i, match in headers:
+            if i < resume:
+                continue
+            outer_start = i + 1
+            body_start, outer_end = source.brace_body(i, match.end())
 
-                # Scan inside outer loop for inner loop
-                inner_start = None
-                inner_has_swap = False
-                outer_end = j
+            # First inner loop within the outer body. Bodies are only
+            # scanned once an inner loop is found, and the scan then resumes
+            # after the outer loop, so every line is visited at most once.
+            k = bisect_left(header_lines, body_start)
+            if k == len(header_lines) or header_lines[k] >= outer_end:
+                continue
+            inner = header_lines[k]
+            inner_has_swap = any(
+                swap_re.search(lines[j]) for j in range(inner, outer_end)
+            )
 
-                while j < len(lines) and brace_depth > 0:
-                    current = lines[j]
-                    brace_depth += current.count("{") - current.count("}")
-
-                    if loop_re.search(current) and inner_start is None:
-                        inner_start = j + 1
+            if inner_has_swap:
+                results.append(self._bubble_sort(source, outer_start, outer_end))
+            else:
+                # Generic nested loop - still O(n²)
+                outer_has_size = any(
+                    size_re.search(lines[j]) for j in range(i, outer_end)
+                )
+                if outer_has_size:
+                    results.append(self._nested_iteration(outer_start, outer_end))
+            resume = outer_end
+        return results
 
-                    if inner_start is not None and swap_re.search(current):
-                        inner_has_swap = True
+    def _detect_nested_loops_ast(self, source: SourceModel) -> list[DetectedPattern]:
+        """Same rules over ``python_facts``: real ``for``/``while`` statements
+        instead of C-style ``for (`` headers, which Python never has."""
+        results = []
+        facts = source.python_facts
+        first_inner: dict[int, int] = {}
+        for loop in facts.loops:
+            if loop.parent is not None and loop.parent not in first_inner:
+                first_inner[loop.parent] = loop.line
 
-                    if brace_depth <= 0:
-                        outer_end = j + 1
-                        break
-                    j += 1
+        def any_between(lines: list[int], start: int, end: int) -> bool:
+            return bisect_right(lines, end) > bisect_left(lines, start)
 
-                if inner_start is not None:
-                    if inner_has_swap:
-                        results.append(
-                            DetectedPattern(
-                                pattern_id=self.pattern_id,
-                                name="O(n²) Bubble Sort Pattern",
-                                severity=PatternSeverity.HIGH,
-                                line_start=outer_start,
-                                line_end=outer_end,
-                                description=(
-                                    "Nested loop with element swapping detected. "
-                                    "This is characteristic of O(n²) sorting algorithms "
-                                    "like bubble sort or selection sort."
-                                ),
-                                suggestion=(
-                                    "Replace with std::sort() which uses O(n log n) introsort. "
-                                    "This reduces CPU cycles by ~100x for large inputs."
-                                ),
-                                estimated_energy_cost=85.0,
-                                estimated_energy_saved=60.0,
-                            )
-                        )
-                    else:
-                        # Generic nested loop - still O(n²)
-                        outer_has_size = any(
-                            size_re.search(lines[k])
-                            for k in range(i, min(outer_end, len(lines)))
-                        )
-                        if outer_has_size:
-                            results.append(
-                                DetectedPattern(
-                                    pattern_id=self.pattern_id,
-                                    name="O(n²) Nested Loop Iteration",
-                                    severity=PatternSeverity.MEDIUM,
-                                    line_start=outer_start,
-                                    line_end=outer_end,
-                                    description=(
-                                        "Nested loops iterating over collection size detected. "
-                                        "This results in O(n²) time complexity."
-                                    ),
-                                    suggestion=(
-                                        "Consider using a more efficient algorithm, hash map lookup, "
-                                        "or STL algorithms to reduce to O(n) or O(n log n)."
-                                    ),
-                                    estimated_energy_cost=70.0,
-                                    estimated_energy_saved=45.0,
-                                )
-                            )
-                    i = outer_end
-                    continue
-            i += 1
+        for k in facts.outermost(lambda loop: loop.has_inner):
+            loop = facts.loops[k]
+            if not source.in_scope(loop.line - 1):
+                continue
+            if any_between(facts.swap_lines, first_inner[k], loop.end):
+                results.append(self._bubble_sort(source, loop.line, loop.end))
+            elif any_between(facts.size_lines, loop.line, loop.end):
+                results.append(self._nested_iteration(loop.line, loop.end))
         return results
+
+    def _bubble_sort(
+        self, source: SourceModel, line_start: int, line_end: int
+    ) -> DetectedPattern:
+        if source.language == "python":
+            suggestion = (
+                "Replace with sorted() or list.sort(), which use O(n log n) Timsort. "
+                "This reduces CPU cycles by ~100x for large inputs."
+            )
+        else:
+            suggestion = (
+                "Replace with std::sort() which uses O(n log n) introsort. "
+                "This reduces CPU cycles by ~100x for large inputs."
+            )
+        return DetectedPattern(
+            pattern_id=self.pattern_id,
+            name="O(n²) Bubble Sort Pattern",
+            severity=PatternSeverity.HIGH,
+            line_start=line_start,
+            line_end=line_end,
+            description=(
+                "Nested loop with element swapping detected. "
+                "This is characteristic of O(n²) sorting algorithms "
+                "like bubble sort or selection sort."
+            ),
+            suggestion=suggestion,
+            estimated_energy_cost=85.0,
+            estimated_energy_saved=60.0,
+        )
+
+    def _nested_iteration(self, line_start: int, line_end: int) -> DetectedPattern:
+        return DetectedPattern(
+            pattern_id=self.pattern_id,
+            name="O(n²) Nested Loop Iteration",
+            severity=PatternSeverity.MEDIUM,
+            line_start=line_start,
+            line_end=line_end,
+            description=(
+                "Nested loops iterating over collection size detected. "
+                "This results in O(n²) time complexity."
+            ),
+            suggestion=(
+                "Consider using a more efficient algorithm, hash map lookup, "
+                "or STL algorithms to reduce to O(n) or O(n log n)."
+            ),
+            estimated_energy_cost=70.0,
+            estimated_energy_saved=45.0,
+        )
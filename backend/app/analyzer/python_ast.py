@@ -0,0 +1,231 @@
+"""Python facts extracted from the stdlib ``ast`` in one parse and one walk.
+
+The regex detectors only approximate Python structure: loop bodies come
+from an indentation index, so a call split across continuation lines, a
+bracketed header or a ``while`` inside a string can throw them off. For
+``language == "python"`` the detectors consult ``SourceModel.python_facts``
+instead, which is built here from a single ``ast.parse`` (C speed) and a
+single iterative walk of the tree.
+
+``collect`` returns ``None`` when the code does not parse (a fragment, a
+Python 2 file, a merge conflict marker...); callers then fall back to the
+regex path.
+"""
+
+import ast
+import warnings
+from bisect import bisect_right
+from dataclasses import dataclass, field
+
+# Dotted call names per rule. ``session.<verb>`` also matches any
+# ``<x>.session.<verb>``, the same as the regex rule's ``\bsession\.``.
+_HTTP_VERBS = ("get", "post", "put", "delete", "patch", "head", "options")
+NETWORK_CALLS = frozenset(
+    [f"requests.{v}" for v in _HTTP_VERBS]
+    + [f"httpx.{v}" for v in _HTTP_VERBS + ("request",)]
+    + ["urllib.request.urlopen", "request.urlopen", "urlopen", "aiohttp.ClientSession"]
+)
+SESSION_CALLS = frozenset(
+    f"session.{v}" for v in ("get", "post", "put", "delete", "patch")
+)
+SLEEP_CALLS = frozenset({"time.sleep", "asyncio.sleep", "sleep"})
+URL_CALLS = frozenset(
+    [f"requests.{v}" for v in ("get", "post", "put", "delete", "patch")]
+    + [f"httpx.{v}" for v in ("get", "post", "put", "delete", "patch")]
+)
+SWAP_NAMES = frozenset({"temp", "tmp"})
+SIZE_NAMES = frozenset({"n", "len", "size"})
+
+_LOOP_NODES = (ast.For, ast.AsyncFor, ast.While)
+
+
+@dataclass
+class Loop:
+    """One ``for``/``async for``/``while`` statement (1-indexed lines).
+
+    ``end`` is the last line of the body, excluding any ``else:`` clause.
+    ``parent`` is the index of the innermost enclosing loop.
+    """
+
+    line: int
+    end: int
+    infinite: bool
+    parent: int | None
+    has_inner: bool = False
+
+
+@dataclass
+class PythonFacts:
+    loops: list[Loop] = field(default_factory=list)
+    # Per loop index: 1-indexed lines of network / sleep calls in its body
+    # (nested bodies included, headers excluded).
+    network_calls: dict[int, list[int]] = field(default_factory=dict)
+    sleep_calls: dict[int, list[int]] = field(default_factory=dict)
+    # URL literal -> 1-indexed lines of the calls using it, file-wide.
+    urls: dict[str, list[int]] = field(default_factory=dict)
+    # 1-indexed lines of swap-like statements and collection-size
+    # references, file-wide (rules check them against loop line spans).
+    swap_lines: list[int] = field(default_factory=list)
+    size_lines: list[int] = field(default_factory=list)
+
+    def outermost(self, predicate=None) -> list[int]:
+        """Indices of loops matching ``predicate`` that are not nested in
+        another loop matching it (all loops if no predicate)."""
+        result = []
+        covered: set[int] = set()
+        for k, loop in enumerate(self.loops):
+            hit = predicate is None or predicate(loop)
+            if loop.parent is not None and loop.parent in covered:
+                covered.add(k)
+                continue
+            if hit:
+                result.append(k)
+                covered.add(k)
+        return result
+
+
+def dotted_name(node: ast.AST) -> str | None:
+    """``a.b.c`` for a Name/Attribute chain, else None."""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return ".".join(reversed(parts))
+
+
+def _is_network(name: str) -> bool:
+    if name in NETWORK_CALLS:
+        return True
+    head, _, verb = name.rpartition(".")
+    return bool(head) and f"{head.rpartition('.')[2]}.{verb}" in SESSION_CALLS
+
+
+def _is_infinite(node: ast.AST) -> bool:
+    return (
+        isinstance(node, ast.While)
+        and isinstance(node.test, ast.Constant)
+        and node.test.value in (True, 1)
+    )
+
+
+def _is_swap_assign(node: ast.Assign) -> bool:
+    targets = node.targets
+    # ``a[i], a[j] = a[j], a[i]``
+    if (
+        len(targets) == 1
+        and type(targets[0]) is ast.Tuple
+        and type(node.value) is ast.Tuple
+        and any(type(t) is ast.Subscript for t in targets[0].elts)
+    ):
+        return True
+    return any(type(t) is ast.Name and t.id in SWAP_NAMES for t in targets)
+
+
+def _url_argument(node: ast.Call) -> str | None:
+    if not node.args:
+        return None
+    arg = node.args[0]
+    if (
+        type(arg) is ast.Constant
+        and isinstance(arg.value, str)
+        and arg.value.startswith(("http://", "https://"))
+    ):
+        return arg.value
+    return None
+
+
+def _body_span(node: ast.AST) -> tuple[tuple[int, int], tuple[int, int]]:
+    first, last = node.body[0], node.body[-1]
+    return (first.lineno, first.col_offset), (last.end_lineno, last.end_col_offset)
+
+
+def collect(code: str) -> PythonFacts | None:
+    """Parse ``code`` and gather every fact the Python rules need."""
+    try:
+        with warnings.catch_warnings():
+            # e.g. SyntaxWarning for invalid escape sequences in the input.
+            warnings.simplefilter("ignore")
+            tree = ast.parse(code)
+    except (SyntaxError, ValueError, RecursionError, MemoryError):
+        return None
+
+    # One flat walk with a type switch; nesting is recovered afterwards
+    # from source positions, which is much cheaper than threading the
+    # enclosing loops through the walk.
+    loop_nodes = []
+    network: list[tuple[int, int]] = []
+    sleeps: list[tuple[int, int]] = []
+    urls: dict[str, list[int]] = {}
+    swap_lines: set[int] = set()
+    size_lines: set[int] = set()
+    for node in ast.walk(tree):
+        t = type(node)
+        if t is ast.Call:
+            name = dotted_name(node.func)
+            if name is None:
+                continue
+            pos = (node.lineno, node.col_offset)
+            if _is_network(name):
+                network.append(pos)
+            if name in SLEEP_CALLS:
+                sleeps.append(pos)
+            if name in URL_CALLS:
+                url = _url_argument(node)
+                if url is not None:
+                    urls.setdefault(url, []).append(node.lineno)
+            if name.rpartition(".")[2] == "swap":
+                swap_lines.add(node.lineno)
+        elif t is ast.Name:
+            if node.id in SIZE_NAMES:
+                size_lines.add(node.lineno)
+        elif t is ast.Attribute:
+            if node.attr in ("size", "length"):
+                size_lines.add(node.lineno)
+        elif t is ast.Assign:
+            if _is_swap_assign(node):
+                swap_lines.add(node.lineno)
+        elif t in _LOOP_NODES:
+            loop_nodes.append(node)
+
+    facts = PythonFacts(
+        urls={url: sorted(lines) for url, lines in urls.items()},
+        swap_lines=sorted(swap_lines),
+        size_lines=sorted(size_lines),
+    )
+    loop_nodes.sort(key=lambda n: (n.lineno, n.col_offset))
+    spans = [_body_span(n) for n in loop_nodes]
+    # ``open_loops``: loops whose body may still contain the next start.
+    open_loops: list[int] = []
+    for k, node in enumerate(loop_nodes):
+        pos = (node.lineno, node.col_offset)
+        while open_loops and spans[open_loops[-1]][1] < pos:
+            open_loops.pop()
+        parent = open_loops[-1] if open_loops and spans[open_loops[-1]][0] <= pos else None
+        if parent is not None:
+            facts.loops[parent].has_inner = True
+        facts.loops.append(
+            Loop(
+                line=node.lineno,
+                end=spans[k][1][0],
+                infinite=_is_infinite(node),
+                parent=parent,
+            )
+        )
+        open_loops.append(k)
+
+    starts = [span[0] for span in spans]
+    for calls, target in ((network, facts.network_calls), (sleeps, facts.sleep_calls)):
+        for pos in calls:
+            # Latest loop starting before the call, then up its ancestors:
+            # every loop whose body holds the call is on that chain.
+            k = bisect_right(starts, pos) - 1
+            while k is not None and k >= 0:
+                if spans[k][0] <= pos <= spans[k][1]:
+                    target.setdefault(k, set()).add(pos[0])
+                k = facts.loops[k].parent
+        for k, lines in target.items():
+            target[k] = sorted(lines)
+    return facts
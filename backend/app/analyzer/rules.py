@@ -0,0 +1,48 @@
+"""Engine-wide compiled rule plan.
+
+Each detector declares the literal keywords its rules are anchored on
+(``PatternDetector.keywords``). The plan merges them per language into a
+single ``KeywordIndex`` so a file is prefiltered in one pass:
+
+  - no keyword anywhere in the file -> no detector can fire, skip analysis
+  - otherwise only detectors whose keywords occur are run, and they run
+    their full regexes on the candidate lines only.
+"""
+
+from app.analyzer.patterns.base import PatternDetector
+from app.analyzer.source import KeywordIndex, SourceModel
+
+
+class RulePlan:
+    def __init__(self, detectors: list[PatternDetector], language: str):
+        self.language = language
+        # (detector, keywords) for detectors that apply to this language;
+        # keywords of None means the detector opted out of prefiltering.
+        self._entries: list[tuple[PatternDetector, frozenset[str] | None]] = []
+        all_keywords: set[str] = set()
+        self._always_run = False
+        for detector in detectors:
+            keywords = detector.keywords(language)
+            if keywords is None:
+                self._always_run = True
+            elif not keywords:
+                continue
+            else:
+                all_keywords.update(keywords)
+            self._entries.append((detector, keywords))
+        self.index = KeywordIndex(all_keywords)
+
+    def matches(self, code: str) -> bool:
+        """Cheap whole-file check: can any detector fire on ``code``?"""
+        return self._always_run or self.index.search(code)
+
+    def build_source(self, code: str) -> SourceModel:
+        return SourceModel.build(code, self.language, self.index)
+
+    def active_detectors(self, source: SourceModel) -> list[PatternDetector]:
+        """Detectors with at least one keyword hit in ``source``."""
+        return [
+            detector
+            for detector, keywords in self._entries
+            if keywords is None or source.candidates(keywords)
+        ]
@@ -0,0 +1,437 @@
+"""Shared per-request source model used by every pattern detector.
+
+The engine builds one ``SourceModel`` per analysis and hands it to each
+detector, so the file is split, masked and brace-counted exactly once.
+
+Two masked views of the file are kept alongside the raw lines:
+  - ``code_lines``: comments AND string/char literal bodies blanked out.
+    Use for structure (braces, loop headers, allocations).
+  - ``text_lines``: only comments blanked out, string literals kept.
+    Use for rules that need literal contents (URLs, HTTP verbs).
+
+Blanking replaces characters with spaces (newlines are kept), so columns
+and line numbers in every view line up with the raw source.
+
+Block structure is indexed once (a bracket-matching stack for brace
+languages, an indentation stack for Python), so detectors look up loop body
+ranges in O(1) instead of rescanning forward from each header.
+
+Detectors find their candidate lines through ``candidates()``, backed by a
+single multi-keyword prefilter pass, and only run full rule regexes there.
+
+For Python, ``python_facts`` additionally exposes loops and calls from the
+stdlib ``ast`` (see ``app.analyzer.python_ast``).
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Iterable
+from app.analyzer.python_ast import PythonFacts, collect as collect_python_facts
+
+# ------------------------------------------------------------------ #
+# Comment / string literal tokenizers per language family.
+# Unterminated block comments and strings run to end of input / line
+# instead of failing, so a stray quote can never swallow the file.
+# ------------------------------------------------------------------ #
+
+_C_FAMILY_RE = re.compile(
+    r"//[^\n]*"
+    r"|/\*.*?(?:\*/|\Z)"
+    r'|"(?:\\.|[^"\\\n])*"?'
+    r"|'(?:\\.|[^'\\\n])*'?",
+    re.DOTALL,
+)
+
+_JS_RE = re.compile(
+    r"//[^\n]*"
+    r"|/\*.*?(?:\*/|\Z)"
+    r'|"(?:\\.|[^"\\\n])*"?'
+    r"|'(?:\\.|[^'\\\n])*'?"
+    r"|`(?:\\.|[^`\\])*`?",
+    re.DOTALL,
+)
+
+_PYTHON_RE = re.compile(
+    r"#[^\n]*"
+    r"|'''.*?(?:'''|\Z)"
+    r'|""".*?(?:"""|\Z)'
+    r'|"(?:\\.|[^"\\\n])*"?'
+    r"|'(?:\\.|[^'\\\n])*'?",
+    re.DOTALL,
+)
+
+_TOKENIZERS: dict[str, tuple[re.Pattern, tuple[str, ...]]] = {
+    "python": (_PYTHON_RE, ("#",)),
+    "javascript": (_JS_RE, ("//", "/*")),
+    "typescript": (_JS_RE, ("//", "/*")),
+}
+_DEFAULT_TOKENIZER = (_C_FAMILY_RE, ("//", "/*"))
+
+_NON_NEWLINE_RE = re.compile(r"[^\n]")
+_BRACE_RE = re.compile(r"[{}]")
+_NEWLINE_RE = re.compile(r"\n")
+_QUOTE_RE = re.compile(r"'''|\"\"\"|['\"`]")
+
+
+def _blank(text: str) -> str:
+    return _NON_NEWLINE_RE.sub(" ", text)
+
+
+def _blank_string(token: str) -> str:
+    """Blank a string literal's body but keep its delimiters."""
+    quote = _QUOTE_RE.match(token).group()
+    q = len(quote)
+    if len(token) >= 2 * q and token.endswith(quote):
+        return quote + _blank(token[q:-q]) + quote
+    return quote + _blank(token[q:])
+
+
+def _mask(code: str, language: str) -> tuple[str, str]:
+    """Return (code_text, text_text) with comments/strings blanked."""
+    pattern, comment_starts = _TOKENIZERS.get(language, _DEFAULT_TOKENIZER)
+    code_parts: list[str] = []
+    text_parts: list[str] = []
+    pos = 0
+    for m in pattern.finditer(code):
+        start, end = m.span()
+        if start > pos:
+            chunk = code[pos:start]
+            code_parts.append(chunk)
+            text_parts.append(chunk)
+        token = m.group()
+        if token.startswith(comment_starts):
+            blank = _blank(token)
+            code_parts.append(blank)
+            text_parts.append(blank)
+        else:
+            code_parts.append(_blank_string(token))
+            text_parts.append(token)
+        pos = end
+    if pos < len(code):
+        tail = code[pos:]
+        code_parts.append(tail)
+        text_parts.append(tail)
+    return "".join(code_parts), "".join(text_parts)
+
+
+def _index_braces(
+    code_lines: list[str],
+) -> tuple[dict[int, list[tuple[int, int]]], list[int]]:
+    """Match every ``{`` with its ``}`` in a single stack pass.
+
+    Returns ``(opens, next_open)``:
+      - ``opens[line]`` lists ``(column, close_line)`` for each ``{`` on that
+        line. Unmatched braces close on the last line, mirroring the old
+        "scan to end of file" behaviour without the rescans.
+      - ``next_open[i]`` is the first line ``>= i`` holding a ``{``
+        (``len(code_lines)`` if there is none).
+    """
+    n = len(code_lines)
+    opens: dict[int, list[tuple[int, int]]] = {}
+    stack: list[tuple[int, int]] = []  # (line, index into opens[line])
+    for i, line in enumerate(code_lines):
+        if "{" not in line and "}" not in line:
+            continue
+        for m in _BRACE_RE.finditer(line):
+            if m.group() == "{":
+                row = opens.setdefault(i, [])
+                stack.append((i, len(row)))
+                row.append((m.start(), n - 1))
+            elif stack:
+                line_no, k = stack.pop()
+                col, _ = opens[line_no][k]
+                opens[line_no][k] = (col, i)
+
+    next_open = [n] * (n + 1)
+    nxt = n
+    for i in range(n - 1, -1, -1):
+        if i in opens:
+            nxt = i
+        next_open[i] = nxt
+    return opens, next_open
+
+
+def _index_indentation(code_lines: list[str]) -> list[int]:
+    """Return ``block_end[i]``: the first non-blank line after ``i`` whose
+    indent is <= line ``i``'s indent (``len(code_lines)`` if none).
+
+    Blank and comment-only lines never close a block. One stack pass.
+    """
+    n = len(code_lines)
+    block_end = [n] * n
+    stack: list[tuple[int, int]] = []  # (indent, line)
+    for i, line in enumerate(code_lines):
+        stripped = line.lstrip()
+        if not stripped:
+            continue
+        indent = len(line) - len(stripped)
+        while stack and stack[-1][0] >= indent:
+            block_end[stack.pop()[1]] = i
+        stack.append((indent, i))
+    return block_end
+
+
+class KeywordIndex:
+    """Multi-literal prefilter: one regex pass marks the lines containing
+    any of a fixed set of literal tokens.
+
+    Keywords are matched case-sensitively as plain substrings, so the
+    candidate lines are a superset of what the full rule regexes accept.
+    A keyword that contains another keyword (``sendto`` / ``send``) is
+    served from the shorter one's hits.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        wanted = set(keywords)
+        # Keep only keywords that contain no other keyword; the rest alias.
+        self._base = sorted(
+            (k for k in wanted if not any(o != k and o in k for o in wanted)),
+            key=len,
+            reverse=True,
+        )
+        self.keywords = frozenset(wanted)
+        self._aliases = {
+            k: tuple(b for b in self._base if b in k) for k in wanted
+        }
+        alternation = "|".join(re.escape(k) for k in self._base)
+        if _has_overlap(self._base):
+            # Zero-width lookahead so overlapping keywords all register.
+            self._re = re.compile(f"(?=({alternation}))")
+        else:
+            self._re = re.compile(f"({alternation})")
+
+    def search(self, text: str) -> bool:
+        """True if any keyword occurs anywhere in ``text``."""
+        return bool(self._base) and self._re.search(text) is not None
+
+    def scan(self, text: str) -> dict[str, list[int]]:
+        """Return ``keyword -> sorted line indices`` for every keyword."""
+        base_hits: dict[str, list[int]] = {k: [] for k in self._base}
+        if self._base:
+            line_starts = [0]
+            line_starts.extend(m.end() for m in _NEWLINE_RE.finditer(text))
+            for m in self._re.finditer(text):
+                hits = base_hits[m.group(1)]
+                line = bisect_right(line_starts, m.start()) - 1
+                if not hits or hits[-1] != line:
+                    hits.append(line)
+        result = {}
+        for keyword, bases in self._aliases.items():
+            if len(bases) == 1:
+                result[keyword] = base_hits[bases[0]]
+            else:
+                result[keyword] = sorted(set().union(*(base_hits[b] for b in bases)))
+        return result
+
+
+_LOOP_KEYWORDS = ("for", "while")
+_LOOP_HEADER_RE = re.compile(r"\b(for|while)\b")
+_PY_DEF_RE = re.compile(r"^\s*(?:async\s+def|def|class)\b")
+
+
+def _merge_ranges(ranges: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    merged: list[tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _has_overlap(keywords: list[str]) -> bool:
+    """True if some keyword's suffix is another keyword's prefix."""
+    for a in keywords:
+        for b in keywords:
+            if any(b.startswith(a[i:]) for i in range(1, len(a))):
+                return True
+    return False
+
+
+@dataclass
+class SourceModel:
+    """Pre-processed view of one source file, shared by all detectors.
+
+    ``depth[i]`` is the brace depth at the start of line ``i`` (0-indexed),
+    counted on ``code_lines`` so braces in comments and literals are ignored.
+    ``depth`` has ``len(lines) + 1`` entries; the last one is the depth at
+    end of file.
+
+    Brace/indentation indexes and keyword hits are computed on first use,
+    so a detector that bails out early never pays for them.
+    """
+
+    language: str
+    lines: list[str]
+    code_lines: list[str]
+    text_lines: list[str]
+    # Optional 0-indexed, half-open line ranges. When set, loop (block)
+    # rules only consider headers inside these ranges; file-level rules
+    # still see the whole file. Used for diff-aware incremental analysis.
+    scope: list[tuple[int, int]] | None = None
+    _text: str = field(default="", repr=False)
+    _hits: dict[str, list[int]] = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def build(
+        cls, code: str, language: str, index: KeywordIndex | None = None
+    ) -> "SourceModel":
+        code_text, text_text = _mask(code, language)
+        source = cls(
+            language=language,
+            lines=code.split("\n"),
+            code_lines=code_text.split("\n"),
+            text_lines=text_text.split("\n"),
+            _text=text_text,
+        )
+        if index is not None:
+            source._hits.update(index.scan(text_text))
+        return source
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    @cached_property
+    def depth(self) -> list[int]:
+        depth = [0] * (len(self.code_lines) + 1)
+        d = 0
+        for i, line in enumerate(self.code_lines):
+            depth[i] = d
+            d += line.count("{") - line.count("}")
+        depth[len(self.code_lines)] = d
+        return depth
+
+    @cached_property
+    def python_facts(self) -> PythonFacts | None:
+        """AST facts for Python sources; None for other languages or when
+        the file does not parse (detectors then use the regex path)."""
+        if self.language != "python":
+            return None
+        return collect_python_facts("\n".join(self.lines))
+
+    @cached_property
+    def _brace_index(self) -> tuple[dict[int, list[tuple[int, int]]], list[int]]:
+        return _index_braces(self.code_lines)
+
+    @cached_property
+    def _block_end(self) -> list[int]:
+        return _index_indentation(self.code_lines)
+
+    def candidates(self, keywords: Iterable[str]) -> list[int]:
+        """Sorted indices of lines (in ``text_lines``) containing any of
+        ``keywords``. Served from the engine's prefilter pass when it
+        covered them, otherwise scanned on demand."""
+        keywords = tuple(keywords)
+        missing = [k for k in keywords if k not in self._hits]
+        if missing:
+            self._hits.update(KeywordIndex(missing).scan(self._text))
+        if len(keywords) == 1:
+            return self._hits[keywords[0]]
+        return sorted(set().union(*(self._hits[k] for k in keywords)))
+
+    def scoped_candidates(self, keywords: Iterable[str]) -> list[int]:
+        """Like ``candidates`` but restricted to ``scope`` when one is set."""
+        lines = self.candidates(keywords)
+        if self.scope is None:
+            return lines
+        scoped: list[int] = []
+        for start, end in self.scope:
+            scoped.extend(lines[bisect_left(lines, start):bisect_left(lines, end)])
+        return scoped
+
+    def in_scope(self, i: int) -> bool:
+        """True when line ``i`` (0-indexed) is inside ``scope`` (or there is
+        no scope)."""
+        if self.scope is None:
+            return True
+        k = bisect_right(self.scope, (i, float("inf"))) - 1
+        return k >= 0 and i < self.scope[k][1]
+
+    def loop_regions(self, changed: Iterable[int]) -> list[tuple[int, int]]:
+        """Return merged, sorted line ranges covering every outermost loop
+        span that contains one of the ``changed`` lines, plus the changed
+        lines themselves. Block rules re-run on exactly these ranges."""
+        spans = []
+        for i in self.candidates(_LOOP_KEYWORDS):
+            match = _LOOP_HEADER_RE.search(self.code_lines[i])
+            if match:
+                spans.append((i, max(i + 1, self.loop_body(i, match.end())[1])))
+
+        # Outermost spans only (spans are sorted by header line).
+        outer: list[tuple[int, int]] = []
+        for start, end in spans:
+            if outer and start < outer[-1][1]:
+                if end > outer[-1][1]:
+                    outer[-1] = (outer[-1][0], end)
+                continue
+            outer.append((start, end))
+        starts = [s for s, _ in outer]
+
+        ranges = []
+        for line in changed:
+            ranges.append((line, line + 1))
+            k = bisect_right(starts, line) - 1
+            if k >= 0 and line < outer[k][1]:
+                ranges.append(outer[k])
+        return _merge_ranges(ranges)
+
+    def brace_delta(self, i: int) -> int:
+        """Net change in brace depth contributed by line ``i``."""
+        return self.depth[i + 1] - self.depth[i]
+
+    def brace_body(self, start: int, col: int = 0) -> tuple[int, int]:
+        """Return ``(body_start, body_end)`` for the block opened by the first
+        ``{`` at or after column ``col`` of line ``start``.
+
+        ``body_end`` is exclusive and equals the 1-indexed line of the closing
+        brace. If no ``{`` follows, both are ``len(self)``.
+        """
+        opens, next_open = self._brace_index
+        row = opens.get(start)
+        if row is not None:
+            k = bisect_left(row, (col, -1))
+            if k < len(row):
+                return start + 1, row[k][1] + 1
+        line = next_open[start + 1]
+        if line >= len(self):
+            return len(self), len(self)
+        return line + 1, opens[line][0][1] + 1
+
+    def indent_body(self, start: int) -> tuple[int, int]:
+        """Return ``(body_start, body_end)`` for the Python block headed by
+        line ``start``; empty if the header has no ``:``."""
+        if ":" not in self.code_lines[start]:
+            return start + 1, start + 1
+        return start + 1, max(start + 1, self._block_end[start])
+
+    def loop_body(self, start: int, col: int = 0) -> tuple[int, int]:
+        """Return the body range of the loop headed at line ``start``."""
+        if self.language == "python":
+            return self.indent_body(start)
+        return self.brace_body(start, col)
+
+    def blocks(self) -> list[tuple[int, int]]:
+        """Every block as ``(header_line, last_line)``, 0-indexed and
+        inclusive, sorted by header: brace blocks for brace languages,
+        ``def``/``class`` bodies for Python."""
+        if self.language == "python":
+            blocks = []
+            for i, line in enumerate(self.code_lines):
+                if _PY_DEF_RE.match(line):
+                    end = max(i, self.indent_body(i)[1] - 1)
+                    while end > i and not self.code_lines[end].strip():
+                        end -= 1
+                    blocks.append((i, end))
+            return blocks
+        opens, _ = self._brace_index
+        # Outer blocks first when several open on the same line.
+        return sorted(
+            ((line, close) for line, row in opens.items() for _, close in row),
+            key=lambda block: (block[0], -block[1]),
+        )
+
+    def is_comment_only(self, i: int) -> bool:
+        """True when line ``i`` holds a comment and no code."""
+        return not self.text_lines[i].strip() and bool(self.lines[i].strip())
@@ -0,0 +1,170 @@
+"""Streaming, bounded-memory analysis for very large source files.
+
+Amalgamated or generated sources can run to tens of MB. Instead of
+decoding one huge string and building a SourceModel over all of it, the
+upload is read chunk by chunk and cut into *segments* at top-level
+boundaries (brace depth 0 for brace languages, a column-0 statement for
+Python). Each segment is analyzed on its own as soon as it is complete,
+so block findings are emitted while the rest of the file is still
+arriving and peak memory is bounded by the segment size, not file size.
+
+File-scoped rules (alloc/free balance, duplicate endpoints) see the file
+through ``PatternDetector.file_state``: per-segment state is merged as the
+stream advances and those findings are reported once the input ends.
+
+A single top-level block longer than ``max_segment_lines`` is cut at that
+size; loops spanning such a cut are analyzed in two halves.
+
+A segment the saturated engine does not take is retried after its
+Retry-After delay (``retry_saturated``); ``EngineSaturated`` escapes
+``run`` only once ``ANALYSIS_SATURATED_MAX_WAIT_SECONDS`` have passed.
+"""
+
+import codecs
+from typing import AsyncIterable, AsyncIterator
+
+from app.analyzer.engine import retry_saturated
+from app.analyzer.incremental import shift_pattern
+from app.analyzer.source import SourceModel
+from app.config import settings
+from app.models import DetectedPattern
+
+_CLOSERS = (")", "]", "}")
+
+
+class TopLevelSegmenter:
+    """Cuts incrementally fed text into segments at top-level boundaries.
+
+    ``feed`` returns completed ``(offset, code)`` segments, where ``offset``
+    is the 0-indexed file line the segment starts on. ``close`` flushes the
+    rest. A boundary search only runs once the buffer reaches the next
+    threshold, and the threshold doubles when none is found, so the
+    masking work stays linear in the input size.
+    """
+
+    def __init__(
+        self,
+        language: str,
+        segment_lines: int | None = None,
+        max_segment_lines: int | None = None,
+    ):
+        self.language = language
+        self.segment_lines = segment_lines or settings.STREAM_SEGMENT_LINES
+        self.max_segment_lines = max(
+            self.segment_lines, max_segment_lines or settings.STREAM_MAX_SEGMENT_LINES
+        )
+        self._lines: list[str] = []
+        self._partial = ""
+        self._offset = 0
+        self._next_try = self.segment_lines
+
+    @property
+    def total_lines(self) -> int:
+        return self._offset + len(self._lines)
+
+    def feed(self, text: str) -> list[tuple[int, str]]:
+        parts = (self._partial + text).split("\n")
+        self._partial = parts.pop()
+        self._lines.extend(parts)
+
+        segments = []
+        while len(self._lines) >= self._next_try:
+            cut = self._boundary()
+            if cut == 0:
+                if len(self._lines) < self.max_segment_lines:
+                    self._next_try = min(len(self._lines) * 2, self.max_segment_lines)
+                    break
+                cut = self.max_segment_lines
+            segments.append(self._emit(cut))
+            self._next_try = self.segment_lines
+        return segments
+
+    def close(self) -> list[tuple[int, str]]:
+        self._lines.append(self._partial)
+        self._partial = ""
+        return [self._emit(len(self._lines))]
+
+    def _emit(self, cut: int) -> tuple[int, str]:
+        segment = (self._offset, "\n".join(self._lines[:cut]))
+        del self._lines[:cut]
+        self._offset += cut
+        return segment
+
+    def _boundary(self) -> int:
+        """Largest ``c`` such that ``lines[:c]`` ends at top level, else 0.
+
+        Line ``c`` must start with code at brace depth 0 (not inside a
+        comment or string, which the masked view blanks out).
+        """
+        source = SourceModel.build("\n".join(self._lines), self.language)
+        depth = source.depth
+        python = self.language == "python"
+        for c in range(len(self._lines) - 1, 0, -1):
+            if depth[c] != 0:
+                continue
+            code = source.code_lines[c]
+            stripped = code.lstrip()
+            if not stripped or stripped[0] in "'\"`":
+                continue
+            if stripped[0] != self._lines[c].lstrip()[:1]:
+                continue  # line starts inside a comment/string token
+            if python and (
+                code[0].isspace()
+                or stripped.startswith(_CLOSERS)
+                or source.code_lines[c - 1].rstrip().endswith("\\")
+            ):
+                continue
+            return c
+        return 0
+
+
+class StreamAnalysis:
+    """Analysis of one streamed file.
+
+    Iterate ``run(chunks)`` for findings: block findings are yielded per
+    segment in line order, file-scoped findings once the input is
+    exhausted. ``total_lines`` is final after the iteration ends.
+    """
+
+    def __init__(
+        self,
+        engine,
+        language: str,
+        segment_lines: int | None = None,
+        max_segment_lines: int | None = None,
+    ):
+        self.engine = engine
+        self.language = language
+        self.segmenter = TopLevelSegmenter(language, segment_lines, max_segment_lines)
+        self._detectors = list(engine.detectors)
+        self._states: list[dict | None] = [None] * len(self._detectors)
+
+    @property
+    def total_lines(self) -> int:
+        return self.segmenter.total_lines
+
+    async def run(self, chunks: AsyncIterable[bytes | str]) -> AsyncIterator[DetectedPattern]:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        async for chunk in chunks:
+            text = decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+            for offset, code in self.segmenter.feed(text):
+                for pattern in await self._analyze(offset, code):
+                    yield pattern
+
+        tail = self.segmenter.feed(decoder.decode(b"", final=True))
+        for offset, code in tail + self.segmenter.close():
+            for pattern in await self._analyze(offset, code):
+                yield pattern
+
+        for detector, state in zip(self._detectors, self._states):
+            for pattern in detector.file_findings(state, self.total_lines):
+                yield pattern
+
+    async def _analyze(self, offset: int, code: str) -> list[DetectedPattern]:
+        patterns, states = await retry_saturated(
+            lambda: self.engine.analyze_segment_async(code, self.language)
+        )
+        for k, detector in enumerate(self._detectors):
+            self._states[k] = detector.merge_file_state(self._states[k], states[k], offset)
+        patterns.sort(key=lambda p: (p.line_start, p.line_end, p.pattern_id))
+        return [shift_pattern(p, offset) for p in patterns]
@@ -0,0 +1,292 @@
+"""Command line interface: ``python -m app scan <dir>``.
+
+Scans a whole tree without the HTTP API: files are analyzed in a process
+pool (one ``AnalysisEngine`` per worker, like ``mode="process"``), and
+findings plus estimated kWh, CO2 and EUR are rolled up per module (the
+first ``--depth`` directory levels) and printed as JSON.
+
+A hash cache (one file per scanned directory under the user cache
+directory, ``$XDG_CACHE_HOME/greenlinter`` or ``~/.cache/greenlinter``, by
+default; nothing is written into the scanned tree) makes re-scans
+incremental: a file whose size and mtime are unchanged is not read at
+all, one whose content hash is unchanged is not re-analyzed. The cache is
+discarded when the detector set changes.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from app.analyzer.energy_batch import count_matrix, estimate_batch
+from app.analyzer.engine import AnalysisEngine, init_worker, worker_engine
+from app.analyzer.patterns.memory import MemoryPatternDetector
+from app.analyzer.patterns.network import NetworkPatternDetector
+from app.analyzer.patterns.sorting import SortingPatternDetector
+from app.config import settings
+from app.models import DetectedPattern
+
+LANGUAGES_BY_EXTENSION = {
+    ".c": "c",
+    ".cc": "cpp",
+    ".cpp": "cpp",
+    ".cxx": "cpp",
+    ".h": "cpp",
+    ".hh": "cpp",
+    ".hpp": "cpp",
+    ".py": "python",
+    ".js": "javascript",
+    ".jsx": "javascript",
+    ".mjs": "javascript",
+    ".cjs": "javascript",
+    ".ts": "typescript",
+    ".tsx": "typescript",
+}
+
+# Directories never worth scanning (vendored, generated or tool state).
+SKIP_DIRS = frozenset(
+    {"node_modules", "__pycache__", "venv", "build", "dist", "target", "third_party", "vendor"}
+)
+
+_CACHE_VERSION = 1
+
+
+def make_engine() -> AnalysisEngine:
+    engine = AnalysisEngine(mode="inline")
+    engine.register(SortingPatternDetector())
+    engine.register(MemoryPatternDetector())
+    engine.register(NetworkPatternDetector())
+    return engine
+
+
+def default_cache_path(root: Path) -> Path:
+    """Hash cache file for the (resolved) scanned directory ``root``."""
+    base = os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache"
+    key = hashlib.sha256(str(root).encode()).hexdigest()[:16]
+    return Path(base) / "greenlinter" / f"scan-{key}.json"
+
+
+def walk(root: Path, max_bytes: int):
+    """Yield ``(relative_path, language, stat)`` for every analyzable file
+    under ``root``; hidden and ``SKIP_DIRS`` directories are pruned."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(
+            d for d in dirnames if not d.startswith(".") and d not in SKIP_DIRS
+        )
+        for name in sorted(filenames):
+            language = LANGUAGES_BY_EXTENSION.get(os.path.splitext(name)[1].lower())
+            if language is None:
+                continue
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if st.st_size > max_bytes:
+                continue
+            yield os.path.relpath(path, root), language, st
+
+
+# ------------------------------------------------------------------ #
+# Worker side. Reading and hashing happen in the workers too, so the
+# parent only walks the tree and ships paths.
+# ------------------------------------------------------------------ #
+
+
+def _scan_file(task: tuple[str, str, str]) -> tuple[str | None, list[dict] | None]:
+    """``(path, language, cached_sha)`` -> ``(sha, patterns)``; patterns is
+    None when the content still hashes to ``cached_sha``, and sha is None
+    when the file could not be read (removed or unreadable since the walk)."""
+    path, language, cached_sha = task
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None, None
+    sha = hashlib.sha256(data).hexdigest()
+    if sha == cached_sha:
+        return sha, None
+    code = data.decode("utf-8", errors="replace")
+    patterns = worker_engine().analyze(code, language)
+    return sha, [p.model_dump(mode="json") for p in patterns]
+
+
+def load_cache(path: Path, fingerprint: str) -> dict[str, dict]:
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != _CACHE_VERSION or data.get("fingerprint") != fingerprint:
+        return {}
+    return data.get("files", {})
+
+
+def save_cache(path: Path, fingerprint: str, files: dict[str, dict]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(
+        json.dumps({"version": _CACHE_VERSION, "fingerprint": fingerprint, "files": files})
+    )
+    os.replace(tmp, path)
+
+
+def module_of(relative_path: str, depth: int) -> str:
+    parts = Path(relative_path).parent.parts[:depth]
+    return "/".join(parts) or "."
+
+
+def _rollup(patterns: list[DetectedPattern], files: int, files_with_issues: int, energy: dict) -> dict:
+    return {
+        "files": files,
+        "files_with_issues": files_with_issues,
+        "patterns_count": len(patterns),
+        "patterns": dict(Counter(p.pattern_id for p in patterns).most_common()),
+        **energy,
+    }
+
+
+def scan(
+    root: Path,
+    depth: int = 1,
+    workers: int | None = None,
+    cache_path: Path | None = None,
+    use_cache: bool = True,
+    carbon_intensity_gco2_kwh: float | None = None,
+    max_bytes: int = 5 * 1024 * 1024,
+) -> dict:
+    """Scan ``root`` and return the JSON report (see the module docstring)."""
+    start = time.perf_counter()
+    root = root.resolve()
+    ci = (
+        carbon_intensity_gco2_kwh
+        if carbon_intensity_gco2_kwh is not None
+        else settings.CO2_PER_KWH * 1000
+    )
+    engine = make_engine()
+    cache_path = cache_path or default_cache_path(root)
+    cached = load_cache(cache_path, engine.fingerprint) if use_cache else {}
+
+    results: dict[str, dict] = {}
+    pending: list[tuple[str, str, os.stat_result, str]] = []
+    for rel, language, st in walk(root, max_bytes):
+        entry = cached.get(rel)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            results[rel] = entry
+        else:
+            pending.append((rel, language, st, entry["sha"] if entry else ""))
+
+    analyzed = 0
+    unreadable: list[str] = []
+    if pending:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_worker,
+            initargs=(engine.detectors,),
+        ) as pool:
+            tasks = [(str(root / rel), language, sha) for rel, language, _, sha in pending]
+            chunksize = max(1, min(64, len(tasks) // (4 * workers)))
+            for (rel, _, st, _), (sha, patterns) in zip(
+                pending, pool.map(_scan_file, tasks, chunksize=chunksize)
+            ):
+                if sha is None:
+                    unreadable.append(rel)
+                    continue
+                if patterns is None:
+                    patterns = cached[rel]["patterns"]
+                else:
+                    analyzed += 1
+                results[rel] = {
+                    "size": st.st_size,
+                    "mtime_ns": st.st_mtime_ns,
+                    "sha": sha,
+                    "patterns": patterns,
+                }
+
+    if use_cache:
+        save_cache(cache_path, engine.fingerprint, results)
+
+    by_module: dict[str, list[str]] = defaultdict(list)
+    for rel in results:
+        by_module[module_of(rel, depth)].append(rel)
+
+    module_patterns = [
+        [DetectedPattern.model_validate(p) for rel in paths for p in results[rel]["patterns"]]
+        for paths in by_module.values()
+    ]
+    # One vectorized estimate: a row per module; the total sums the rows.
+    energy = estimate_batch(count_matrix(module_patterns), ci)
+    modules = []
+    for i, (module, paths) in enumerate(by_module.items()):
+        with_issues = sum(bool(results[rel]["patterns"]) for rel in paths)
+        modules.append(
+            {"module": module, **_rollup(module_patterns[i], len(paths), with_issues, energy.record(i))}
+        )
+    modules.sort(key=lambda m: (-m["estimated_kwh"], m["module"]))
+
+    return {
+        "root": str(root),
+        "files": len(results),
+        "analyzed": analyzed,
+        # Served from the hash cache.
+        "cached": len(results) - analyzed,
+        # Found by the walk but not readable; left out of the report.
+        "unreadable": unreadable,
+        "elapsed_seconds": round(time.perf_counter() - start, 3),
+        "total": _rollup(
+            [p for patterns in module_patterns for p in patterns],
+            len(results),
+            sum(bool(entry["patterns"]) for entry in results.values()),
+            energy.total(),
+        ),
+        "modules": modules,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="greenlinter")
+    commands = parser.add_subparsers(dest="command", required=True)
+    scan_parser = commands.add_parser(
+        "scan", help="Analyze a directory tree and roll up energy per module"
+    )
+    scan_parser.add_argument("directory", type=Path)
+    scan_parser.add_argument(
+        "--depth", type=int, default=1, help="Directory levels that make a module (default 1)"
+    )
+    scan_parser.add_argument(
+        "--workers", type=int, default=None, help="Analysis processes (default: CPU count)"
+    )
+    scan_parser.add_argument(
+        "--cache", type=Path, default=None, help="Hash cache file (default: under $XDG_CACHE_HOME/greenlinter)"
+    )
+    scan_parser.add_argument("--no-cache", action="store_true", help="Analyze every file, keep no cache")
+    scan_parser.add_argument(
+        "--carbon-intensity",
+        type=float,
+        default=None,
+        help="gCO2/kWh for the CO2 estimate (default: CO2_PER_KWH)",
+    )
+    scan_parser.add_argument("--output", "-o", type=Path, default=None, help="Write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    if not args.directory.is_dir():
+        parser.error(f"not a directory: {args.directory}")
+    report = scan(
+        args.directory,
+        depth=args.depth,
+        workers=args.workers,
+        cache_path=args.cache,
+        use_cache=not args.no_cache,
+        carbon_intensity_gco2_kwh=args.carbon_intensity,
+    )
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
+    return 0
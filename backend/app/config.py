@@ -7,16 +7,104 @@ class Settings:
     ANTHROPIC_API_KEY: str = os.getenv("ANTHROPIC_API_KEY", "")
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
     AI_PROVIDER: str = os.getenv("AI_PROVIDER", "gemini")
+    # Provider clients are long-lived (see ProviderRegistry); these bound
+    # each provider's keep-alive connection pool.
+    AI_REQUEST_TIMEOUT: float = float(os.getenv("AI_REQUEST_TIMEOUT", "120"))
+    AI_POOL_MAX_CONNECTIONS: int = int(os.getenv("AI_POOL_MAX_CONNECTIONS", "20"))
+    AI_POOL_MAX_KEEPALIVE: int = int(os.getenv("AI_POOL_MAX_KEEPALIVE", "10"))
+    AI_POOL_KEEPALIVE_EXPIRY: float = float(os.getenv("AI_POOL_KEEPALIVE_EXPIRY", "60"))
+    # "full", "patch", "chunked" or "auto" (patch from AI_PATCH_MIN_LINES
+    # lines up, chunked when even that overflows the token budget), see
+    # app/ai/optimizer.py. Requests may pick another mode (output_mode).
+    AI_OUTPUT_MODE: str = os.getenv("AI_OUTPUT_MODE", "full")
+    AI_PATCH_MIN_LINES: int = int(os.getenv("AI_PATCH_MIN_LINES", "200"))
+    # Per-completion token budget: output limit sent to the provider, and
+    # the model's context window (prompt + output).
+    AI_MAX_OUTPUT_TOKENS: int = int(os.getenv("AI_MAX_OUTPUT_TOKENS", "8192"))
+    AI_CONTEXT_TOKENS: int = int(os.getenv("AI_CONTEXT_TOKENS", "32768"))
+    # Per-provider fan-out limits for concurrent optimizations (e.g. the
+    # hook's files); 0 disables the rate limit.
+    AI_MAX_CONCURRENCY: int = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+    AI_RATE_LIMIT_PER_MINUTE: float = float(os.getenv("AI_RATE_LIMIT_PER_MINUTE", "0"))
+    # Hedging for AI_PROVIDER="primary+secondary": the secondary starts once
+    # the primary has run longer than its observed AI_HEDGE_QUANTILE latency
+    # (AI_HEDGE_DEFAULT_DELAY until AI_HEDGE_MIN_SAMPLES calls succeeded),
+    # never earlier than AI_HEDGE_MIN_DELAY.
+    AI_HEDGE_QUANTILE: float = float(os.getenv("AI_HEDGE_QUANTILE", "0.95"))
+    AI_HEDGE_MIN_SAMPLES: int = int(os.getenv("AI_HEDGE_MIN_SAMPLES", "20"))
+    AI_HEDGE_DEFAULT_DELAY: float = float(os.getenv("AI_HEDGE_DEFAULT_DELAY", "15"))
+    AI_HEDGE_MIN_DELAY: float = float(os.getenv("AI_HEDGE_MIN_DELAY", "0.5"))
     DATABASE_PATH: str = os.getenv("DATABASE_PATH", "./data/greenlinter.db")
+    # Connection pool and pragmas (see app/db/pool.py).
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "4"))
+    DB_BUSY_TIMEOUT_SECONDS: float = float(os.getenv("DB_BUSY_TIMEOUT_SECONDS", "5"))
+    DB_CACHE_SIZE_KB: int = int(os.getenv("DB_CACHE_SIZE_KB", str(16 * 1024)))
+    DB_MMAP_SIZE: int = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+    DB_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+
+    # Background optimization jobs (/api/jobs), persisted in SQLite.
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    JOB_RETRY_BASE_SECONDS: float = float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))
+    JOB_POLL_SECONDS: float = float(os.getenv("JOB_POLL_SECONDS", "1"))
+    JOB_MAX_WAIT_SECONDS: float = float(os.getenv("JOB_MAX_WAIT_SECONDS", "60"))
+    JOB_RETENTION_SECONDS: int = int(os.getenv("JOB_RETENTION_SECONDS", str(24 * 3600)))
+    # A running job is leased to the process running it; the lease is renewed
+    # every third of JOB_LEASE_SECONDS and an expired one is taken over.
+    JOB_LEASE_SECONDS: float = float(os.getenv("JOB_LEASE_SECONDS", "30"))
 
     # Carbon intensity API configuration
     CARBON_INTENSITY_LOCATION: str = os.getenv("CARBON_INTENSITY_LOCATION", "EU")
+    CARBON_INTENSITY_TTL_SECONDS: int = int(os.getenv("CARBON_INTENSITY_TTL_SECONDS", "1800"))
+    # Locations the app keeps warm in the background (comma-separated);
+    # defaults to CARBON_INTENSITY_LOCATION.
+    CARBON_INTENSITY_PREWARM: str = os.getenv("CARBON_INTENSITY_PREWARM", "")
     ELECTRICITY_MAPS_API_KEY: str = os.getenv("ELECTRICITY_MAPS_API_KEY", "")
+    # How long live readings are kept in the carbon_readings table.
+    CARBON_HISTORY_RETENTION_SECONDS: int = int(
+        os.getenv("CARBON_HISTORY_RETENTION_SECONDS", str(30 * 24 * 3600))
+    )
 
     # Energy estimation defaults
     CO2_PER_KWH: float = 0.385  # kg CO2 per kWh (fallback, overridden by live API)
     COST_PER_KWH: float = 0.25  # EUR per kWh (cloud compute rate)
     ASSUMED_RUNS_PER_DAY: int = 1000
 
+    # Analysis execution: "inline", "thread" or "process" (see AnalysisEngine).
+    # 0 means "derive a default" (cpu_count workers, 4x workers in flight).
+    ANALYSIS_EXECUTION_MODE: str = os.getenv("ANALYSIS_EXECUTION_MODE", "thread")
+    ANALYSIS_MAX_WORKERS: int = int(os.getenv("ANALYSIS_MAX_WORKERS", "0"))
+    ANALYSIS_MAX_IN_FLIGHT: int = int(os.getenv("ANALYSIS_MAX_IN_FLIGHT", "0"))
+    ANALYSIS_RETRY_AFTER_SECONDS: int = int(os.getenv("ANALYSIS_RETRY_AFTER_SECONDS", "1"))
+    # How long a batch keeps retrying a file while the engine is saturated.
+    ANALYSIS_SATURATED_MAX_WAIT_SECONDS: float = float(
+        os.getenv("ANALYSIS_SATURATED_MAX_WAIT_SECONDS", "30")
+    )
+
+    # Analysis result cache (content-addressed, see app/analyzer/cache.py)
+    ANALYSIS_CACHE_MAX_BYTES: int = int(os.getenv("ANALYSIS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    ANALYSIS_CACHE_PERSISTENT: bool = os.getenv("ANALYSIS_CACHE_PERSISTENT", "true").lower() == "true"
+    ANALYSIS_CACHE_MAX_ROWS: int = int(os.getenv("ANALYSIS_CACHE_MAX_ROWS", "10000"))
+    # A persistent hit only refreshes the row's LRU timestamp (a write) when
+    # it is older than this, so hot keys don't queue reads on the writer.
+    ANALYSIS_CACHE_TOUCH_SECONDS: int = int(os.getenv("ANALYSIS_CACHE_TOUCH_SECONDS", "300"))
+
+    # LLM optimization cache (see app/ai/cache.py)
+    OPTIMIZATION_CACHE_ENABLED: bool = os.getenv("OPTIMIZATION_CACHE_ENABLED", "true").lower() == "true"
+    OPTIMIZATION_CACHE_TTL_SECONDS: int = int(os.getenv("OPTIMIZATION_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    OPTIMIZATION_CACHE_MAX_ROWS: int = int(os.getenv("OPTIMIZATION_CACHE_MAX_ROWS", "2000"))
+    # As ANALYSIS_CACHE_TOUCH_SECONDS, for cached optimizations.
+    OPTIMIZATION_CACHE_TOUCH_SECONDS: int = int(os.getenv("OPTIMIZATION_CACHE_TOUCH_SECONDS", "300"))
+
+    # Streaming analysis (/api/analyze/stream): target and hard cap for the
+    # number of lines analyzed at once.
+    STREAM_SEGMENT_LINES: int = int(os.getenv("STREAM_SEGMENT_LINES", "2000"))
+    STREAM_MAX_SEGMENT_LINES: int = int(os.getenv("STREAM_MAX_SEGMENT_LINES", "50000"))
+
+    # File contents kept by git blob SHA so the hook can send diffs only.
+    SOURCE_BLOB_MAX_ROWS: int = int(os.getenv("SOURCE_BLOB_MAX_ROWS", "5000"))
+    # As ANALYSIS_CACHE_TOUCH_SECONDS, for base blobs read in diff mode.
+    SOURCE_BLOB_TOUCH_SECONDS: int = int(os.getenv("SOURCE_BLOB_TOUCH_SECONDS", "300"))
+
 
 settings = Settings()
@@ -1,14 +1,69 @@
-import aiosqlite
+import asyncio
+import functools
 import json
 import os
+import time
+from contextlib import asynccontextmanager
 from app.config import settings
+from app.db.pool import ConnectionPool
+from app.metrics import DB_WRITE_SECONDS
 
 DB_PATH = settings.DATABASE_PATH
 
+# One pool per event loop (and DB_PATH), like the provider clients.
+_pools: dict[asyncio.AbstractEventLoop, ConnectionPool] = {}
+
+
+async def _pool() -> ConnectionPool:
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is not None and pool.path == DB_PATH:
+        return pool
+    # Replace a pool on an old DB_PATH; drop pools of loops that are gone.
+    stale = [pool] if pool is not None else []
+    for other in [other for other in _pools if other.is_closed()]:
+        stale.append(_pools.pop(other))
+    _pools[loop] = pool = ConnectionPool(DB_PATH)
+    for old in stale:
+        await old.close()
+    return pool
+
+
+@asynccontextmanager
+async def _read():
+    async with (await _pool()).read() as db:
+        yield db
+
+
+@asynccontextmanager
+async def _write():
+    """Serialized write transaction, committed on exit."""
+    async with (await _pool()).write() as db:
+        yield db
+
+
+async def close_db() -> None:
+    """Close this loop's connections (lifespan shutdown)."""
+    pool = _pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.close()
+
+
+def _timed_write(operation: str):
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with DB_WRITE_SECONDS.time(operation=operation):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
 
 async def init_db():
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _write() as db:
         await db.execute("""
             CREATE TABLE IF NOT EXISTS optimizations (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -28,9 +83,87 @@ async def init_db():
                 ai_provider TEXT
             )
         """)
-        await db.commit()
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS analysis_cache (
+                key TEXT PRIMARY KEY,
+                patterns TEXT NOT NULL,
+                last_used TEXT DEFAULT (datetime('now'))
+            )
+        """)
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_analysis_cache_last_used
+            ON analysis_cache (last_used)
+        """)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS source_blobs (
+                sha TEXT PRIMARY KEY,
+                code TEXT NOT NULL,
+                last_used TEXT DEFAULT (datetime('now'))
+            )
+        """)
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_source_blobs_last_used
+            ON source_blobs (last_used)
+        """)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS optimization_cache (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                created_at TEXT DEFAULT (datetime('now')),
+                last_used TEXT DEFAULT (datetime('now'))
+            )
+        """)
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_optimization_cache_last_used
+            ON optimization_cache (last_used)
+        """)
+        # Carbon intensity time series: one row per live reading, clustered
+        # by location and time. fetched_at is a Unix timestamp (seconds).
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS carbon_readings (
+                location TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                value REAL NOT NULL,
+                source TEXT NOT NULL,
+                PRIMARY KEY (location, fetched_at)
+            ) WITHOUT ROWID
+        """)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                request TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT NOT NULL DEFAULT '',
+                run_after TEXT DEFAULT (datetime('now')),
+                created_at TEXT DEFAULT (datetime('now')),
+                updated_at TEXT DEFAULT (datetime('now')),
+                lease_until REAL
+            )
+        """)
+        # Databases created before running jobs were leased.
+        cursor = await db.execute("PRAGMA table_info(jobs)")
+        if "lease_until" not in {row[1] for row in await cursor.fetchall()}:
+            await db.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL")
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after
+            ON jobs (status, run_after)
+        """)
+        # Steps a job finished before an attempt failed, so the retry can
+        # skip them; dropped when the job finishes.
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS job_steps (
+                job_id TEXT NOT NULL,
+                step INTEGER NOT NULL,
+                result TEXT NOT NULL,
+                PRIMARY KEY (job_id, step)
+            ) WITHOUT ROWID
+        """)
 
 
+@_timed_write("save_optimization")
 async def save_optimization(
     filename: str,
     language: str,
@@ -46,7 +179,7 @@ async def save_optimization(
     chain_of_thought: str,
     ai_provider: str,
 ):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _write() as db:
         await db.execute(
             """
             INSERT INTO optimizations
@@ -61,12 +194,10 @@ async def save_optimization(
                 original_code, optimized_code, chain_of_thought, ai_provider,
             ),
         )
-        await db.commit()
 
 
 async def get_dashboard_data() -> dict:
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with _read() as db:
         cursor = await db.execute(
             """
             SELECT
@@ -116,3 +247,349 @@ async def get_dashboard_data() -> dict:
             "sustainability_score": score,
             "history": history,
         }
+
+
+async def get_cached_analysis(key: str, touch_after_seconds: int = 0) -> str | None:
+    """Cached patterns for ``key``; ``last_used`` is only bumped when it is
+    older than ``touch_after_seconds``."""
+    async with _read() as db:
+        cursor = await db.execute(
+            "SELECT patterns, last_used <= datetime('now', ?) FROM analysis_cache WHERE key = ?",
+            (f"-{int(touch_after_seconds)} seconds", key),
+        )
+        row = await cursor.fetchone()
+    if row is None:
+        return None
+    if not row[1]:
+        return row[0]
+    async with _write() as db:
+        await db.execute(
+            "UPDATE analysis_cache SET last_used = datetime('now') WHERE key = ?",
+            (key,),
+        )
+    return row[0]
+
+
+@_timed_write("save_cached_analysis")
+async def save_cached_analysis(key: str, patterns_json: str, max_rows: int):
+    async with _write() as db:
+        await db.execute(
+            """
+            INSERT OR REPLACE INTO analysis_cache (key, patterns, last_used)
+            VALUES (?, ?, datetime('now'))
+            """,
+            (key, patterns_json),
+        )
+        # Keep the table bounded: drop least recently used rows.
+        await db.execute(
+            """
+            DELETE FROM analysis_cache WHERE key IN (
+                SELECT key FROM analysis_cache
+                ORDER BY last_used DESC
+                LIMIT -1 OFFSET ?
+            )
+            """,
+            (max_rows,),
+        )
+
+
+async def get_source_blob(sha: str, touch_after_seconds: int = 0) -> str | None:
+    """Stored content for ``sha``; ``last_used`` is only bumped when older
+    than ``touch_after_seconds``."""
+    async with _read() as db:
+        cursor = await db.execute(
+            "SELECT code, last_used <= datetime('now', ?) FROM source_blobs WHERE sha = ?",
+            (f"-{int(touch_after_seconds)} seconds", sha),
+        )
+        row = await cursor.fetchone()
+    if row is None:
+        return None
+    if not row[1]:
+        return row[0]
+    async with _write() as db:
+        await db.execute(
+            "UPDATE source_blobs SET last_used = datetime('now') WHERE sha = ?",
+            (sha,),
+        )
+    return row[0]
+
+
+@_timed_write("save_source_blob")
+async def save_source_blob(sha: str, code: str, max_rows: int):
+    async with _write() as db:
+        await db.execute(
+            """
+            INSERT OR REPLACE INTO source_blobs (sha, code, last_used)
+            VALUES (?, ?, datetime('now'))
+            """,
+            (sha, code),
+        )
+        await db.execute(
+            """
+            DELETE FROM source_blobs WHERE sha IN (
+                SELECT sha FROM source_blobs
+                ORDER BY last_used DESC
+                LIMIT -1 OFFSET ?
+            )
+            """,
+            (max_rows,),
+        )
+
+
+async def get_cached_optimization(
+    key: str, ttl_seconds: int, touch_after_seconds: int = 0
+) -> str | None:
+    """Return the cached result JSON for ``key`` unless older than the TTL;
+    ``last_used`` is only bumped when older than ``touch_after_seconds``."""
+    async with _read() as db:
+        cursor = await db.execute(
+            """
+            SELECT result, last_used <= datetime('now', ?) FROM optimization_cache
+            WHERE key = ? AND created_at >= datetime('now', ?)
+            """,
+            (f"-{int(touch_after_seconds)} seconds", key, f"-{ttl_seconds} seconds"),
+        )
+        row = await cursor.fetchone()
+    if row is None:
+        return None
+    if not row[1]:
+        return row[0]
+    async with _write() as db:
+        await db.execute(
+            "UPDATE optimization_cache SET last_used = datetime('now') WHERE key = ?",
+            (key,),
+        )
+    return row[0]
+
+
+@_timed_write("save_cached_optimization")
+async def save_cached_optimization(
+    key: str, result_json: str, ttl_seconds: int, max_rows: int
+):
+    async with _write() as db:
+        await db.execute(
+            """
+            INSERT OR REPLACE INTO optimization_cache (key, result, created_at, last_used)
+            VALUES (?, ?, datetime('now'), datetime('now'))
+            """,
+            (key, result_json),
+        )
+        # Expired rows first, then least recently used beyond max_rows.
+        await db.execute(
+            "DELETE FROM optimization_cache WHERE created_at < datetime('now', ?)",
+            (f"-{ttl_seconds} seconds",),
+        )
+        await db.execute(
+            """
+            DELETE FROM optimization_cache WHERE key IN (
+                SELECT key FROM optimization_cache
+                ORDER BY last_used DESC
+                LIMIT -1 OFFSET ?
+            )
+            """,
+            (max_rows,),
+        )
+
+
+@_timed_write("save_carbon_reading")
+async def save_carbon_reading(
+    location: str, value: float, source: str, fetched_at: float, retention_seconds: int
+):
+    async with _write() as db:
+        await db.execute(
+            """
+            INSERT OR REPLACE INTO carbon_readings (location, fetched_at, value, source)
+            VALUES (?, ?, ?, ?)
+            """,
+            (location, fetched_at, value, source),
+        )
+        await db.execute(
+            "DELETE FROM carbon_readings WHERE location = ? AND fetched_at < ?",
+            (location, fetched_at - retention_seconds),
+        )
+
+
+async def get_latest_carbon_readings(location: str | None = None) -> list[dict]:
+    """Newest reading per location (or for ``location`` only)."""
+    async with _read() as db:
+        cursor = await db.execute(
+            """
+            SELECT location, MAX(fetched_at), value, source FROM carbon_readings
+            WHERE ? IS NULL OR location = ?
+            GROUP BY location
+            """,
+            (location, location),
+        )
+        rows = await cursor.fetchall()
+        return [
+            {"location": r[0], "fetched_at": r[1], "value": r[2], "source": r[3]}
+            for r in rows
+        ]
+
+
+async def get_carbon_readings(location: str, since: float) -> list[dict]:
+    async with _read() as db:
+        cursor = await db.execute(
+            """
+            SELECT fetched_at, value, source FROM carbon_readings
+            WHERE location = ? AND fetched_at >= ?
+            ORDER BY fetched_at
+            """,
+            (location, since),
+        )
+        rows = await cursor.fetchall()
+        return [{"fetched_at": r[0], "value": r[1], "source": r[2]} for r in rows]
+
+
+# ------------------------------------------------------------------ #
+# Background jobs (see app/jobs.py). status: queued -> running -> done
+# or failed; a failed attempt goes back to queued until run_after. A
+# running job is leased until lease_until (Unix time), renewed by the
+# process running it; only an expired lease is recovered.
+# ------------------------------------------------------------------ #
+
+_JOB_COLUMNS = "id, kind, request, status, attempts, result, error, created_at, updated_at"
+
+
+def _job_row(row) -> dict:
+    return dict(zip(_JOB_COLUMNS.split(", "), row))
+
+
+@_timed_write("create_job")
+async def create_job(job_id: str, kind: str, request_json: str, retention_seconds: int):
+    async with _write() as db:
+        await db.execute(
+            "INSERT INTO jobs (id, kind, request) VALUES (?, ?, ?)",
+            (job_id, kind, request_json),
+        )
+        # Finished jobs are only kept for the retention period.
+        await db.execute(
+            """
+            DELETE FROM jobs
+            WHERE status IN ('done', 'failed') AND updated_at < datetime('now', ?)
+            """,
+            (f"-{retention_seconds} seconds",),
+        )
+
+
+async def claim_job(lease_seconds: float) -> dict | None:
+    """Atomically move the oldest due queued job to running, leased for
+    ``lease_seconds``, and return it (with ``attempts`` already counting
+    this run)."""
+    async with _write() as db:
+        cursor = await db.execute(
+            f"""
+            UPDATE jobs
+            SET status = 'running', attempts = attempts + 1, updated_at = datetime('now'),
+                lease_until = ?
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE status = 'queued' AND run_after <= datetime('now')
+                ORDER BY created_at, rowid
+                LIMIT 1
+            )
+            RETURNING {_JOB_COLUMNS}
+            """,
+            (time.time() + lease_seconds,),
+        )
+        row = await cursor.fetchone()
+        return _job_row(row) if row is not None else None
+
+
+@_timed_write("renew_job_lease")
+async def renew_job_lease(job_id: str, lease_seconds: float) -> bool:
+    """Extend a running job's lease; False once the job is no longer running."""
+    async with _write() as db:
+        cursor = await db.execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running'",
+            (time.time() + lease_seconds, job_id),
+        )
+        return cursor.rowcount > 0
+
+
+@_timed_write("finish_job")
+async def finish_job(job_id: str, status: str, result_json: str | None, error: str = ""):
+    async with _write() as db:
+        await db.execute(
+            """
+            UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = datetime('now')
+            WHERE id = ?
+            """,
+            (status, result_json, error, job_id),
+        )
+        await db.execute("DELETE FROM job_steps WHERE job_id = ?", (job_id,))
+
+
+@_timed_write("retry_job")
+async def retry_job(job_id: str, error: str, delay_seconds: float):
+    async with _write() as db:
+        await db.execute(
+            """
+            UPDATE jobs
+            SET status = 'queued', error = ?, updated_at = datetime('now'),
+                run_after = datetime('now', ?)
+            WHERE id = ?
+            """,
+            (error, f"+{int(delay_seconds)} seconds", job_id),
+        )
+
+
+@_timed_write("save_job_step")
+async def save_job_step(job_id: str, step: int, result_json: str):
+    async with _write() as db:
+        await db.execute(
+            "INSERT OR REPLACE INTO job_steps (job_id, step, result) VALUES (?, ?, ?)",
+            (job_id, step, result_json),
+        )
+
+
+async def get_job_steps(job_id: str) -> dict[int, str]:
+    """Results of the steps ``job_id`` finished in earlier attempts."""
+    async with _read() as db:
+        cursor = await db.execute(
+            "SELECT step, result FROM job_steps WHERE job_id = ?", (job_id,)
+        )
+        return {step: result for step, result in await cursor.fetchall()}
+
+
+async def get_job(job_id: str) -> dict | None:
+    async with _read() as db:
+        cursor = await db.execute(
+            f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+        )
+        row = await cursor.fetchone()
+        return _job_row(row) if row is not None else None
+
+
+@_timed_write("recover_jobs")
+async def recover_jobs(max_attempts: int) -> int:
+    """Queue again the running jobs whose lease expired, i.e. whose process
+    died (or fail them once out of attempts). Jobs another live process is
+    running keep renewing their lease and are left alone. Returns the
+    number requeued."""
+    now = time.time()
+    async with _write() as db:
+        await db.execute(
+            """
+            UPDATE jobs SET status = 'failed', error = 'interrupted too many times',
+                updated_at = datetime('now')
+            WHERE status = 'running' AND COALESCE(lease_until, 0) < ? AND attempts >= ?
+            """,
+            (now, max_attempts),
+        )
+        await db.execute(
+            """
+            DELETE FROM job_steps
+            WHERE job_id NOT IN (SELECT id FROM jobs WHERE status IN ('queued', 'running'))
+            """
+        )
+        cursor = await db.execute(
+            """
+            UPDATE jobs SET status = 'queued', run_after = datetime('now'),
+                updated_at = datetime('now')
+            WHERE status = 'running' AND COALESCE(lease_until, 0) < ?
+            """,
+            (now,),
+        )
+        requeued = cursor.rowcount
+        return requeued
@@ -0,0 +1,102 @@
+"""Long-lived SQLite connections for one event loop.
+
+Opening an ``aiosqlite`` connection starts a thread and opens the file;
+the pool does that once per connection instead of once per query, and
+each connection keeps its compiled statements (``cached_statements``),
+so the constant SQL in app/db/database.py is prepared only once.
+
+The database runs in WAL mode: readers see the last committed state and
+never wait for a writer, so dashboard and cache reads keep going while
+hook and job writes commit. Writes share one connection behind a lock
+(SQLite has a single writer anyway); up to ``size`` reader connections
+are opened on demand. Connections from other processes (more uvicorn
+workers) wait up to ``DB_BUSY_TIMEOUT_SECONDS`` for the write lock.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import aiosqlite
+
+from app.config import settings
+
+
+class ConnectionPool:
+    def __init__(self, path: str, size: int | None = None):
+        self.path = path
+        self.size = size or settings.DB_POOL_SIZE
+        self._writer: aiosqlite.Connection | None = None
+        self._writer_lock = asyncio.Lock()
+        self._idle: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._connections: list[aiosqlite.Connection] = []
+        self._readers = 0
+
+    async def _connect(self, readonly: bool) -> aiosqlite.Connection:
+        conn = aiosqlite.connect(
+            self.path,
+            timeout=settings.DB_BUSY_TIMEOUT_SECONDS,
+            cached_statements=settings.DB_STATEMENT_CACHE_SIZE,
+        )
+        # A pool whose loop went away without close() must not keep the
+        # interpreter from exiting.
+        conn.daemon = True
+        await conn
+        self._connections.append(conn)
+        if not readonly:
+            # Persistent in the database file; only a writer can switch it.
+            await conn.execute("PRAGMA journal_mode = WAL")
+        await conn.execute("PRAGMA synchronous = NORMAL")
+        await conn.execute(f"PRAGMA cache_size = -{settings.DB_CACHE_SIZE_KB}")
+        await conn.execute(f"PRAGMA mmap_size = {settings.DB_MMAP_SIZE}")
+        await conn.execute("PRAGMA temp_store = MEMORY")
+        if readonly:
+            await conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[aiosqlite.Connection]:
+        """A reader connection; does not wait for writes."""
+        if self._idle.empty() and self._readers < self.size:
+            self._readers += 1
+            try:
+                conn = await self._connect(readonly=True)
+            except BaseException:
+                self._readers -= 1
+                raise
+        else:
+            conn = await self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put_nowait(conn)
+
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[aiosqlite.Connection]:
+        """The writer connection, one transaction at a time: committed when
+        the block exits, rolled back if it raises."""
+        async with self._writer_lock:
+            if self._writer is None:
+                self._writer = await self._connect(readonly=False)
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+            await self._writer.commit()
+
+    async def close(self) -> None:
+        connections, self._connections = self._connections, []
+        self._writer = None
+        self._idle = asyncio.Queue()
+        self._readers = 0
+        for conn in connections:
+            # A connection thread dies if a query finishes after the loop
+            # that issued it closed (aiosqlite cannot deliver the result);
+            # closing it would wait forever.
+            if not conn.is_alive():
+                continue
+            try:
+                await asyncio.wait_for(conn.close(), settings.DB_BUSY_TIMEOUT_SECONDS)
+            except Exception:
+                pass
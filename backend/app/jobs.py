@@ -0,0 +1,175 @@
+"""Background optimization jobs persisted in SQLite.
+
+``/api/hook`` and ``/api/optimize`` hold the HTTP request open for the
+whole LLM round trip; a client that times out loses the result even though
+the server finishes the work. A job decouples the two: ``submit`` stores
+the request and returns an id at once, a pool of worker tasks runs the
+job's handler, and ``wait`` long-polls for the stored result.
+
+Handlers are registered per job kind (``register``, like detectors on the
+engine) and called as ``handler(app, job_id, request, last_attempt)``;
+they return a JSON-serialisable dict. An exception schedules a retry with
+exponential backoff until ``JOB_MAX_ATTEMPTS`` is reached, then the job
+fails. A handler with side effects per step records finished steps
+(``save_job_step``) and skips them on the retry (``get_job_steps``).
+
+Several processes can share the queue. A claimed job is leased to the
+process running it, which renews the lease while the handler runs; every
+process periodically queues again the running jobs whose lease expired,
+so jobs survive a crash or restart without being taken from a live
+sibling (the interrupted run counts as an attempt, so a job that keeps
+crashing the server eventually fails).
+"""
+
+import asyncio
+import json
+import uuid
+
+from app.config import settings
+from app.db.database import (
+    claim_job,
+    create_job,
+    finish_job,
+    get_job,
+    recover_jobs,
+    renew_job_lease,
+    retry_job,
+)
+from app.metrics import JOBS
+
+TERMINAL = ("done", "failed")
+
+
+class JobQueue:
+    def __init__(self):
+        self._handlers: dict = {}
+        self._app = None
+        self._tasks: list[asyncio.Task] = []
+        # Created in start(): asyncio events bind to the loop that uses them.
+        self._wakeup: asyncio.Event | None = None
+        # job id -> event set when the job reaches a terminal state.
+        self._finished: dict[str, asyncio.Event] = {}
+
+    def register(self, kind: str, handler) -> None:
+        self._handlers[kind] = handler
+
+    @property
+    def kinds(self) -> tuple[str, ...]:
+        return tuple(self._handlers)
+
+    async def start(self, app, workers: int | None = None) -> None:
+        self._app = app
+        self._wakeup = asyncio.Event()
+        self._finished.clear()
+        await recover_jobs(settings.JOB_MAX_ATTEMPTS)
+        self._tasks.append(asyncio.create_task(self._recover()))
+        for _ in range(settings.JOB_WORKERS if workers is None else workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def stop(self) -> None:
+        # Cancelled jobs stay 'running' and are recovered (here or by another
+        # process) once their lease expires.
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def submit(self, kind: str, request: dict) -> str:
+        job_id = uuid.uuid4().hex
+        await create_job(job_id, kind, json.dumps(request), settings.JOB_RETENTION_SECONDS)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def wait(self, job_id: str, timeout: float) -> dict | None:
+        """The job's row once finished, or as it is after ``timeout``
+        seconds; None for an unknown id.
+
+        Woken by this process's workers, and re-reads the row every
+        ``JOB_POLL_SECONDS`` for jobs run by another process.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        finished = self._finished.setdefault(job_id, asyncio.Event())
+        try:
+            while True:
+                job = await get_job(job_id)
+                if job is None or job["status"] in TERMINAL:
+                    return job
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return job
+                try:
+                    await asyncio.wait_for(
+                        finished.wait(), min(remaining, settings.JOB_POLL_SECONDS)
+                    )
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # Also after a timeout, or the entry outlives the poll. Another
+            # waiter on the same job then falls back to re-reading the row.
+            self._finished.pop(job_id, None)
+
+    def _notify(self, job_id: str) -> None:
+        finished = self._finished.pop(job_id, None)
+        if finished is not None:
+            finished.set()
+
+    async def _recover(self) -> None:
+        while True:
+            await asyncio.sleep(settings.JOB_LEASE_SECONDS)
+            if await recover_jobs(settings.JOB_MAX_ATTEMPTS):
+                self._wakeup.set()
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(settings.JOB_LEASE_SECONDS / 3)
+            if not await renew_job_lease(job_id, settings.JOB_LEASE_SECONDS):
+                return
+
+    async def _worker(self) -> None:
+        while True:
+            self._wakeup.clear()
+            job = await claim_job(settings.JOB_LEASE_SECONDS)
+            if job is None:
+                # Retries become due without a submit, so poll as well.
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), settings.JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            # Another job may be waiting behind this one.
+            self._wakeup.set()
+            heartbeat = asyncio.create_task(self._heartbeat(job["id"]))
+            try:
+                await self._run(job)
+            finally:
+                heartbeat.cancel()
+
+    async def _run(self, job: dict) -> None:
+        kind, attempts = job["kind"], job["attempts"]
+        last_attempt = attempts >= settings.JOB_MAX_ATTEMPTS
+        handler = self._handlers.get(kind)
+        try:
+            if handler is None:
+                raise LookupError(f"no handler for job kind {kind!r}")
+            result = await handler(
+                self._app, job["id"], json.loads(job["request"]), last_attempt
+            )
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            if last_attempt or handler is None:
+                await finish_job(job["id"], "failed", None, error)
+                JOBS.inc(kind=kind, outcome="failed")
+                self._notify(job["id"])
+            else:
+                delay = settings.JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+                await retry_job(job["id"], error, delay)
+                JOBS.inc(kind=kind, outcome="retried")
+            return
+        await finish_job(job["id"], "done", json.dumps(result))
+        JOBS.inc(kind=kind, outcome="done")
+        self._notify(job["id"])
+
+
+jobs = JobQueue()
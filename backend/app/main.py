@@ -1,12 +1,19 @@
+import asyncio
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.db.database import init_db
-from app.analyzer.engine import AnalysisEngine
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.ai.provider import providers
+from app.config import settings
+from app.db.database import close_db, init_db
+from app.jobs import jobs
+from app.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY
+from app.analyzer import carbon_intensity
+from app.analyzer.engine import AnalysisEngine, EngineSaturated
 from app.analyzer.patterns.sorting import SortingPatternDetector
 from app.analyzer.patterns.memory import MemoryPatternDetector
 from app.analyzer.patterns.network import NetworkPatternDetector
-from app.routers import analyze, optimize, dashboard
+from app.routers import analyze, optimize, dashboard, jobs as jobs_router
 
 
 @asynccontextmanager
@@ -18,8 +25,28 @@ async def lifespan(app: FastAPI):
     engine.register(MemoryPatternDetector())
     engine.register(NetworkPatternDetector())
     app.state.engine = engine
+    # Long-lived provider clients: connection pools survive across requests.
+    providers.warm(settings.AI_PROVIDER)
+    jobs.register("optimize", jobs_router.optimize_job)
+    jobs.register("hook", jobs_router.hook_job)
+    await jobs.start(app)
+    # Carbon intensity is fetched off the request path: keep the configured
+    # locations fresh in the background.
+    locations = [
+        loc.strip()
+        for loc in (settings.CARBON_INTENSITY_PREWARM or settings.CARBON_INTENSITY_LOCATION).split(",")
+        if loc.strip()
+    ]
+    await carbon_intensity.restore()
+    carbon_refresh = asyncio.create_task(carbon_intensity.keep_warm(locations))
     yield
-    # Shutdown - nothing to clean up
+    # Shutdown
+    carbon_refresh.cancel()
+    await carbon_intensity.aclose()
+    await jobs.stop()
+    engine.shutdown()
+    await providers.aclose()
+    await close_db()
 
 
 app = FastAPI(
@@ -37,11 +64,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(EngineSaturated)
+async def engine_saturated_handler(request: Request, exc: EngineSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 app.include_router(analyze.router, prefix="/api")
 app.include_router(optimize.router, prefix="/api")
 app.include_router(dashboard.router, prefix="/api")
+app.include_router(jobs_router.router, prefix="/api")
 
 
 @app.get("/api/health")
 async def health():
     return {"status": "ok"}
+
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of the in-process metrics."""
+    return PlainTextResponse(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
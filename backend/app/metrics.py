@@ -0,0 +1,270 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Kept dependency-free: counters and histograms with fixed label names, a
+registry that renders them for ``GET /api/metrics``, and snapshot/merge so
+process-pool workers can ship their samples back to the API process.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+    2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, ...], object] = {}
+        REGISTRY.register(self)
+
+    def _key(self, labels: dict[str, object]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _snapshot(self) -> dict:
+        return dict(self._values)
+
+    def _merge(self, values: dict) -> None:
+        with self._lock:
+            for key, amount in values.items():
+                self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _render(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+            for key, v in sorted(self._values.items())
+        ]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts..., sum, count]
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[-1] if state else 0
+
+    def _snapshot(self) -> dict:
+        return {key: list(state) for key, state in self._values.items()}
+
+    def _merge(self, values: dict) -> None:
+        with self._lock:
+            for key, other in values.items():
+                state = self._values.get(key)
+                if state is None:
+                    self._values[key] = list(other)
+                else:
+                    for i, v in enumerate(other):
+                        state[i] += v
+
+    def _render(self) -> list[str]:
+        lines = []
+        for key, state in sorted(self._values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, state):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+                )
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {state[-1]}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{labels} {state[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        out = []
+        for metric in self._metrics.values():
+            out.append(f"# HELP {metric.name} {metric.documentation}")
+            out.append(f"# TYPE {metric.name} {metric.type_name}")
+            out.extend(metric._render())
+        return "\n".join(out) + "\n"
+
+    def reset(self) -> None:
+        for metric in self._metrics.values():
+            metric.reset()
+
+    def snapshot_and_reset(self) -> dict:
+        """Samples recorded since the last call (used by pool workers)."""
+        snapshot = {}
+        for name, metric in self._metrics.items():
+            with metric._lock:
+                if metric._values:
+                    snapshot[name] = metric._snapshot()
+                    metric._values.clear()
+        return snapshot
+
+    def merge(self, snapshot: dict) -> None:
+        for name, values in snapshot.items():
+            self._metrics[name]._merge(values)
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ------------------------------------------------------------------ #
+# Application metrics
+# ------------------------------------------------------------------ #
+
+ANALYSIS_SECONDS = Histogram(
+    "greenlinter_analysis_seconds",
+    "Wall time of one AnalysisEngine run (pre-pass plus detectors).",
+    ("language",),
+)
+ANALYSIS_LINES = Counter(
+    "greenlinter_analysis_lines_total",
+    "Source lines submitted to the analysis engine.",
+    ("language",),
+)
+ANALYSIS_PREFILTER_SKIPS = Counter(
+    "greenlinter_analysis_prefilter_skips_total",
+    "Analyses skipped because no rule keyword occurs in the file.",
+    ("language",),
+)
+DETECTOR_SECONDS = Histogram(
+    "greenlinter_detector_seconds",
+    "Wall time spent in one detector per analysis.",
+    ("detector",),
+)
+DETECTOR_LINES = Counter(
+    "greenlinter_detector_lines_total",
+    "Source lines scanned by each detector.",
+    ("detector",),
+)
+DETECTOR_FINDINGS = Counter(
+    "greenlinter_detector_findings_total",
+    "Findings emitted by each detector.",
+    ("detector",),
+)
+ENERGY_ESTIMATE_SECONDS = Histogram(
+    "greenlinter_energy_estimate_seconds",
+    "Wall time of estimate_energy_live, including the carbon-intensity lookup.",
+)
+PROVIDER_SECONDS = Histogram(
+    "greenlinter_provider_optimize_seconds",
+    "Wall time of AI provider optimize_code calls.",
+    ("provider",),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+)
+PROVIDER_REQUESTS = Counter(
+    "greenlinter_provider_requests_total",
+    "AI provider optimize_code calls.",
+    ("provider",),
+)
+DB_WRITE_SECONDS = Histogram(
+    "greenlinter_db_write_seconds",
+    "Wall time of database writes.",
+    ("operation",),
+)
+PROVIDER_HEDGES = Counter(
+    "greenlinter_provider_hedges_total",
+    "Hedged provider calls by winner; hedged is whether a backup was started.",
+    ("provider", "winner", "hedged"),
+)
+OPTIMIZATION_CACHE_LOOKUPS = Counter(
+    "greenlinter_optimization_cache_lookups_total",
+    "Optimization cache lookups by outcome (hit, miss, bypass).",
+    ("result",),
+)
+SINGLEFLIGHT_SHARED = Counter(
+    "greenlinter_singleflight_shared_total",
+    "Calls that joined an identical in-flight call instead of starting one.",
+    ("operation",),
+)
+OPTIMIZATIONS = Counter(
+    "greenlinter_optimizations_total",
+    "LLM optimizations by output mode; outcome is ok, fallback or failed.",
+    ("mode", "outcome"),
+)
+JOBS = Counter(
+    "greenlinter_jobs_total",
+    "Background job attempts by kind; outcome is done, retried or failed.",
+    ("kind", "outcome"),
+)
@@ -1,8 +1,19 @@
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, field_validator, model_validator
 from enum import Enum
 from app.config import settings
 
 
+# LLM output modes, see app/ai/optimizer.py. An empty request value means
+# settings.AI_OUTPUT_MODE.
+OUTPUT_MODES = ("auto", "full", "patch", "chunked")
+
+
+def _check_output_mode(v: str) -> str:
+    if v and v not in OUTPUT_MODES:
+        raise ValueError(f"output_mode must be one of {', '.join(OUTPUT_MODES)}")
+    return v
+
+
 class PatternSeverity(str, Enum):
     LOW = "low"
     MEDIUM = "medium"
@@ -27,6 +38,18 @@ class AnalyzeRequest(BaseModel):
     language: str = "cpp"
 
 
+class AnalysisCacheStats(BaseModel):
+    hits: int
+    memory_hits: int
+    persistent_hits: int
+    misses: int
+    hit_ratio: float
+    entries: int
+    bytes: int
+    max_bytes: int
+    persistent: bool
+
+
 class AnalyzeResponse(BaseModel):
     filename: str
     patterns: list[DetectedPattern]
@@ -38,12 +61,58 @@ class AnalyzeResponse(BaseModel):
     carbon_intensity_gco2_kwh: float = 0.0
 
 
+class AnalyzeBatchRequest(BaseModel):
+    files: list[AnalyzeRequest]
+
+
+class AnalyzeBatchFileResult(AnalyzeResponse):
+    """One NDJSON record of /analyze/batch; ``index`` is the file's position
+    in the request (records arrive in completion order)."""
+
+    index: int
+
+
+class AnalyzeBatchSummary(BaseModel):
+    """Final NDJSON record of /analyze/batch, over all files."""
+
+    files: int
+    files_with_issues: int
+    # Files that got an ``error`` record instead of a result.
+    files_failed: int = 0
+    patterns_count: int
+    total_energy_score: float
+    optimized_energy_score: float
+    estimated_kwh: float
+    estimated_co2_kg: float
+    estimated_cost_eur: float
+    carbon_intensity_gco2_kwh: float = 0.0
+
+
+class AnalyzeStreamSummary(BaseModel):
+    """Final NDJSON record of /analyze/stream, after all findings."""
+
+    filename: str
+    lines: int
+    patterns_count: int
+    total_energy_score: float
+    optimized_energy_score: float
+    estimated_kwh: float
+    estimated_co2_kg: float
+    estimated_cost_eur: float
+    carbon_intensity_gco2_kwh: float = 0.0
+
+
 class OptimizeRequest(BaseModel):
     filename: str
     code: str
     patterns: list[DetectedPattern]
     language: str = "cpp"
     provider: str = ""
+    # Skip the optimization cache lookup (the fresh result is still stored).
+    no_cache: bool = False
+    output_mode: str = ""
+
+    _output_mode = field_validator("output_mode")(_check_output_mode)
 
     @field_validator("provider", mode="before")
     @classmethod
@@ -65,13 +134,26 @@ class OptimizeResponse(BaseModel):
 
 
 class HookFileRequest(BaseModel):
+    """A staged file: either full ``code`` or a diff against ``base_sha``.
+
+    Diff mode sends ``base_sha`` (blob SHA of the HEAD version), the staged
+    blob's ``new_sha`` and ``diff`` (``git diff --cached`` for the file).
+    """
+
     filename: str
-    code: str
+    code: str = ""
+    base_sha: str = ""
+    new_sha: str = ""
+    diff: str = ""
 
 
 class HookRequest(BaseModel):
     files: list[HookFileRequest]
     provider: str = ""
+    no_cache: bool = False
+    output_mode: str = ""
+
+    _output_mode = field_validator("output_mode")(_check_output_mode)
 
     @field_validator("provider", mode="before")
     @classmethod
@@ -88,12 +170,47 @@ class HookFileResult(BaseModel):
     savings_co2: float
     savings_eur: float
     chain_of_thought: str = ""
+    # Set when the server does not know ``base_sha`` or the diff did not
+    # apply; the client should resend the file with full ``code``.
+    needs_full_content: bool = False
 
 
 class HookResponse(BaseModel):
     results: list[HookFileResult]
 
 
+class JobRequest(BaseModel):
+    """``request`` is the body the matching synchronous endpoint takes:
+    an OptimizeRequest for ``optimize``, a HookRequest for ``hook``."""
+
+    kind: str
+    request: dict
+
+    @model_validator(mode="after")
+    def check_request(self) -> "JobRequest":
+        models = {"optimize": OptimizeRequest, "hook": HookRequest}
+        if self.kind not in models:
+            raise ValueError(f"kind must be one of {', '.join(models)}")
+        # Validate now (a bad job should fail the submit, not every retry)
+        # and store the normalised body, provider default included.
+        self.request = models[self.kind].model_validate(self.request).model_dump(mode="json")
+        return self
+
+
+class JobStatus(BaseModel):
+    id: str
+    kind: str
+    # queued, running, done or failed
+    status: str
+    attempts: int
+    # The synchronous endpoint's response body once done.
+    result: dict | None = None
+    # Last attempt's error (also set while a retry is queued).
+    error: str = ""
+    created_at: str
+    updated_at: str
+
+
 class OptimizationRecord(BaseModel):
     id: int
     timestamp: str
@@ -119,6 +236,19 @@ class DashboardData(BaseModel):
     history: list[OptimizationRecord]
 
 
+class CarbonReading(BaseModel):
+    # Unix timestamp of the fetch.
+    fetched_at: float
+    # gCO2/kWh
+    value: float
+    source: str
+
+
+class CarbonHistory(BaseModel):
+    location: str
+    readings: list[CarbonReading]
+
+
 class ROIRequest(BaseModel):
     kwh_price_eur: float = 0.25
     runs_per_day: int = 1000
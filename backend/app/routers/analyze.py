@@ -1,6 +1,26 @@
-from fastapi import APIRouter, Request
-from app.models import AnalyzeRequest, AnalyzeResponse
-from app.analyzer.energy import estimate_energy_live
+import asyncio
+import json
+from typing import AsyncIterable, Callable
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from multipart import MultipartParser
+from multipart.multipart import parse_options_header
+from app.models import (
+    AnalyzeBatchFileResult,
+    AnalyzeBatchRequest,
+    AnalyzeBatchSummary,
+    AnalyzeRequest,
+    AnalyzeResponse,
+    AnalyzeStreamSummary,
+    AnalysisCacheStats,
+)
+from app.analyzer.cache import analysis_cache
+from app.analyzer.carbon_intensity import get_carbon_intensity_gco2_kwh
+from app.analyzer.energy import estimate_energy_at, estimate_energy_live
+from app.analyzer.energy_batch import count_matrix, estimate_batch
+from app.analyzer.engine import EngineSaturated, retry_saturated
+from app.analyzer.stream import StreamAnalysis
 
 router = APIRouter()
 
@@ -8,7 +28,7 @@ router = APIRouter()
 @router.post("/analyze", response_model=AnalyzeResponse)
 async def analyze_code(req: AnalyzeRequest, request: Request):
     engine = request.app.state.engine
-    patterns = engine.analyze(req.code, req.language)
+    patterns = await analysis_cache.analyze(engine, req.code, req.language)
     energy = await estimate_energy_live(patterns)
 
     return AnalyzeResponse(
@@ -21,3 +41,236 @@ async def analyze_code(req: AnalyzeRequest, request: Request):
         estimated_cost_eur=energy["estimated_cost_eur"],
         carbon_intensity_gco2_kwh=energy.get("carbon_intensity_gco2_kwh", 0.0),
     )
+
+
+def _ndjson(record: dict) -> bytes:
+    return (json.dumps(record) + "\n").encode()
+
+
+async def _analyze_batch(engine, files: list[AnalyzeRequest]):
+    """NDJSON: one record per file as it completes, then a summary.
+
+    At most ``engine.max_workers`` files are analyzed at a time so one batch
+    cannot fill the engine's in-flight budget on its own; if other requests
+    do, the file is retried after the engine's Retry-After delay, for up to
+    ``ANALYSIS_SATURATED_MAX_WAIT_SECONDS``. A file that still cannot be
+    analyzed gets an ``error`` record and is left out of the summary. The
+    carbon intensity is looked up once for the whole batch.
+    """
+    carbon_intensity = await get_carbon_intensity_gco2_kwh()
+    limit = asyncio.Semaphore(engine.max_workers)
+
+    async def analyze_one(index: int, file: AnalyzeRequest):
+        async with limit:
+            try:
+                patterns = await retry_saturated(
+                    lambda: analysis_cache.analyze(engine, file.code, file.language)
+                )
+            except EngineSaturated as exc:
+                return index, file, exc
+            return index, file, patterns
+
+    tasks = [
+        asyncio.create_task(analyze_one(i, f)) for i, f in enumerate(files)
+    ]
+    analyzed: list[list] = []
+    files_with_issues = 0
+    files_failed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, file, patterns = await next_done
+            if isinstance(patterns, EngineSaturated):
+                files_failed += 1
+                yield _ndjson(
+                    {"event": "error", "index": index, "filename": file.filename,
+                     "detail": str(patterns)}
+                )
+                continue
+            analyzed.append(patterns)
+            files_with_issues += bool(patterns)
+            energy = estimate_energy_at(patterns, carbon_intensity)
+            result = AnalyzeBatchFileResult(
+                index=index, filename=file.filename, patterns=patterns, **energy
+            )
+            yield _ndjson({"event": "file", **result.model_dump(mode="json")})
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    energy = estimate_batch(count_matrix(analyzed), carbon_intensity).total()
+    summary = AnalyzeBatchSummary(
+        files=len(files),
+        files_with_issues=files_with_issues,
+        files_failed=files_failed,
+        patterns_count=sum(len(patterns) for patterns in analyzed),
+        **energy,
+    )
+    yield _ndjson({"event": "summary", **summary.model_dump(mode="json")})
+
+
+@router.post("/analyze/batch")
+async def analyze_batch(req: AnalyzeBatchRequest, request: Request):
+    """Analyze many files in one request, streaming NDJSON results."""
+    return StreamingResponse(
+        _analyze_batch(request.app.state.engine, req.files),
+        media_type="application/x-ndjson",
+    )
+
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse whose body iterator reads the request body itself.
+
+    The stock class listens for client disconnects on ``receive`` in
+    parallel, which would steal body chunks from ``request.stream()``. Here
+    a disconnect surfaces as ``ClientDisconnect`` from the stream instead.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def _stream_findings(
+    engine,
+    chunks: AsyncIterable[bytes],
+    filename: str | Callable[[], str],
+    language: str,
+):
+    """NDJSON: one ``finding`` record per pattern as soon as its segment is
+    analyzed, then a ``summary`` record with the energy estimate.
+
+    The 200 headers are already sent, so an engine that stays saturated
+    ends the stream with an ``error`` record instead of a summary.
+    """
+    patterns = []
+    stream = StreamAnalysis(engine, language)
+    try:
+        async for pattern in stream.run(chunks):
+            patterns.append(pattern)
+            yield _ndjson({"event": "finding", "pattern": pattern.model_dump(mode="json")})
+    except EngineSaturated as exc:
+        yield _ndjson(
+            {"event": "error", "filename": filename() if callable(filename) else filename,
+             "detail": str(exc), "retry_after": exc.retry_after}
+        )
+        return
+
+    energy = await estimate_energy_live(patterns)
+    summary = AnalyzeStreamSummary(
+        filename=filename() if callable(filename) else filename,
+        lines=stream.total_lines,
+        patterns_count=len(patterns),
+        total_energy_score=energy["total_energy_score"],
+        optimized_energy_score=energy["optimized_energy_score"],
+        estimated_kwh=energy["estimated_kwh"],
+        estimated_co2_kg=energy["estimated_co2_kg"],
+        estimated_cost_eur=energy["estimated_cost_eur"],
+        carbon_intensity_gco2_kwh=energy.get("carbon_intensity_gco2_kwh", 0.0),
+    )
+    yield _ndjson({"event": "summary", **summary.model_dump(mode="json")})
+
+
+@router.post("/analyze/stream")
+async def analyze_stream_raw(
+    request: Request, filename: str = "upload", language: str = "cpp"
+):
+    """Analyze a raw request body without buffering it.
+
+    Send the file as the body (any content type) with ``filename`` and
+    ``language`` as query parameters; the response is NDJSON.
+    """
+    return _DuplexStreamingResponse(
+        _stream_findings(request.app.state.engine, request.stream(), filename, language),
+        media_type="application/x-ndjson",
+    )
+
+
+class _MultipartFileStream:
+    """Bytes of the first file part of a multipart body, yielded as the
+    request arrives instead of being spooled to a temp file first."""
+
+    def __init__(self, request: Request, boundary: bytes):
+        self.request = request
+        self.boundary = boundary
+        self.filename = ""
+        self._pieces: list[bytes] = []
+        self._in_file = False
+        self._done = False
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._disposition)
+        self._disposition = b""
+        if b"filename" in options and not self._done:
+            self._in_file = True
+            self.filename = options[b"filename"].decode("utf-8", "replace")
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._in_file:
+            self._pieces.append(data[start:end])
+
+    def _on_part_end(self) -> None:
+        if self._in_file:
+            self._in_file = False
+            self._done = True
+
+    async def chunks(self):
+        parser = MultipartParser(
+            self.boundary,
+            {
+                "on_header_field": self._on_header_field,
+                "on_header_value": self._on_header_value,
+                "on_header_end": self._on_header_end,
+                "on_headers_finished": self._on_headers_finished,
+                "on_part_data": self._on_part_data,
+                "on_part_end": self._on_part_end,
+            },
+        )
+        async for chunk in self.request.stream():
+            parser.write(chunk)
+            if self._pieces:
+                yield b"".join(self._pieces)
+                self._pieces.clear()
+
+
+@router.post("/analyze/upload")
+async def analyze_stream_upload(
+    request: Request, filename: str = "", language: str = "cpp"
+):
+    """Multipart variant of /analyze/stream (first file part is analyzed,
+    ``language`` is a query parameter). The part is parsed on the fly, so
+    findings start streaming before the upload has finished."""
+    _, options = parse_options_header(request.headers.get("content-type", ""))
+    if b"boundary" not in options:
+        raise HTTPException(status_code=400, detail="Missing multipart boundary")
+    upload = _MultipartFileStream(request, options[b"boundary"])
+
+    async def records():
+        async for record in _stream_findings(
+            request.app.state.engine,
+            upload.chunks(),
+            lambda: filename or upload.filename or "upload",
+            language,
+        ):
+            yield record
+
+    return _DuplexStreamingResponse(records(), media_type="application/x-ndjson")
+
+
+@router.get("/analyze/cache", response_model=AnalysisCacheStats)
+async def analysis_cache_stats():
+    return AnalysisCacheStats(**analysis_cache.stats())
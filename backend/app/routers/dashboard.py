@@ -1,6 +1,7 @@
-from fastapi import APIRouter
-from app.models import DashboardData, ROIRequest, ROIResponse
-from app.db.database import get_dashboard_data
+import time
+from fastapi import APIRouter, Query
+from app.models import CarbonHistory, DashboardData, ROIRequest, ROIResponse
+from app.db.database import get_carbon_readings, get_dashboard_data
 from app.config import settings
 
 router = APIRouter()
@@ -29,3 +30,14 @@ async def calculate_roi(req: ROIRequest):
         annual_co2_saved=round(annual_co2, 4),
         annual_eur_saved=round(annual_eur, 4),
     )
+
+
+@router.get("/carbon-intensity/history", response_model=CarbonHistory)
+async def carbon_intensity_history(
+    location: str = "",
+    hours: float = Query(24, gt=0, description="How far back to go"),
+):
+    """Stored live readings for ``location``, oldest first."""
+    loc = (location or settings.CARBON_INTENSITY_LOCATION).upper()
+    readings = await get_carbon_readings(loc, time.time() - hours * 3600)
+    return CarbonHistory(location=loc, readings=readings)
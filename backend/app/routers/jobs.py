@@ -0,0 +1,76 @@
+import json
+from fastapi import APIRouter, HTTPException, Query
+from app.config import settings
+from app.db.database import get_job_steps, save_job_step
+from app.jobs import jobs
+from app.models import HookFileResult, HookRequest, JobRequest, JobStatus, OptimizeRequest
+from app.routers.optimize import finish_optimization, run_hook, run_optimization_request
+
+router = APIRouter()
+
+
+async def optimize_job(app, job_id: str, request: dict, last_attempt: bool) -> dict:
+    """Job handler for ``optimize``: /api/optimize in the background.
+
+    A degraded result (provider failure, original code returned) is
+    retried; the last attempt records it like the synchronous endpoint.
+    """
+    req = OptimizeRequest.model_validate(request)
+    result = await run_optimization_request(req)
+    if result.failed and not last_attempt:
+        raise RuntimeError(result.chain_of_thought)
+    response = await finish_optimization(req, result)
+    return response.model_dump(mode="json")
+
+
+async def hook_job(app, job_id: str, request: dict, last_attempt: bool) -> dict:
+    """Job handler for ``hook``: /api/hook in the background.
+
+    Files are recorded as they finish, so only an exception (not a file
+    whose optimization degraded) retries the job. Each finished file is
+    kept as a job step: the retry runs only the files that did not finish,
+    and the optimizations already saved are not saved again.
+    """
+    finished = {
+        index: HookFileResult.model_validate_json(result)
+        for index, result in (await get_job_steps(job_id)).items()
+    }
+
+    async def record(index: int, result: HookFileResult) -> None:
+        await save_job_step(job_id, index, result.model_dump_json())
+
+    response = await run_hook(
+        app.state.engine, HookRequest.model_validate(request), finished, record
+    )
+    return response.model_dump(mode="json")
+
+
+def _status(job: dict) -> JobStatus:
+    return JobStatus(
+        id=job["id"],
+        kind=job["kind"],
+        status=job["status"],
+        attempts=job["attempts"],
+        result=json.loads(job["result"]) if job["result"] else None,
+        error=job["error"],
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+    )
+
+
+@router.post("/jobs", response_model=JobStatus, status_code=202)
+async def submit_job(req: JobRequest):
+    """Queue an optimize or hook request; poll GET /api/jobs/{id}."""
+    job_id = await jobs.submit(req.kind, req.request)
+    return _status(await jobs.wait(job_id, 0))
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job_status(
+    job_id: str,
+    wait: float = Query(0, ge=0, description="Seconds to long-poll for completion"),
+):
+    job = await jobs.wait(job_id, min(wait, settings.JOB_MAX_WAIT_SECONDS))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return _status(job)
@@ -1,31 +1,56 @@
-from fastapi import APIRouter
+import asyncio
+import json
+from typing import Awaitable, Callable
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
 from app.models import (
     OptimizeRequest,
     OptimizeResponse,
+    HookFileRequest,
     HookRequest,
     HookResponse,
     HookFileResult,
 )
-from app.ai.provider import get_provider
-from app.analyzer.engine import AnalysisEngine
-from app.analyzer.energy import estimate_energy_live
-from app.analyzer.patterns.sorting import SortingPatternDetector
-from app.analyzer.patterns.memory import MemoryPatternDetector
-from app.analyzer.patterns.network import NetworkPatternDetector
-from app.db.database import save_optimization
+from app.ai.cache import optimization_cache
+from app.ai.optimizer import choose_mode
+from app.ai.provider import (
+    SECTIONS,
+    IncrementalResponseParser,
+    OptimizeResult,
+    get_provider,
+)
+from app.analyzer.cache import analysis_cache
+from app.analyzer.engine import retry_saturated
+from app.analyzer.energy import estimate_energy_at, estimate_energy_live
+from app.analyzer.incremental import DiffError, analyze_diff, git_blob_sha
+from app.db.database import get_source_blob, save_optimization, save_source_blob
 from app.config import settings
 
 router = APIRouter()
 
 
+async def run_optimization_request(req: OptimizeRequest) -> OptimizeResult:
+    provider = get_provider(settings.AI_PROVIDER)
+    return await optimization_cache.optimize(
+        provider, settings.AI_PROVIDER, req.code, req.patterns, req.language,
+        bypass=req.no_cache,
+        mode=choose_mode(req.code, req.patterns, req.output_mode),
+    )
+
+
 @router.post("/optimize", response_model=OptimizeResponse)
 async def optimize_code(req: OptimizeRequest):
-    provider = get_provider(settings.AI_PROVIDER)
-    result = await provider.optimize_code(req.code, req.patterns, req.language)
+    result = await run_optimization_request(req)
+    return await finish_optimization(req, result)
+
 
+async def finish_optimization(
+    req: OptimizeRequest, result: OptimizeResult
+) -> OptimizeResponse:
+    """Estimate savings, record the optimization and build the response."""
     energy_before = await estimate_energy_live(req.patterns)
     # After optimization, assume patterns are resolved
-    energy_after = await estimate_energy_live([])
+    energy_after = estimate_energy_at([], energy_before["carbon_intensity_gco2_kwh"])
 
     savings_kwh = energy_before["estimated_kwh"] - energy_after["estimated_kwh"]
     savings_co2 = energy_before["estimated_co2_kg"] - energy_after["estimated_co2_kg"]
@@ -64,77 +89,228 @@ async def optimize_code(req: OptimizeRequest):
     )
 
 
-@router.post("/hook", response_model=HookResponse)
-async def hook_endpoint(req: HookRequest):
-    # Create a fresh engine for hook processing
-    engine = AnalysisEngine()
-    engine.register(SortingPatternDetector())
-    engine.register(MemoryPatternDetector())
-    engine.register(NetworkPatternDetector())
-
-    results = []
-    for file in req.files:
-        language = (
-            "cpp" if file.filename.endswith((".cpp", ".hpp", ".cc", ".h")) else "python"
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _optimize_events(req: OptimizeRequest):
+    """SSE events for /api/optimize/stream.
+
+    Always full-file mode, since that is what the token stream renders.
+    ``start`` goes out before the provider is called, then every completion
+    delta as ``token``, each parsed section as ``section`` once complete, and
+    finally ``result`` with the same body /api/optimize returns. A provider
+    or cache lookup failure sends ``error`` and a ``result`` with the
+    original code, so the stream always ends with ``result``.
+    """
+    yield _sse("start", {"filename": req.filename, "provider": settings.AI_PROVIDER})
+    provider = get_provider(settings.AI_PROVIDER)
+    try:
+        key, result = await optimization_cache.lookup(
+            provider, settings.AI_PROVIDER, req.code, req.patterns, req.language,
+            bypass=req.no_cache,
         )
-        patterns = engine.analyze(file.code, language)
-
-        if not patterns:
-            results.append(
-                HookFileResult(
-                    filename=file.filename,
-                    had_issues=False,
-                    optimized_code=file.code,
-                    patterns_count=0,
-                    savings_kwh=0.0,
-                    savings_co2=0.0,
-                    savings_eur=0.0,
-                )
-            )
-            continue
-
-        # Optimize with AI
-        provider = get_provider(req.provider)
-        ai_result = await provider.optimize_code(file.code, patterns, language)
-
-        energy_before = await estimate_energy_live(patterns)
-        energy_after = await estimate_energy_live([])
-        savings_kwh = energy_before["estimated_kwh"] - energy_after["estimated_kwh"]
-        savings_co2 = (
-            energy_before["estimated_co2_kg"] - energy_after["estimated_co2_kg"]
+        if result is not None:
+            for section in SECTIONS:
+                yield _sse("section", {"section": section, "text": getattr(result, section)})
+        else:
+            parser = IncrementalResponseParser()
+            async for delta in provider.stream_completion(
+                req.code, req.patterns, req.language
+            ):
+                yield _sse("token", {"text": delta})
+                for section, text in parser.feed(delta):
+                    yield _sse("section", {"section": section, "text": text})
+            rest, result = parser.close()
+            for section, text in rest:
+                yield _sse("section", {"section": section, "text": text})
+            if key is not None:
+                await optimization_cache.put(key, result)
+    except Exception as e:
+        yield _sse("error", {"detail": str(e)})
+        result = OptimizeResult(
+            optimized_code=req.code,
+            chain_of_thought=f"AI optimization failed: {str(e)}. Original code returned.",
+            changes_summary="No changes - AI provider unavailable.",
+            failed=True,
         )
-        savings_eur = (
-            energy_before["estimated_cost_eur"] - energy_after["estimated_cost_eur"]
+    response = await finish_optimization(req, result)
+    yield _sse("result", response.model_dump(mode="json"))
+
+
+@router.post("/optimize/stream")
+async def optimize_stream(req: OptimizeRequest):
+    """Like /api/optimize, streamed as server-sent events."""
+    return StreamingResponse(
+        _optimize_events(req),
+        media_type="text/event-stream",
+        # Stop proxies from buffering the stream.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _needs_full_content(filename: str) -> HookFileResult:
+    return HookFileResult(
+        filename=filename,
+        had_issues=False,
+        optimized_code="",
+        patterns_count=0,
+        savings_kwh=0.0,
+        savings_co2=0.0,
+        savings_eur=0.0,
+        needs_full_content=True,
+    )
+
+
+async def _analyze_hook_file(engine, file: HookFileRequest, language: str):
+    """Return ``(code, patterns)`` for one staged file, or ``None`` when the
+    client must resend it with full content."""
+    if not file.base_sha:
+        return file.code, await analysis_cache.analyze(engine, file.code, language)
+
+    # Diff mode: rebuild the staged file from the stored base blob and only
+    # re-analyze the blocks the diff touches. Only findings in changed code
+    # are sent to the LLM.
+    base_code = await get_source_blob(file.base_sha, settings.SOURCE_BLOB_TOUCH_SECONDS)
+    if base_code is None:
+        return None
+    try:
+        incremental = await analyze_diff(engine, base_code, file.diff, language)
+    except DiffError:
+        return None
+    code = incremental.code
+    if file.new_sha and git_blob_sha(code) != file.new_sha:
+        return None
+    return code, incremental.changed_patterns
+
+
+async def _hook_file(
+    engine,
+    file: HookFileRequest,
+    provider_name: str,
+    analysis_limit: asyncio.Semaphore,
+    no_cache: bool,
+    output_mode: str,
+) -> HookFileResult:
+    language = (
+        "cpp" if file.filename.endswith((".cpp", ".hpp", ".cc", ".h")) else "python"
+    )
+
+    # Like /api/analyze/batch: at most max_workers files of one commit in
+    # the engine at once, retrying after Retry-After if others fill it. If
+    # it stays full, EngineSaturated fails the request (503) or the job
+    # (retried later).
+    async with analysis_limit:
+        analyzed = await retry_saturated(
+            lambda: _analyze_hook_file(engine, file, language)
         )
+    if analyzed is None:
+        return _needs_full_content(file.filename)
+    code, patterns = analyzed
+
+    await save_source_blob(git_blob_sha(code), code, settings.SOURCE_BLOB_MAX_ROWS)
 
-        # Save to DB
-        await save_optimization(
+    if not patterns:
+        return HookFileResult(
             filename=file.filename,
-            language=language,
-            patterns_found=len(patterns),
-            pattern_details=[p.model_dump() for p in patterns],
-            energy_before=energy_before["total_energy_score"],
-            energy_after=energy_after["total_energy_score"],
-            savings_kwh=savings_kwh,
-            savings_co2_kg=savings_co2,
-            savings_eur=savings_eur,
-            original_code=file.code,
-            optimized_code=ai_result.optimized_code,
-            chain_of_thought=ai_result.chain_of_thought,
-            ai_provider=req.provider,
+            had_issues=False,
+            optimized_code=code,
+            patterns_count=0,
+            savings_kwh=0.0,
+            savings_co2=0.0,
+            savings_eur=0.0,
         )
 
-        results.append(
-            HookFileResult(
-                filename=file.filename,
-                had_issues=True,
-                optimized_code=ai_result.optimized_code,
-                patterns_count=len(patterns),
-                savings_kwh=savings_kwh,
-                savings_co2=savings_co2,
-                savings_eur=savings_eur,
-                chain_of_thought=ai_result.chain_of_thought,
-            )
+    # Optimize with AI; the provider's limiter bounds concurrent calls.
+    provider = get_provider(provider_name)
+    ai_result = await optimization_cache.optimize(
+        provider, provider_name, code, patterns, language,
+        bypass=no_cache, mode=choose_mode(code, patterns, output_mode),
+    )
+
+    energy_before = await estimate_energy_live(patterns)
+    energy_after = estimate_energy_at([], energy_before["carbon_intensity_gco2_kwh"])
+    savings_kwh = energy_before["estimated_kwh"] - energy_after["estimated_kwh"]
+    savings_co2 = energy_before["estimated_co2_kg"] - energy_after["estimated_co2_kg"]
+    savings_eur = (
+        energy_before["estimated_cost_eur"] - energy_after["estimated_cost_eur"]
+    )
+
+    # Save to DB
+    await save_optimization(
+        filename=file.filename,
+        language=language,
+        patterns_found=len(patterns),
+        pattern_details=[p.model_dump() for p in patterns],
+        energy_before=energy_before["total_energy_score"],
+        energy_after=energy_after["total_energy_score"],
+        savings_kwh=savings_kwh,
+        savings_co2_kg=savings_co2,
+        savings_eur=savings_eur,
+        original_code=code,
+        optimized_code=ai_result.optimized_code,
+        chain_of_thought=ai_result.chain_of_thought,
+        ai_provider=provider_name,
+    )
+    # The client stages the optimized file, so it becomes the next base.
+    await save_source_blob(
+        git_blob_sha(ai_result.optimized_code),
+        ai_result.optimized_code,
+        settings.SOURCE_BLOB_MAX_ROWS,
+    )
+
+    return HookFileResult(
+        filename=file.filename,
+        had_issues=True,
+        optimized_code=ai_result.optimized_code,
+        patterns_count=len(patterns),
+        savings_kwh=savings_kwh,
+        savings_co2=savings_co2,
+        savings_eur=savings_eur,
+        chain_of_thought=ai_result.chain_of_thought,
+    )
+
+
+async def run_hook(
+    engine,
+    req: HookRequest,
+    finished: dict[int, HookFileResult] | None = None,
+    on_result: Callable[[int, HookFileResult], Awaitable[None]] | None = None,
+) -> HookResponse:
+    """Analyze and optimize every staged file concurrently.
+
+    Hook latency approaches that of the slowest file rather than the sum;
+    results keep the order of ``req.files``. Files whose index is in
+    ``finished`` (done by an earlier attempt of a hook job) are not run
+    again; ``on_result(index, result)`` is awaited as each other file
+    finishes. If a file raises, the others still finish before the first
+    error propagates, so a retry never races the attempt before it.
+    """
+    finished = finished or {}
+    analysis_limit = asyncio.Semaphore(engine.max_workers)
+
+    async def one(index: int, file: HookFileRequest) -> HookFileResult:
+        if index in finished:
+            return finished[index]
+        result = await _hook_file(
+            engine, file, req.provider, analysis_limit, req.no_cache, req.output_mode
         )
+        if on_result is not None:
+            await on_result(index, result)
+        return result
+
+    results = await asyncio.gather(
+        *(one(index, file) for index, file in enumerate(req.files)),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return HookResponse(results=list(results))
+
 
-    return HookResponse(results=results)
+@router.post("/hook", response_model=HookResponse)
+async def hook_endpoint(req: HookRequest, request: Request):
+    # Share the app engine so hook analysis runs on the same bounded
+    # worker pool as /api/analyze instead of on the event loop.
+    return await run_hook(request.app.state.engine, req)
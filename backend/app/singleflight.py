@@ -0,0 +1,51 @@
+"""Single-flight: concurrent calls for the same key share one execution.
+
+The first caller for a key starts the work as a task; callers arriving
+while it runs await the same task and get the same result (or exception).
+The key is released as soon as the task finishes, so later calls start
+fresh work (or hit whatever cache the work filled).
+
+The task is shielded from its callers: one client disconnecting does not
+cancel the work the other callers are waiting on. In-flight state is per
+event loop, like the provider clients and limiters.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Generic, TypeVar
+
+from app.metrics import SINGLEFLIGHT_SHARED
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    def __init__(self, operation: str):
+        # Metrics label for calls that joined an in-flight one.
+        self.operation = operation
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._flights: dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def _bind(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._flights = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run ``fn()``, or join the call already running for ``key``."""
+        self._bind()
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._flights[key] = task
+            task.add_done_callback(lambda _: self._release(key, task))
+        else:
+            SINGLEFLIGHT_SHARED.inc(operation=self.operation)
+        return await asyncio.shield(task)
+
+    def _release(self, key: str, task: asyncio.Task) -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
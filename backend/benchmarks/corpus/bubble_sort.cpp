@@ -0,0 +1,25 @@
+#include <vector>
+#include <iostream>
+
+void bubbleSort(std::vector<int>& arr) {
+    int n = arr.size();
+    for (int i = 0; i < n - 1; i++) {
+        for (int j = 0; j < n - i - 1; j++) {
+            if (arr[j] > arr[j + 1]) {
+                int temp = arr[j];
+                arr[j] = arr[j + 1];
+                arr[j + 1] = temp;
+            }
+        }
+    }
+}
+
+int main() {
+    std::vector<int> data = {64, 34, 25, 12, 22, 11, 90};
+    bubbleSort(data);
+    for (int x : data) {
+        std::cout << x << " ";
+    }
+    std::cout << std::endl;
+    return 0;
+}
@@ -0,0 +1,31 @@
+#include <stdio.h>
+#include <stdlib.h>
+
+double* multiply(const double* a, const double* b, int n) {
+    double* out = malloc(sizeof(double) * n * n);
+    for (int i = 0; i < n; i++) {
+        for (int j = 0; j < n; j++) {
+            double sum = 0.0;
+            for (int k = 0; k < n; k++) {
+                sum += a[i * n + k] * b[k * n + j];
+            }
+            out[i * n + j] = sum;
+        }
+    }
+    return out;
+}
+
+int main(void) {
+    int n = 256;
+    double* a = malloc(sizeof(double) * n * n);
+    double* b = malloc(sizeof(double) * n * n);
+    for (int i = 0; i < n * n; i++) {
+        a[i] = (double)rand() / RAND_MAX;
+        b[i] = (double)rand() / RAND_MAX;
+    }
+    double* c = multiply(a, b, n);
+    printf("%f\n", c[0]);
+    free(a);
+    free(b);
+    return 0;
+}
@@ -0,0 +1,26 @@
+import requests
+
+
+def selection_sort(values):
+    n = len(values)
+    for i in range(n):
+        smallest = i
+        for j in range(i + 1, n):
+            if values[j] < values[smallest]:
+                smallest = j
+        tmp = values[i]
+        values[i] = values[smallest]
+        values[smallest] = tmp
+    return values
+
+
+def fetch_prices(ids):
+    prices = []
+    for item_id in ids:
+        resp = requests.get(f"https://api.example.com/prices/{item_id}")
+        prices.append(resp.json()["price"])
+    return selection_sort(prices)
+
+
+if __name__ == "__main__":
+    print(fetch_prices(range(10)))
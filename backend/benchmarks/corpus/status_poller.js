@@ -0,0 +1,26 @@
+// Polls a job status endpoint until it reports completion.
+async function sleep(ms) {
+  return new Promise((resolve) => setTimeout(resolve, ms));
+}
+
+async function waitForJob(jobId) {
+  while (true) {
+    const res = await fetch(`https://api.example.com/jobs/${jobId}`);
+    const job = await res.json();
+    if (job.state === "done") {
+      return job;
+    }
+    await sleep(1000);
+  }
+}
+
+async function loadAll(ids) {
+  const results = [];
+  for (let i = 0; i < ids.length; i++) {
+    const res = await fetch("https://api.example.com/items/" + ids[i]);
+    results.push(await res.json());
+  }
+  return results;
+}
+
+module.exports = { waitForJob, loadAll };
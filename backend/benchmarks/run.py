@@ -0,0 +1,187 @@
+"""Detector performance benchmarks.
+
+Measures lines/sec and peak traced memory for every detector on its own
+and for the whole ``AnalysisEngine``, over synthetic sources (see
+``synthetic.py``) and the vendored real-world files in ``corpus/``.
+
+Run from ``backend/``::
+
+    python -m benchmarks.run                      # compare with baseline.json
+    python -m benchmarks.run --update-baseline    # record a new baseline
+    python -m benchmarks.run --lines 100000 --depth 3 --density 0.5
+
+Exits with status 1 when a throughput drops, or a peak memory grows, by
+more than ``--threshold`` (default 30%) relative to the baseline. Absolute
+numbers are machine dependent: record the baseline on the machine that
+runs the comparison.
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from app.analyzer.engine import AnalysisEngine
+from app.analyzer.patterns.memory import MemoryPatternDetector
+from app.analyzer.patterns.network import NetworkPatternDetector
+from app.analyzer.patterns.sorting import SortingPatternDetector
+from benchmarks.synthetic import LANGUAGES, generate
+
+HERE = Path(__file__).resolve().parent
+CORPUS_DIR = HERE / "corpus"
+BASELINE_PATH = HERE / "baseline.json"
+
+_EXTENSIONS = {".cpp": "cpp", ".cc": "cpp", ".c": "c", ".py": "python", ".js": "javascript"}
+
+
+def make_engine() -> AnalysisEngine:
+    engine = AnalysisEngine(mode="inline")
+    engine.register(SortingPatternDetector())
+    engine.register(MemoryPatternDetector())
+    engine.register(NetworkPatternDetector())
+    return engine
+
+
+def build_cases(lines: int, depth: int, density: float, seed: int) -> list[tuple[str, str, str]]:
+    """``(case_name, language, code)`` for every synthetic and corpus case.
+
+    Corpus files are repeated up to ``lines`` so throughput is measured on
+    a comparable amount of input.
+    """
+    cases = [
+        (f"synthetic-{language}", language, generate(language, lines, depth, density, seed))
+        for language in LANGUAGES
+    ]
+    for path in sorted(CORPUS_DIR.iterdir()):
+        language = _EXTENSIONS.get(path.suffix)
+        if language is None:
+            continue
+        text = path.read_text()
+        if not text.endswith("\n"):
+            text += "\n"
+        reps = max(1, lines // max(1, text.count("\n")))
+        cases.append((f"corpus-{path.name}", language, text * reps))
+    return cases
+
+
+def _targets(engine: AnalysisEngine, language: str):
+    yield "engine", lambda code: engine.analyze(code, language)
+    for detector in engine.detectors:
+        # An empty keyword set means the detector does not handle the language.
+        if detector.keywords(language) == frozenset():
+            continue
+        yield type(detector).__name__, lambda code, d=detector: d.detect(code, language)
+
+
+def measure(fn, code: str, repeat: int) -> tuple[float, int]:
+    """Best-of-``repeat`` wall time and peak traced memory of ``fn(code)``.
+
+    Memory is measured in a separate run, since tracing slows the code down.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(code)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(code)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def run(lines: int, depth: int, density: float, seed: int, repeat: int) -> dict:
+    engine = make_engine()
+    results = {}
+    for case, language, code in build_cases(lines, depth, density, seed):
+        n = len(code.split("\n"))
+        for target, fn in _targets(engine, language):
+            seconds, peak = measure(fn, code, repeat)
+            results[f"{case}:{target}"] = {
+                "lines": n,
+                "lines_per_sec": round(n / max(seconds, 1e-9)),
+                "peak_kib": round(peak / 1024, 1),
+            }
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Regression messages for entries worse than ``baseline`` by more than
+    ``threshold`` (a fraction)."""
+    problems = []
+    for key, base in baseline.items():
+        current = results.get(key)
+        if current is None:
+            continue
+        if current["lines_per_sec"] < base["lines_per_sec"] * (1 - threshold):
+            problems.append(
+                f"{key}: {current['lines_per_sec']} lines/s "
+                f"(baseline {base['lines_per_sec']})"
+            )
+        if current["peak_kib"] > base["peak_kib"] * (1 + threshold):
+            problems.append(
+                f"{key}: peak {current['peak_kib']} KiB (baseline {base['peak_kib']})"
+            )
+    return problems
+
+
+def _print_table(results: dict, baseline: dict) -> None:
+    print(f"{'case:target':58} {'lines/s':>11} {'base':>11} {'peak KiB':>10} {'base':>10}")
+    for key, r in results.items():
+        base = baseline.get(key, {})
+        print(
+            f"{key:58} {r['lines_per_sec']:>11} {base.get('lines_per_sec', '-'):>11} "
+            f"{r['peak_kib']:>10} {base.get('peak_kib', '-'):>10}"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--lines", type=int, default=20_000)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--density", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=0.30)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    params = {
+        "lines": args.lines,
+        "depth": args.depth,
+        "density": args.density,
+        "seed": args.seed,
+    }
+    results = run(args.lines, args.depth, args.density, args.seed, args.repeat)
+
+    if args.update_baseline:
+        args.baseline.write_text(
+            json.dumps({"params": params, "results": results}, indent=2) + "\n"
+        )
+        _print_table(results, {})
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    baseline = {}
+    if args.baseline.exists():
+        stored = json.loads(args.baseline.read_text())
+        if stored.get("params") == params:
+            baseline = stored["results"]
+        else:
+            print(f"Baseline params {stored.get('params')} differ from {params}; not comparing.")
+    _print_table(results, baseline)
+
+    problems = compare(results, baseline, args.threshold)
+    if problems:
+        print(f"\nRegressions beyond {args.threshold:.0%}:")
+        for problem in problems:
+            print(f"  {problem}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
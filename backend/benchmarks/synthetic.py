@@ -0,0 +1,108 @@
+"""Synthetic source generator for the detector benchmarks.
+
+Files are built from small function-sized units. Each unit is either an
+anti-pattern unit (nested loops with swaps, allocations or network calls
+at the innermost level) or a clean unit (nested ``if`` blocks and plain
+statements), picked at random with probability ``density``. ``depth``
+controls how deeply loops / blocks are nested inside every unit.
+
+Output is deterministic for a given ``seed``.
+"""
+
+import random
+
+LANGUAGES = ("cpp", "c", "python", "javascript")
+
+
+def _c_unit(k: int, depth: int, hot: bool, cpp: bool) -> list[str]:
+    lines = [f"int unit_{k}(int* arr, int n) {{", "    int total = 0;"]
+    pad = "    "
+    for d in range(depth):
+        if hot:
+            lines.append(f"{pad}for (int i{d} = 0; i{d} < n; i{d}++) {{")
+        else:
+            lines.append(f"{pad}if (n > {d}) {{")
+        pad += "    "
+    if hot:
+        alloc = "int* tmp = new int[16];" if cpp else "int* tmp = malloc(64);"
+        lines += [
+            f"{pad}if (arr[i0] > arr[n - 1]) {{",
+            f"{pad}    int temp = arr[i0];",
+            f"{pad}    arr[i0] = arr[n - 1];",
+            f"{pad}    arr[n - 1] = temp;",
+            f"{pad}}}",
+            f"{pad}{alloc}",
+        ]
+    else:
+        lines += [f"{pad}total += n * {k};", f"{pad}// clean branch {k}"]
+    for _ in range(depth):
+        pad = pad[:-4]
+        lines.append(f"{pad}}}")
+    lines += ["    return total;", "}", ""]
+    return lines
+
+
+def _python_unit(k: int, depth: int, hot: bool) -> list[str]:
+    lines = [f"def unit_{k}(items, session):", "    total = 0"]
+    pad = "    "
+    for d in range(depth):
+        lines.append(f"{pad}for x{d} in items:" if hot else f"{pad}if len(items) > {d}:")
+        pad += "    "
+    if hot:
+        lines += [
+            f"{pad}resp = requests.get(\"https://api.example.com/items/{k}\")",
+            f"{pad}total += len(resp.text)",
+        ]
+    else:
+        lines += [f"{pad}total += {k}", f"{pad}# clean branch {k}"]
+    lines += ["    return total", "", ""]
+    return lines
+
+
+def _js_unit(k: int, depth: int, hot: bool) -> list[str]:
+    lines = [f"async function unit{k}(items) {{", "  let total = 0;"]
+    pad = "  "
+    for d in range(depth):
+        if hot:
+            lines.append(f"{pad}for (let i{d} = 0; i{d} < items.length; i{d}++) {{")
+        else:
+            lines.append(f"{pad}if (items.length > {d}) {{")
+        pad += "  "
+    if hot:
+        lines += [
+            f"{pad}const res = await fetch(`/api/items/${{i0}}`);",
+            f"{pad}total += (await res.json()).length;",
+        ]
+    else:
+        lines += [f"{pad}total += {k};", f"{pad}// clean branch {k}"]
+    for _ in range(depth):
+        pad = pad[:-2]
+        lines.append(f"{pad}}}")
+    lines += ["  return total;", "}", ""]
+    return lines
+
+
+def generate(
+    language: str,
+    lines: int,
+    depth: int = 2,
+    density: float = 0.2,
+    seed: int = 0,
+) -> str:
+    """Return roughly ``lines`` lines of ``language`` source (never fewer)."""
+    if language not in LANGUAGES:
+        raise ValueError(f"Unsupported benchmark language: {language}")
+    depth = max(1, depth)
+    rng = random.Random(seed)
+    out: list[str] = []
+    k = 0
+    while len(out) < lines:
+        hot = rng.random() < density
+        if language in ("cpp", "c"):
+            out += _c_unit(k, depth, hot, cpp=language == "cpp")
+        elif language == "python":
+            out += _python_unit(k, depth, hot)
+        else:
+            out += _js_unit(k, depth, hot)
+        k += 1
+    return "\n".join(out) + "\n"
@@ -0,0 +1,151 @@
+"""Fixtures shared across the test modules: a temporary database, the
+standard detector engine and a scriptable AI provider. Tests marked
+``slow`` only run with ``pytest --runslow``."""
+
+import asyncio
+
+import pytest
+
+import app.db.database as db_module
+from app.ai.provider import AIProvider, OptimizeResult
+from app.analyzer.engine import AnalysisEngine
+from app.analyzer.patterns.memory import MemoryPatternDetector
+from app.analyzer.patterns.network import NetworkPatternDetector
+from app.analyzer.patterns.sorting import SortingPatternDetector
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--runslow", action="store_true", help="also run tests marked slow"
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: long-running test, needs --runslow")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--runslow"):
+        return
+    skip = pytest.mark.skip(reason="slow test, run with --runslow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Point the app at a fresh, initialized database of its own."""
+    monkeypatch.setattr(db_module, "DB_PATH", str(tmp_path / "test.db"))
+
+    async def init():
+        await db_module.init_db()
+        # Pools are per event loop; don't leave one behind on this loop.
+        await db_module.close_db()
+
+    asyncio.run(init())
+    return db_module.DB_PATH
+
+
+def build_engine(mode: str = "inline", **kwargs) -> AnalysisEngine:
+    engine = AnalysisEngine(mode=mode, **kwargs)
+    engine.register(SortingPatternDetector())
+    engine.register(MemoryPatternDetector())
+    engine.register(NetworkPatternDetector())
+    return engine
+
+
+@pytest.fixture(scope="session")
+def make_engine():
+    """``make_engine(mode="inline", **kwargs)``: an engine with every
+    built-in detector registered."""
+    return build_engine
+
+
+@pytest.fixture
+def engine():
+    """A fresh inline engine with every built-in detector."""
+    return build_engine()
+
+
+class FakeProvider(AIProvider):
+    """Scriptable provider.
+
+    Every call waits ``delay`` seconds, then raises ``RuntimeError("<label>
+    down")`` if ``fail`` is true (or, as a function, true for the prompt).
+    ``complete`` returns ``reply`` (a string, or a function of the prompt)
+    and ``stream_text`` yields it line by line, or yields ``chunks`` when
+    given. ``optimize_code`` goes through ``complete`` like a real provider
+    unless ``suffix`` is set: then it returns the code with ``suffix``
+    appended (``{n}`` is the call number), as a failed result if
+    ``degraded``.
+    """
+
+    def __init__(
+        self,
+        label: str = "fake",
+        *,
+        reply="",
+        suffix: str | None = None,
+        chunks: list[str] | None = None,
+        delay: float = 0.0,
+        fail=False,
+        degraded: bool = False,
+        model: str = "m",
+    ):
+        self.label = label
+        self.reply = reply
+        self.suffix = suffix
+        self.chunks = chunks
+        self.delay = delay
+        self.fail = fail
+        self.degraded = degraded
+        self.model = model
+        self.prompts: list[str] = []
+        self.calls = 0
+        self.optimize_calls = 0
+        self.cancelled = 0
+        self.active = 0
+        self.peak = 0
+
+    async def _call(self, prompt: str) -> None:
+        self.calls += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.active -= 1
+        if self.fail(prompt) if callable(self.fail) else self.fail:
+            raise RuntimeError(f"{self.label} down")
+
+    def _reply(self, prompt: str) -> str:
+        return self.reply(prompt) if callable(self.reply) else self.reply
+
+    async def complete(self, system, prompt):
+        self.prompts.append(prompt)
+        await self._call(prompt)
+        return self._reply(prompt)
+
+    async def stream_text(self, system, prompt):
+        self.prompts.append(prompt)
+        await self._call(prompt)
+        for part in self.chunks or self._reply(prompt).splitlines(keepends=True):
+            yield part
+
+    async def optimize_code(self, code, patterns, language):
+        if self.suffix is None:
+            return await super().optimize_code(code, patterns, language)
+        self.optimize_calls += 1
+        await self._call(code)
+        suffix = self.suffix.format(n=self.optimize_calls)
+        return OptimizeResult(code + suffix, "cot", "summary", self.degraded)
+
+
+@pytest.fixture
+def fake_provider():
+    """The ``FakeProvider`` class, to build providers in a test."""
+    return FakeProvider
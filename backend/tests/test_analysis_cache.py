@@ -0,0 +1,132 @@
+import asyncio
+
+import app.db.database as db_module
+from app.analyzer.cache import AnalysisCache
+from app.analyzer.engine import AnalysisEngine
+from app.analyzer.patterns.memory import MemoryPatternDetector
+from app.analyzer.patterns.sorting import SortingPatternDetector
+
+LEAKY = """
+void f(int n) {
+    for (int i = 0; i < n; i++) {
+        int* p = new int[8];
+    }
+}
+"""
+
+
+class CountingEngine(AnalysisEngine):
+    def __init__(self):
+        super().__init__()
+        self.runs = 0
+        self.register(MemoryPatternDetector())
+
+    def analyze(self, code, language):
+        self.runs += 1
+        return super().analyze(code, language)
+
+
+def test_repeat_analysis_hits_memory():
+    cache = AnalysisCache(max_bytes=1 << 20)
+    engine = CountingEngine()
+    first = asyncio.run(cache.analyze(engine, LEAKY, "cpp"))
+    second = asyncio.run(cache.analyze(engine, LEAKY, "cpp"))
+    assert first == second
+    assert len(first) >= 1
+    assert engine.runs == 1
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["misses"]) == (1, 1)
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_key_includes_language_and_fingerprint():
+    engine = CountingEngine()
+    fp = engine.fingerprint
+    assert AnalysisCache.key(LEAKY, "cpp", fp) != AnalysisCache.key(LEAKY, "c", fp)
+    engine.register(SortingPatternDetector())
+    assert engine.fingerprint != fp
+
+
+def test_fingerprint_tracks_detector_version():
+    class BumpedMemory(MemoryPatternDetector):
+        version = "3"
+
+    a, b = AnalysisEngine(), AnalysisEngine()
+    a.register(MemoryPatternDetector())
+    b.register(BumpedMemory())
+    assert a.fingerprint != b.fingerprint
+
+
+def test_lru_evicts_by_bytes():
+    cache = AnalysisCache(max_bytes=1 << 20)
+    engine = CountingEngine()
+    asyncio.run(cache.analyze(engine, LEAKY, "cpp"))
+    entry_size = cache.stats()["bytes"]
+
+    cache = AnalysisCache(max_bytes=entry_size * 2)
+    variants = [LEAKY + f"// {i}\n" for i in range(3)]
+    for code in variants:
+        asyncio.run(cache.analyze(engine, code, "cpp"))
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["bytes"] <= entry_size * 2
+
+    runs = engine.runs
+    asyncio.run(cache.analyze(engine, variants[0], "cpp"))  # evicted
+    assert engine.runs == runs + 1
+    asyncio.run(cache.analyze(engine, variants[2], "cpp"))  # still cached
+    assert engine.runs == runs + 1
+
+
+def test_persistent_tier_survives_memory_loss(temp_db):
+    cache = AnalysisCache(max_bytes=1 << 20, persistent=True)
+    engine = CountingEngine()
+    first = asyncio.run(cache.analyze(engine, LEAKY, "cpp"))
+    cache.clear()
+    second = asyncio.run(cache.analyze(engine, LEAKY, "cpp"))
+    assert first == second
+    assert engine.runs == 1
+    assert cache.stats()["persistent_hits"] == 1
+
+
+def test_persistent_tier_bounded(temp_db):
+    async def run():
+        for i in range(5):
+            await db_module.save_cached_analysis(f"k{i}", "[]", max_rows=3)
+        return [await db_module.get_cached_analysis(f"k{i}") for i in range(5)]
+
+    results = asyncio.run(run())
+    assert sum(r is not None for r in results) == 3
+
+
+def test_memory_budget_counts_encoded_bytes():
+    from tests.test_energy import make_pattern
+
+    pattern = make_pattern("memory_leak").model_copy(update={"description": "Speicherleck ✗" * 50})
+    cache = AnalysisCache(max_bytes=1 << 20)
+    asyncio.run(cache.put("k", [pattern]))
+    raw = cache._entries["k"]
+    assert cache.stats()["bytes"] == len(raw) > len(raw.decode())
+
+
+def test_persistent_hit_touches_last_used_only_when_stale(temp_db):
+    import aiosqlite
+
+    async def last_used(db):
+        cursor = await db.execute("SELECT last_used FROM analysis_cache WHERE key = 'k'")
+        return (await cursor.fetchone())[0]
+
+    async def run():
+        await db_module.save_cached_analysis("k", "[]", max_rows=10)
+        async with aiosqlite.connect(db_module.DB_PATH) as db:
+            await db.execute("UPDATE analysis_cache SET last_used = datetime('now', '-60 seconds')")
+            await db.commit()
+            recent = await last_used(db)
+            await db_module.get_cached_analysis("k", touch_after_seconds=300)
+            untouched = await last_used(db)
+            await db_module.get_cached_analysis("k", touch_after_seconds=30)
+            touched = await last_used(db)
+        return recent, untouched, touched
+
+    recent, untouched, touched = asyncio.run(run())
+    assert untouched == recent
+    assert touched > recent
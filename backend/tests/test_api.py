@@ -1,33 +1,12 @@
-import os
 import pytest
 from fastapi.testclient import TestClient
 
-# Use a temp database for tests
-os.environ["DATABASE_PATH"] = "/tmp/greenlinter_test.db"
-
 from app.main import app as fastapi_app
-from app.analyzer.engine import AnalysisEngine
-from app.analyzer.patterns.sorting import SortingPatternDetector
-from app.analyzer.patterns.memory import MemoryPatternDetector
-from app.db.database import init_db
-import app.db.database as db_module
-
-db_module.DB_PATH = "/tmp/greenlinter_test.db"
 
 
 @pytest.fixture(autouse=True)
-def setup_app():
-    import asyncio
-    loop = asyncio.new_event_loop()
-    loop.run_until_complete(init_db())
-    engine = AnalysisEngine()
-    engine.register(SortingPatternDetector())
-    engine.register(MemoryPatternDetector())
+def setup_app(temp_db, engine):
     fastapi_app.state.engine = engine
-    yield
-    loop.close()
-    if os.path.exists("/tmp/greenlinter_test.db"):
-        os.remove("/tmp/greenlinter_test.db")
 
 
 @pytest.fixture
@@ -114,3 +93,299 @@ def test_dashboard_empty(client):
     assert "sustainability_score" in data
     assert "history" in data
     assert data["total_optimizations"] == 0
+
+
+def test_carbon_intensity_history(client):
+    import asyncio
+    import time
+    import app.db.database as db_module
+
+    now = time.time()
+    asyncio.run(db_module.save_carbon_reading("GB", 150.0, "carbonintensity.org.uk", now - 7200, 86400))
+    asyncio.run(db_module.save_carbon_reading("GB", 140.0, "carbonintensity.org.uk", now - 60, 86400))
+    response = client.get("/api/carbon-intensity/history", params={"location": "gb", "hours": 1})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["location"] == "GB"
+    assert [r["value"] for r in data["readings"]] == [140.0]
+    assert data["readings"][0]["source"] == "carbonintensity.org.uk"
+
+
+def test_analysis_cache_stats(client):
+    code = "void f() { int* p = new int[4]; }\n"
+    body = {"filename": "cached.cpp", "code": code, "language": "cpp"}
+    before = client.get("/api/analyze/cache").json()
+    first = client.post("/api/analyze", json=body).json()
+    second = client.post("/api/analyze", json=body).json()
+    after = client.get("/api/analyze/cache").json()
+    assert first["patterns"] == second["patterns"]
+    assert after["hits"] >= before["hits"] + 1
+    assert after["entries"] >= 1
+
+
+def test_hook_diff_mode_requests_full_content_for_unknown_base(client):
+    code = "int add(int a, int b) {\n    return a + b;\n}\n"
+    diff_payload = {
+        "filename": "add.cpp",
+        "base_sha": "0" * 40,
+        "diff": "@@ -2 +2 @@\n-    return a + b;\n+    return b + a;\n",
+    }
+    response = client.post("/api/hook", json={"files": [diff_payload], "provider": "ollama"})
+    assert response.status_code == 200
+    assert response.json()["results"][0]["needs_full_content"] is True
+
+    # Sending the full file stores it as a base for later diffs.
+    response = client.post("/api/hook", json={
+        "files": [{"filename": "add.cpp", "code": code}], "provider": "ollama",
+    })
+    assert response.json()["results"][0]["had_issues"] is False
+
+    from app.analyzer.incremental import git_blob_sha
+    new_code = code.replace("a + b", "b + a")
+    diff_payload.update(base_sha=git_blob_sha(code), new_sha=git_blob_sha(new_code))
+    response = client.post("/api/hook", json={"files": [diff_payload], "provider": "ollama"})
+    result = response.json()["results"][0]
+    assert result["needs_full_content"] is False
+    assert result["had_issues"] is False
+    assert result["optimized_code"] == new_code
+
+
+def test_analyze_batch_streams_ndjson(client):
+    import json
+
+    leaky = "void f() {\n    for (int i = 0; i < n; i++) {\n        int* p = new int[4];\n    }\n}\n"
+    files = [
+        {"filename": f"f{i}.cpp", "code": leaky if i % 2 else "int x;\n"}
+        for i in range(6)
+    ]
+    response = client.post("/api/analyze/batch", json={"files": files})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+
+    per_file = sorted((r for r in records if r["event"] == "file"), key=lambda r: r["index"])
+    assert [r["filename"] for r in per_file] == [f["filename"] for f in files]
+    assert [bool(r["patterns"]) for r in per_file] == [False, True] * 3
+
+    summary = records[-1]
+    assert summary["event"] == "summary"
+    assert summary["files"] == 6 and summary["files_with_issues"] == 3
+    assert summary["patterns_count"] == sum(len(r["patterns"]) for r in per_file)
+    # The vectorized summary is the scalar estimate over every finding.
+    from app.analyzer.energy import estimate_energy_at
+    from app.models import DetectedPattern
+
+    everything = [DetectedPattern.model_validate(p) for r in per_file for p in r["patterns"]]
+    expected = estimate_energy_at(everything, summary["carbon_intensity_gco2_kwh"])
+    assert {k: summary[k] for k in expected} == expected
+
+
+def test_analyze_batch_reports_files_the_saturated_engine_never_took(client, monkeypatch):
+    import json
+    from app.analyzer.cache import analysis_cache
+    from app.analyzer.engine import EngineSaturated
+    from app.config import settings
+
+    real_analyze = analysis_cache.analyze
+
+    async def analyze(engine, code, language):
+        if "busy" in code:
+            raise EngineSaturated(retry_after=0)
+        return await real_analyze(engine, code, language)
+
+    monkeypatch.setattr(analysis_cache, "analyze", analyze)
+    monkeypatch.setattr(settings, "ANALYSIS_SATURATED_MAX_WAIT_SECONDS", 0.05)
+    files = [{"filename": "ok.cpp", "code": "int x;\n"}, {"filename": "busy.cpp", "code": "// busy\n"}]
+    response = client.post("/api/analyze/batch", json={"files": files})
+    records = [json.loads(line) for line in response.text.splitlines()]
+
+    errors = [r for r in records if r["event"] == "error"]
+    assert [(r["index"], r["filename"]) for r in errors] == [(1, "busy.cpp")]
+    assert [r["filename"] for r in records if r["event"] == "file"] == ["ok.cpp"]
+    assert records[-1]["files_failed"] == 1
+
+
+def test_hook_returns_503_when_engine_stays_saturated(client, monkeypatch):
+    from app.analyzer.cache import analysis_cache
+    from app.analyzer.engine import EngineSaturated
+    from app.config import settings
+
+    async def analyze(engine, code, language):
+        raise EngineSaturated(retry_after=0)
+
+    monkeypatch.setattr(analysis_cache, "analyze", analyze)
+    monkeypatch.setattr(settings, "ANALYSIS_SATURATED_MAX_WAIT_SECONDS", 0.05)
+    response = client.post("/api/hook", json={
+        "files": [{"filename": "a.cpp", "code": "int x;\n"}], "provider": "ollama",
+    })
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "0"
+
+
+def test_hook_optimizes_files_concurrently_in_input_order(client, monkeypatch, fake_provider):
+    import time
+    import app.routers.optimize as optimize_module
+    from app.ai.provider import ProviderLimiter, _InstrumentedProvider
+
+    slow = fake_provider("slow", suffix="// optimized\n", delay=0.2)
+    provider = _InstrumentedProvider(slow, "slow", ProviderLimiter(4))
+    monkeypatch.setattr(optimize_module, "get_provider", lambda name: provider)
+
+    leaky = "void f{i}() {{\n    for (int i = 0; i < n; i++) {{\n        int* p = new int[4];\n    }}\n}}\n"
+    files = [
+        {"filename": f"f{i}.cpp", "code": leaky.format(i=i) if i != 3 else "int x;\n"}
+        for i in range(8)
+    ]
+    start = time.perf_counter()
+    response = client.post("/api/hook", json={"files": files, "provider": "slow"})
+    elapsed = time.perf_counter() - start
+
+    results = response.json()["results"]
+    assert [r["filename"] for r in results] == [f["filename"] for f in files]
+    assert [r["had_issues"] for r in results] == [i != 3 for i in range(8)]
+    assert results[0]["optimized_code"].endswith("// optimized\n")
+    # 7 flagged files, 4 at a time: two rounds, not seven.
+    assert slow.peak == 4
+    assert elapsed < 7 * 0.2
+
+
+def test_hook_job_retry_skips_files_already_saved(monkeypatch, fake_provider):
+    import asyncio
+    import app.routers.optimize as optimize_module
+    from app.ai.provider import ProviderLimiter, _InstrumentedProvider
+    from app.analyzer.cache import analysis_cache
+    from app.db.database import get_dashboard_data
+    from app.routers.jobs import hook_job
+
+    echo = fake_provider("echo", suffix="// optimized\n")
+    provider = _InstrumentedProvider(echo, "echo", ProviderLimiter(4))
+    monkeypatch.setattr(optimize_module, "get_provider", lambda name: provider)
+
+    analyze, crashed = analysis_cache.analyze, []
+
+    async def crash_once(engine, code, language):
+        if "g()" in code and not crashed:
+            crashed.append(code)
+            raise RuntimeError("worker crashed")
+        return await analyze(engine, code, language)
+
+    monkeypatch.setattr(analysis_cache, "analyze", crash_once)
+
+    leaky = "void {name}() {{\n    for (int i = 0; i < n; i++) {{\n        int* p = new int[4];\n    }}\n}}\n"
+    request = {
+        "files": [
+            {"filename": "f.cpp", "code": leaky.format(name="f")},
+            {"filename": "g.cpp", "code": leaky.format(name="g")},
+        ],
+        "provider": "echo",
+        "no_cache": True,
+    }
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await hook_job(fastapi_app, "job-1", request, last_attempt=False)
+        saved_first = (await get_dashboard_data())["total_optimizations"]
+        result = await hook_job(fastapi_app, "job-1", request, last_attempt=True)
+        return saved_first, (await get_dashboard_data())["total_optimizations"], result
+
+    saved_first, saved, result = asyncio.run(scenario())
+    assert (saved_first, saved) == (1, 2)
+    assert [r["filename"] for r in result["results"]] == ["f.cpp", "g.cpp"]
+    assert all(r["had_issues"] for r in result["results"])
+
+
+def test_optimize_stream_sends_sse_events(client, monkeypatch, fake_provider):
+    import json
+    import app.routers.optimize as optimize_module
+    from app.ai.provider import _InstrumentedProvider
+
+    raw = (
+        "CHAIN OF THOUGHT:\nreserve once\n\nCHANGES SUMMARY:\n- hoisted\n\n"
+        "OPTIMIZED CODE:\n```cpp\nint y;\n```\n"
+    )
+    streaming = fake_provider(
+        "streaming", suffix="", chunks=[raw[i:i + 5] for i in range(0, len(raw), 5)]
+    )
+    provider = _InstrumentedProvider(streaming, "streaming")
+    monkeypatch.setattr(optimize_module, "get_provider", lambda name: provider)
+
+    body = {
+        "filename": "a.cpp",
+        "code": "int x;",
+        "patterns": [],
+        "language": "cpp",
+        "no_cache": True,
+    }
+    response = client.post("/api/optimize/stream", json=body)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+
+    names = [name for name, _ in events]
+    assert names[0] == "start" and names[-1] == "result"
+    assert "".join(d["text"] for name, d in events if name == "token") == raw
+    sections = [d for name, d in events if name == "section"]
+    assert [s["section"] for s in sections] == [
+        "chain_of_thought", "changes_summary", "optimized_code",
+    ]
+    # Sections arrive while tokens are still streaming.
+    assert names.index("section") < len(names) - 2
+    # The stream endpoint must not buffer a whole completion.
+    assert streaming.optimize_calls == 0
+    result = events[-1][1]
+    assert result["optimized_code"] == "int y;"
+    assert result["chain_of_thought"] == "reserve once"
+
+
+def test_optimize_stream_ends_with_result_when_cache_lookup_fails(client, monkeypatch, fake_provider):
+    import json
+    import app.routers.optimize as optimize_module
+    from app.ai.provider import _InstrumentedProvider
+
+    async def broken_lookup(*args, **kwargs):
+        raise RuntimeError("cache down")
+
+    provider = _InstrumentedProvider(fake_provider(), "fake")
+    monkeypatch.setattr(optimize_module, "get_provider", lambda name: provider)
+    monkeypatch.setattr(optimize_module.optimization_cache, "lookup", broken_lookup)
+
+    body = {"filename": "a.cpp", "code": "int x;", "patterns": [], "language": "cpp"}
+    response = client.post("/api/optimize/stream", json=body)
+    assert response.status_code == 200
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+
+    assert [name for name, _ in events] == ["start", "error", "result"]
+    assert events[1][1]["detail"] == "cache down"
+    assert events[2][1]["optimized_code"] == "int x;"
+
+
+def test_jobs_api_submits_and_long_polls(monkeypatch, fake_provider):
+    import app.routers.optimize as optimize_module
+    from app.ai.provider import _InstrumentedProvider
+
+    provider = _InstrumentedProvider(fake_provider("echo", suffix="// job\n"), "echo")
+    monkeypatch.setattr(optimize_module, "get_provider", lambda name: provider)
+
+    body = {"filename": "a.cpp", "code": "int x;", "patterns": [], "no_cache": True}
+    # The lifespan starts the job workers.
+    with TestClient(fastapi_app) as client:
+        submitted = client.post("/api/jobs", json={"kind": "optimize", "request": body})
+        assert submitted.status_code == 202
+        job = submitted.json()
+        assert job["status"] in ("queued", "running", "done")
+
+        polled = client.get(f"/api/jobs/{job['id']}", params={"wait": 10}).json()
+        assert polled["status"] == "done"
+        assert polled["result"]["optimized_code"] == "int x;// job\n"
+
+        assert client.get("/api/jobs/nope").status_code == 404
+        bad = client.post("/api/jobs", json={"kind": "optimize", "request": {"code": 1}})
+        assert bad.status_code == 422
+        assert client.post("/api/jobs", json={"kind": "x", "request": {}}).status_code == 422
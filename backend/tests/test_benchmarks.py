@@ -0,0 +1,31 @@
+import pytest
+
+from benchmarks.run import build_cases, compare, make_engine
+from benchmarks.synthetic import LANGUAGES, generate
+
+
+@pytest.mark.parametrize("language", LANGUAGES)
+def test_generator_honours_size_and_density(language):
+    engine = make_engine()
+    clean = generate(language, 500, depth=3, density=0.0)
+    hot = generate(language, 500, depth=3, density=1.0)
+    assert len(clean.split("\n")) >= 500
+    assert engine.analyze(clean, language) == []
+    assert engine.analyze(hot, language)
+    assert generate(language, 200, seed=7) == generate(language, 200, seed=7)
+
+
+def test_corpus_cases_are_included():
+    names = [case for case, _, _ in build_cases(100, 2, 0.2, 0)]
+    assert "corpus-bubble_sort.cpp" in names
+    assert "corpus-status_poller.js" in names
+
+
+def test_compare_flags_regressions_beyond_threshold():
+    baseline = {"a:engine": {"lines_per_sec": 1000, "peak_kib": 100.0}}
+    ok = {"a:engine": {"lines_per_sec": 800, "peak_kib": 120.0}}
+    slow = {"a:engine": {"lines_per_sec": 600, "peak_kib": 100.0}}
+    fat = {"a:engine": {"lines_per_sec": 1000, "peak_kib": 140.0}}
+    assert compare(ok, baseline, 0.3) == []
+    assert len(compare(slow, baseline, 0.3)) == 1
+    assert len(compare(fat, baseline, 0.3)) == 1
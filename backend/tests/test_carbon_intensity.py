@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import pytest
+
+from app.analyzer import carbon_intensity as ci
+from app.config import settings
+from app.db import database as db_module
+
+
+@pytest.fixture(autouse=True)
+def clean_cache(temp_db, monkeypatch):
+    monkeypatch.setattr(ci, "_cache", {})
+    monkeypatch.setattr(settings, "ELECTRICITY_MAPS_API_KEY", "")
+
+
+@pytest.fixture
+def uk_api(monkeypatch):
+    """Fake UK API: each call takes 0.2s and returns the next value."""
+    state = {"calls": 0, "fail": False}
+
+    async def fetch():
+        state["calls"] += 1
+        await asyncio.sleep(0.2)
+        return None if state["fail"] else 100.0 + state["calls"]
+
+    monkeypatch.setattr(ci, "_fetch_uk_carbon_intensity", fetch)
+    return state
+
+
+def test_cold_lookup_never_waits_for_the_api(uk_api):
+    async def scenario():
+        start = time.perf_counter()
+        values = await asyncio.gather(*(ci.get_carbon_intensity_gco2_kwh("GB") for _ in range(10)))
+        elapsed = time.perf_counter() - start
+        await asyncio.gather(*ci._background)
+        return values, elapsed, await ci.get_carbon_intensity_gco2_kwh("GB")
+
+    values, elapsed, refreshed = asyncio.run(scenario())
+    assert values == [ci.REGIONAL_AVERAGES["GB"]] * 10
+    assert elapsed < 0.1
+    # Ten concurrent misses, one fetch.
+    assert uk_api["calls"] == 1
+    assert refreshed == 101.0
+
+
+def test_stale_value_is_served_while_refreshing(uk_api):
+    ci._set_cached("ci_GB", 150.0, time.time() - ci._CACHE_TTL - 1)
+
+    async def scenario():
+        stale = await ci.get_carbon_intensity_gco2_kwh("GB")
+        await asyncio.gather(*ci._background)
+        return stale, await ci.get_carbon_intensity_gco2_kwh("GB")
+
+    assert asyncio.run(scenario()) == (150.0, 101.0)
+    assert uk_api["calls"] == 1
+
+
+def test_failed_refresh_keeps_last_live_value(uk_api):
+    uk_api["fail"] = True
+    ci._set_cached("ci_GB", 150.0, time.time() - ci._CACHE_TTL - 1)
+    value = asyncio.run(ci.refresh_carbon_intensity("GB"))
+    assert value == 150.0
+    # Retried after _RETRY_AFTER rather than a full TTL.
+    assert ci._get_cached("ci_GB") == 150.0
+    assert ci._cache["ci_GB"][1] < time.time() - ci._CACHE_TTL + ci._RETRY_AFTER + 1
+
+
+def test_location_without_live_source_uses_static_average():
+    assert asyncio.run(ci.get_carbon_intensity_gco2_kwh("FR")) == ci.REGIONAL_AVERAGES["FR"]
+    assert not ci._background
+
+
+def test_live_readings_are_stored_with_source(uk_api):
+    asyncio.run(ci.refresh_carbon_intensity("GB"))
+    readings = asyncio.run(db_module.get_carbon_readings("GB", 0))
+    assert [(r["value"], r["source"]) for r in readings] == [(101.0, "carbonintensity.org.uk")]
+
+
+def test_refresh_reuses_reading_from_another_worker(uk_api):
+    fetched_at = time.time() - 60
+    asyncio.run(db_module.save_carbon_reading("GB", 180.0, "carbonintensity.org.uk", fetched_at, 3600))
+    assert asyncio.run(ci.refresh_carbon_intensity("GB")) == 180.0
+    assert uk_api["calls"] == 0
+    assert ci._cache["ci_GB"] == (180.0, fetched_at)
+
+
+def test_old_stored_reading_is_refetched(uk_api):
+    old = time.time() - ci._CACHE_TTL
+    asyncio.run(db_module.save_carbon_reading("GB", 180.0, "carbonintensity.org.uk", old, 10**6))
+    assert asyncio.run(ci.refresh_carbon_intensity("GB")) == 101.0
+    assert uk_api["calls"] == 1
+    # Both readings stay in the series.
+    assert [r["value"] for r in asyncio.run(db_module.get_carbon_readings("GB", 0))] == [180.0, 101.0]
+
+
+def test_restore_seeds_cache_with_latest_readings():
+    now = time.time()
+    for value, ts in ((170.0, now - 600), (160.0, now - 300)):
+        asyncio.run(db_module.save_carbon_reading("GB", value, "carbonintensity.org.uk", ts, 3600))
+    asyncio.run(db_module.save_carbon_reading("DE", 400.0, "electricitymaps", now - 100, 3600))
+    asyncio.run(ci.restore())
+    assert ci._cache == {"ci_GB": (160.0, now - 300), "ci_DE": (400.0, now - 100)}
+
+
+def test_old_readings_are_pruned():
+    now = time.time()
+    asyncio.run(db_module.save_carbon_reading("GB", 170.0, "carbonintensity.org.uk", now - 7200, 3600))
+    asyncio.run(db_module.save_carbon_reading("GB", 160.0, "carbonintensity.org.uk", now, 3600))
+    assert [r["value"] for r in asyncio.run(db_module.get_carbon_readings("GB", 0))] == [160.0]
@@ -0,0 +1,155 @@
+import asyncio
+import re
+
+import pytest
+
+from app.ai.chunked import estimate_tokens, function_units, optimize_chunked, stitch, Unit
+from app.ai.optimizer import choose_mode
+from app.config import settings
+from app.models import DetectedPattern, PatternSeverity
+
+
+def _pattern(start: int, end: int) -> DetectedPattern:
+    return DetectedPattern(
+        pattern_id="inefficient_sorting",
+        name="Nested Loop",
+        severity=PatternSeverity.HIGH,
+        line_start=start,
+        line_end=end,
+        description="d",
+        suggestion="s",
+        estimated_energy_cost=80.0,
+        estimated_energy_saved=50.0,
+    )
+
+
+def _function(name: str, body_lines: int) -> list[str]:
+    return [f"void {name}(std::vector<int>& v)", "{"] + [
+        f"    v[{i}] += {i};" for i in range(body_lines)
+    ] + ["}", ""]
+
+
+# Lines 1-2 header, then three functions of 14 lines each:
+# f0 on 3-16, f1 on 17-30, f2 on 31-44.
+LINES = ["#include <vector>", ""] + _function("f0", 10) + _function("f1", 10) + _function("f2", 10)
+CODE = "\n".join(LINES)
+
+
+def _unit_reply(prompt: str) -> str:
+    """Rewrites each excerpt to a marker naming its first line."""
+    start = re.search(r"lines (\d+)-(\d+)", prompt).group(1)
+    return (
+        f"CHAIN OF THOUGHT:\nunit {start}\n\nCHANGES SUMMARY:\n- unit {start}\n\n"
+        f"OPTIMIZED CODE:\n```cpp\n// unit {start}\n```\n\n"
+        "NEW IMPORTS:\n```cpp\n#include <algorithm>\n#include <vector>\n```\n"
+    )
+
+
+@pytest.fixture
+def unit_provider(fake_provider):
+    """``unit_provider(fail_on="")``: answers ``_unit_reply``; fails the
+    unit starting on line ``fail_on``."""
+    return lambda fail_on="": fake_provider(
+        reply=_unit_reply, fail=lambda prompt: bool(fail_on) and f"lines {fail_on}-" in prompt
+    )
+
+
+def test_units_are_enclosing_functions_merged():
+    units = function_units(CODE, [_pattern(5, 7), _pattern(9, 10), _pattern(33, 35)], "cpp")
+    assert [(u.start, u.end, len(u.patterns)) for u in units] == [(3, 15, 2), (31, 43, 1)]
+
+
+def test_oversized_function_falls_back_to_inner_block(monkeypatch):
+    monkeypatch.setattr(settings, "AI_MAX_OUTPUT_TOKENS", 1024 + estimate_tokens("\n".join(LINES[2:8])))
+    code = "\n".join(["int g() {", "  for (;;) {", "    x();", "  }"] + [f"  y{i}();" for i in range(40)] + ["}"])
+    units = function_units(code, [_pattern(3, 3)], "cpp")
+    assert [(u.start, u.end) for u in units] == [(2, 4)]
+
+
+def test_python_units_include_decorators():
+    code = "import os\n\n@cache\ndef f():\n    for x in y:\n        g(x)\n\n\ndef h():\n    pass\n"
+    units = function_units(code, [_pattern(5, 6)], "python")
+    assert [(u.start, u.end) for u in units] == [(3, 6)]
+
+
+def test_stitch_replaces_bottom_up_and_adds_imports():
+    units = [Unit(3, 15), Unit(31, 43)]
+    out = stitch(CODE, [(units[0], "// a"), (units[1], "// b\n// b2")], ["#include <algorithm>", "#include <vector>"])
+    lines = out.split("\n")
+    assert lines[:2] == ["#include <vector>", "#include <algorithm>"]
+    assert lines.count("#include <vector>") == 1
+    assert lines[3] == "// a" and "// b\n// b2" in out
+    assert "void f1(std::vector<int>& v)" in out
+
+
+def test_units_are_optimized_in_parallel_and_stitched(unit_provider):
+    provider = unit_provider()
+    result = asyncio.run(optimize_chunked(provider, CODE, [_pattern(5, 7), _pattern(33, 35)], "cpp"))
+    assert len(provider.prompts) == 2
+    # Findings are renumbered relative to the excerpt.
+    assert "Line 3-5: Nested Loop" in provider.prompts[0]
+    assert "// unit 3" in result.optimized_code and "// unit 31" in result.optimized_code
+    assert "void f1(std::vector<int>& v)" in result.optimized_code
+    assert result.optimized_code.count("#include <algorithm>") == 1
+    assert "Lines 3-15:\nunit 3" in result.chain_of_thought
+    assert not result.failed
+
+
+def test_failed_unit_keeps_original_text(unit_provider):
+    provider = unit_provider(fail_on="31")
+    result = asyncio.run(optimize_chunked(provider, CODE, [_pattern(5, 7), _pattern(33, 35)], "cpp"))
+    assert "// unit 3" in result.optimized_code
+    assert "void f2(std::vector<int>& v)" in result.optimized_code
+    assert "31-43 left unchanged" in result.changes_summary
+    assert not result.failed
+
+    every = asyncio.run(optimize_chunked(unit_provider(fail_on="3"), CODE, [_pattern(5, 7)], "cpp"))
+    assert every.failed and every.optimized_code == CODE
+
+
+def test_auto_mode_uses_token_estimates(monkeypatch):
+    monkeypatch.setattr(settings, "AI_OUTPUT_MODE", "auto")
+    monkeypatch.setattr(settings, "AI_PATCH_MIN_LINES", 1000)
+    assert choose_mode(CODE, [_pattern(5, 7)]) == "full"
+    # A budget smaller than the file: the flagged regions still fit.
+    monkeypatch.setattr(settings, "AI_MAX_OUTPUT_TOKENS", 1024 + estimate_tokens(CODE) - 20)
+    assert choose_mode(CODE, [_pattern(33, 35)]) == "patch"
+    # A finding spanning the whole file no longer fits either.
+    assert choose_mode(CODE, [_pattern(3, 44)]) == "chunked"
+
+
+def test_default_full_mode_chunks_a_file_that_does_not_fit(monkeypatch):
+    monkeypatch.setattr(settings, "AI_OUTPUT_MODE", "full")
+    assert choose_mode(CODE, [_pattern(5, 7)]) == "full"
+    monkeypatch.setattr(settings, "AI_MAX_OUTPUT_TOKENS", 1024 + estimate_tokens(CODE) - 20)
+    assert choose_mode(CODE, [_pattern(5, 7)]) == "chunked"
+    assert choose_mode(CODE, [_pattern(5, 7)], "full") == "chunked"
+
+
+def test_nested_python_method_keeps_its_indentation(monkeypatch, fake_provider):
+    import ast
+
+    code = (
+        "import requests\n\n\n"
+        "class Client:\n"
+        + "".join(f"    def m{i}(self):\n        return {i}\n\n" for i in range(20))
+        + "    def fetch_all(self, urls):\n"
+        "        out = []\n"
+        "        for u in urls:\n"
+        "            out.append(requests.get(u))\n"
+        "        return out\n"
+    )
+    lines = code.split("\n")
+    first = lines.index("    def fetch_all(self, urls):")
+    method = "\n".join(lines[first:first + 5])
+    # The class is over budget, so the unit is the method alone.
+    monkeypatch.setattr(settings, "AI_MAX_OUTPUT_TOKENS", 1024 + estimate_tokens(method) + 8)
+
+    echo = fake_provider(reply=f"OPTIMIZED CODE:\n```python\n{method}\n```\n")
+    units = function_units(code, [_pattern(first + 3, first + 4)], "python")
+    assert [(u.start, u.end) for u in units] == [(first + 1, first + 5)]
+    result = asyncio.run(
+        optimize_chunked(echo, code, [_pattern(first + 3, first + 4)], "python")
+    )
+    assert result.optimized_code == code
+    ast.parse(result.optimized_code)
@@ -0,0 +1,130 @@
+import json
+import os
+
+import pytest
+
+import app.cli as cli
+from app.cli import default_cache_path, main, module_of, scan
+
+BUBBLE_SORT = """
+void bubbleSort(int arr[], int n) {
+    for (int i = 0; i < n - 1; i++) {
+        for (int j = 0; j < n - i - 1; j++) {
+            if (arr[j] > arr[j + 1]) {
+                int temp = arr[j];
+                arr[j] = arr[j + 1];
+                arr[j + 1] = temp;
+            }
+        }
+    }
+}
+"""
+
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path, monkeypatch):
+    # Hidden, so the walk prunes it when the tree is tmp_path itself.
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / ".cache"))
+    return tmp_path / ".cache"
+
+
+def _tree(tmp_path):
+    (tmp_path / "core" / "sort").mkdir(parents=True)
+    (tmp_path / "core" / "sort" / "bubble.cpp").write_text(BUBBLE_SORT)
+    (tmp_path / "core" / "clean.py").write_text("def add(a, b):\n    return a + b\n")
+    (tmp_path / "web").mkdir()
+    (tmp_path / "web" / "app.js").write_text("export const x = 1;\n")
+    (tmp_path / "README.md").write_text("not code\n")
+    (tmp_path / "node_modules" / "dep").mkdir(parents=True)
+    (tmp_path / "node_modules" / "dep" / "bubble.cpp").write_text(BUBBLE_SORT)
+    return tmp_path
+
+
+def test_module_of():
+    assert module_of("a/b/c.py", 1) == "a"
+    assert module_of("a/b/c.py", 2) == "a/b"
+    assert module_of("c.py", 1) == "."
+
+
+def test_scan_rolls_up_per_module(tmp_path):
+    report = scan(_tree(tmp_path), workers=2)
+    assert report["files"] == 3
+    assert report["analyzed"] == 3
+    modules = {m["module"]: m for m in report["modules"]}
+    assert set(modules) == {"core", "web"}
+    assert modules["core"]["files"] == 2
+    assert modules["core"]["files_with_issues"] == 1
+    assert modules["core"]["patterns"]["inefficient_sort"] >= 1
+    assert modules["core"]["estimated_kwh"] > 0
+    assert modules["web"]["patterns_count"] == 0
+    # The biggest consumer comes first.
+    assert report["modules"][0]["module"] == "core"
+    assert report["total"]["estimated_kwh"] == modules["core"]["estimated_kwh"]
+
+
+def test_rescan_uses_hash_cache(tmp_path, cache_home):
+    root = _tree(tmp_path)
+    first = scan(root, workers=1)
+    cache = default_cache_path(root.resolve())
+    assert cache.exists() and cache.parent.parent == cache_home
+
+    second = scan(root, workers=1)
+    assert (second["analyzed"], second["cached"]) == (0, 3)
+    assert second["total"] == first["total"]
+
+    # Touched but identical content: re-hashed, not re-analyzed.
+    bubble = root / "core" / "sort" / "bubble.cpp"
+    os.utime(bubble, ns=(0, 0))
+    assert scan(root, workers=1)["analyzed"] == 0
+
+    # Changed content is analyzed again.
+    bubble.write_text("int main() { return 0; }\n")
+    third = scan(root, workers=1)
+    assert third["analyzed"] == 1
+    assert third["total"]["patterns_count"] == 0
+
+
+def test_unreadable_file_is_reported_not_fatal(tmp_path, monkeypatch):
+    root = _tree(tmp_path)
+    walk = cli.walk
+
+    def walk_with_vanished_file(root, max_bytes):
+        yield from walk(root, max_bytes)
+        # Listed by the walk, deleted before a worker opens it.
+        yield "web/gone.js", "javascript", os.stat(root / "web" / "app.js")
+
+    monkeypatch.setattr(cli, "walk", walk_with_vanished_file)
+    report = scan(root, workers=1)
+    assert report["unreadable"] == ["web/gone.js"]
+    assert (report["files"], report["analyzed"]) == (3, 3)
+    cache = default_cache_path(root.resolve())
+    assert "web/gone.js" not in json.loads(cache.read_text())["files"]
+
+
+def test_cli_writes_json(tmp_path, cache_home):
+    root = _tree(tmp_path / "repo")
+    out = tmp_path / "report.json"
+    assert main(["scan", str(root), "--depth", "2", "--no-cache", "-o", str(out)]) == 0
+    report = json.loads(out.read_text())
+    assert {m["module"] for m in report["modules"]} == {"core", "core/sort", "web"}
+    assert not cache_home.exists()
+
+
+def test_default_cache_leaves_the_scanned_tree_alone(tmp_path):
+    root = _tree(tmp_path / "repo")
+    before = sorted(root.rglob("*"))
+    scan(root, workers=1)
+    assert sorted(root.rglob("*")) == before
+
+
+def test_module_energy_matches_the_scalar_estimate(tmp_path):
+    from app.analyzer.energy import estimate_energy_at
+    from tests.test_energy import make_pattern
+
+    report = scan(_tree(tmp_path), workers=1, carbon_intensity_gco2_kwh=207.0)
+    for rollup in [report["total"], *report["modules"]]:
+        patterns = [
+            make_pattern(pattern_id) for pattern_id, n in rollup["patterns"].items() for _ in range(n)
+        ]
+        expected = estimate_energy_at(patterns, 207.0)
+        assert {k: rollup[k] for k in expected} == expected
@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.config import settings
+from app.db import database as db_module
+
+
+def _save(filename: str):
+    return db_module.save_optimization(
+        filename=filename, language="cpp", patterns_found=1, pattern_details=[],
+        energy_before=50.0, energy_after=10.0, savings_kwh=1.0, savings_co2_kg=0.4,
+        savings_eur=0.25, original_code="a", optimized_code="b",
+        chain_of_thought="", ai_provider="ollama",
+    )
+
+
+def test_connections_use_wal_and_pragmas(temp_db):
+    async def scenario():
+        await db_module.init_db()
+        async with db_module._read() as db:
+            pragmas = {}
+            for name in ("journal_mode", "synchronous", "cache_size", "query_only"):
+                pragmas[name] = (await (await db.execute(f"PRAGMA {name}")).fetchone())[0]
+        await db_module.close_db()
+        return pragmas
+
+    assert asyncio.run(scenario()) == {
+        "journal_mode": "wal",
+        "synchronous": 1,  # NORMAL
+        "cache_size": -settings.DB_CACHE_SIZE_KB,
+        "query_only": 1,
+    }
+
+
+def test_connections_are_reused(temp_db):
+    async def scenario():
+        await db_module.init_db()
+        for i in range(20):
+            await _save(f"f{i}.cpp")
+            await db_module.get_dashboard_data()
+        pool = await db_module._pool()
+        opened = len(pool._connections)
+        await db_module.close_db()
+        return opened
+
+    # One writer and one reader for sequential calls.
+    assert asyncio.run(scenario()) == 2
+
+
+def test_reads_do_not_wait_for_writes(temp_db):
+    async def scenario():
+        await db_module.init_db()
+        await _save("committed.cpp")
+        entered = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_write():
+            async with db_module._write() as db:
+                await db.execute(
+                    "INSERT INTO optimizations (filename) VALUES (?)", ("pending.cpp",)
+                )
+                entered.set()
+                await release.wait()
+
+        writer = asyncio.create_task(slow_write())
+        await entered.wait()
+        start = time.perf_counter()
+        data = await asyncio.wait_for(db_module.get_dashboard_data(), 1.0)
+        elapsed = time.perf_counter() - start
+        release.set()
+        await writer
+        after = await db_module.get_dashboard_data()
+        await db_module.close_db()
+        return data, elapsed, after
+
+    data, elapsed, after = asyncio.run(scenario())
+    # The open transaction is invisible, and did not block the read.
+    assert data["total_optimizations"] == 1
+    assert elapsed < 0.5
+    assert after["total_optimizations"] == 2
+
+
+def test_failed_write_rolls_back(temp_db):
+    async def scenario():
+        await db_module.init_db()
+        with pytest.raises(RuntimeError):
+            async with db_module._write() as db:
+                await db.execute("INSERT INTO optimizations (filename) VALUES ('x')")
+                raise RuntimeError("boom")
+        await _save("ok.cpp")
+        data = await db_module.get_dashboard_data()
+        await db_module.close_db()
+        return data
+
+    assert asyncio.run(scenario())["total_optimizations"] == 1
+
+
+def test_concurrent_reads_and_writes(temp_db, monkeypatch):
+    monkeypatch.setattr(settings, "DB_POOL_SIZE", 3)
+
+    async def scenario():
+        await db_module.init_db()
+        await asyncio.gather(
+            *(_save(f"f{i}.cpp") for i in range(30)),
+            *(db_module.get_dashboard_data() for _ in range(30)),
+        )
+        pool = await db_module._pool()
+        readers = pool._readers
+        data = await db_module.get_dashboard_data()
+        await db_module.close_db()
+        return readers, data
+
+    readers, data = asyncio.run(scenario())
+    assert readers <= 3
+    assert data["total_optimizations"] == 30
+
+
+def test_pool_left_by_a_closed_loop_is_replaced(temp_db, monkeypatch):
+    # A query still running when its loop closes kills the aiosqlite
+    # thread; replacing that loop's pool must not wait on it.
+    thread_errors = []
+    monkeypatch.setattr(threading, "excepthook", thread_errors.append)
+    slow = "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 3000000) SELECT SUM(x) FROM c"
+
+    async def abandon():
+        await db_module.init_db()
+
+        async def query():
+            async with db_module._read() as db:
+                await db.execute(slow)
+
+        asyncio.create_task(query())
+        await asyncio.sleep(0.05)
+        return (await db_module._pool())._connections
+
+    connections = asyncio.run(abandon())
+    for conn in connections:
+        conn.join(5)
+    # That thread's death is expected here, not an unhandled error.
+    assert thread_errors
+    assert all("Event loop is closed" in str(e.exc_value) for e in thread_errors)
+
+    async def reuse():
+        await asyncio.wait_for(db_module.get_dashboard_data(), 5)
+        await db_module.close_db()
+
+    asyncio.run(reuse())
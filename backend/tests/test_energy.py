@@ -56,3 +56,15 @@ def test_co2_and_cost_proportional():
     # CO2 = kWh * 0.385, Cost = kWh * 0.25
     assert abs(result["estimated_co2_kg"] - result["estimated_kwh"] * 0.385) < 0.001
     assert abs(result["estimated_cost_eur"] - result["estimated_kwh"] * 0.25) < 0.001
+
+
+def test_pattern_counts_group_unknown_ids():
+    from app.analyzer.energy import COLUMNS, pattern_counts
+
+    counts = pattern_counts(
+        [make_pattern("inefficient_sort"), make_pattern("inefficient_sort"),
+         make_pattern("custom_a"), make_pattern("custom_b")]
+    )
+    assert counts[COLUMNS.index("inefficient_sort")] == 2
+    assert counts[COLUMNS.index("other")] == 2
+    assert sum(counts) == 4
@@ -0,0 +1,46 @@
+import random
+
+import numpy as np
+import pytest
+
+from app.analyzer.energy import COLUMNS, estimate_energy_at
+from app.analyzer.energy_batch import count_matrix, estimate_batch
+from tests.test_energy import make_pattern
+
+PATTERN_IDS = [*COLUMNS[:-1], "custom_rule"]
+
+
+def _random_files(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [
+        [make_pattern(rng.choice(PATTERN_IDS)) for _ in range(rng.choice([0, 0, 1, 2, 3, 8, 40]))]
+        for _ in range(n)
+    ]
+
+
+def test_batch_matches_scalar_per_file_and_total():
+    files = _random_files(500)
+    batch = estimate_batch(count_matrix(files), 207.0)
+    assert len(batch) == 500
+    for i, patterns in enumerate(files):
+        assert batch.record(i) == estimate_energy_at(patterns, 207.0)
+    everything = [p for patterns in files for p in patterns]
+    assert batch.total() == estimate_energy_at(everything, 207.0)
+
+
+def test_batch_arrays_are_unrounded_scalar_values():
+    files = _random_files(50, seed=3)
+    batch = estimate_batch(count_matrix(files), 385.0)
+    kwh = [estimate_energy_at(p, 385.0)["estimated_kwh"] for p in files]
+    assert [round(float(v), 4) for v in batch.kwh] == kwh
+
+
+def test_empty_batch():
+    batch = estimate_batch(count_matrix([]), 100.0)
+    assert len(batch) == 0
+    assert batch.total() == estimate_energy_at([], 100.0)
+
+
+def test_rejects_wrong_column_count():
+    with pytest.raises(ValueError):
+        estimate_batch(np.zeros((3, len(COLUMNS) + 1)), 100.0)
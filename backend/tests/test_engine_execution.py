@@ -0,0 +1,88 @@
+import asyncio
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("DATABASE_PATH", "/tmp/greenlinter_test.db")
+
+from app.analyzer.engine import AnalysisEngine, EngineSaturated, retry_saturated
+from app.main import app as fastapi_app
+
+CODE = """
+void f(std::vector<int>& v) {
+    for (int i = 0; i < v.size(); i++) {
+        for (int j = 0; j < v.size(); j++) {
+            std::swap(v[i], v[j]);
+            int* p = new int[2];
+        }
+    }
+}
+"""
+
+
+@pytest.mark.parametrize("mode", ["inline", "thread", "process"])
+def test_modes_agree(make_engine, mode):
+    engine = make_engine(mode, max_workers=2)
+    try:
+        result = asyncio.run(engine.analyze_async(CODE, "cpp"))
+    finally:
+        engine.shutdown()
+    assert result == make_engine("inline").analyze(CODE, "cpp")
+    assert engine.in_flight == 0
+
+
+def test_unknown_mode_rejected():
+    with pytest.raises(ValueError):
+        AnalysisEngine(mode="gpu")
+
+
+def test_saturated_engine_rejects(make_engine):
+    engine = make_engine("thread", max_workers=1, max_in_flight=1)
+
+    async def run():
+        first = asyncio.ensure_future(engine.analyze_async(CODE, "cpp"))
+        await asyncio.sleep(0)  # let the first call take the only slot
+        with pytest.raises(EngineSaturated):
+            await engine.analyze_async(CODE, "cpp")
+        return await first
+
+    try:
+        assert asyncio.run(run())
+    finally:
+        engine.shutdown()
+
+
+def test_api_returns_503_with_retry_after(make_engine):
+    engine = make_engine("thread", max_workers=1, max_in_flight=1)
+    engine._in_flight = 1  # simulate a full queue
+    previous = getattr(fastapi_app.state, "engine", None)
+    fastapi_app.state.engine = engine
+    try:
+        response = TestClient(fastapi_app).post(
+            "/api/analyze",
+            json={"filename": "busy.cpp", "code": CODE + "// busy\n", "language": "cpp"},
+        )
+    finally:
+        fastapi_app.state.engine = previous
+        engine.shutdown()
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_retry_saturated_gives_up_after_max_wait():
+    calls = []
+
+    async def busy():
+        calls.append(1)
+        if len(calls) < 3:
+            raise EngineSaturated(retry_after=0)
+        return "done"
+
+    assert asyncio.run(retry_saturated(busy, max_wait=1)) == "done"
+
+    async def always_busy():
+        raise EngineSaturated(retry_after=1)
+
+    with pytest.raises(EngineSaturated):
+        asyncio.run(asyncio.wait_for(retry_saturated(always_busy, max_wait=0.5), 2))
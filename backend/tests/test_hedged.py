@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import pytest
+
+from app.ai import provider as provider_module
+from app.ai.hedged import HedgedProvider, hedge_delay
+from app.ai.provider import LatencyWindow, ProviderRegistry, _InstrumentedProvider
+from app.config import settings
+
+RESPONSE = "CHAIN OF THOUGHT:\nok\n\nCHANGES SUMMARY:\n- x\n\nOPTIMIZED CODE:\n```cpp\n{}\n```"
+
+
+@pytest.fixture
+def fake(fake_provider):
+    """``fake(label, **kwargs)``: a provider whose answer names ``label``."""
+    return lambda label, **kwargs: fake_provider(label, reply=RESPONSE.format(label), **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def hedge_settings(monkeypatch):
+    monkeypatch.setattr(settings, "AI_HEDGE_DEFAULT_DELAY", 0.1)
+    monkeypatch.setattr(settings, "AI_HEDGE_MIN_DELAY", 0.0)
+    monkeypatch.setattr(settings, "AI_HEDGE_MIN_SAMPLES", 5)
+
+
+def _hedged(*members) -> HedgedProvider:
+    return HedgedProvider([_InstrumentedProvider(m, m.label) for m in members])
+
+
+def test_latency_window_quantile():
+    window = LatencyWindow(size=100)
+    assert window.quantile(0.95) is None
+    for ms in range(1, 101):
+        window.observe(ms / 1000)
+    assert window.quantile(0.95) == 0.095
+    assert window.quantile(0.5) == 0.05
+
+
+def test_hedge_delay_uses_observed_p95_once_warm(fake):
+    member = _InstrumentedProvider(fake("a"), "a")
+    assert hedge_delay(member) == 0.1
+    for ms in (10, 20, 30, 40, 500):
+        member.latency.observe(ms / 1000)
+    assert hedge_delay(member) == 0.5
+
+
+def test_fast_primary_is_not_hedged(fake):
+    primary, secondary = fake("primary"), fake("secondary")
+    result = asyncio.run(_hedged(primary, secondary).optimize_code("int x;", [], "cpp"))
+    assert result.optimized_code == "primary"
+    assert secondary.calls == 0
+
+
+def test_slow_primary_is_hedged_and_cancelled(fake):
+    primary = fake("primary", delay=2.0)
+    secondary = fake("secondary", delay=0.05)
+    start = time.perf_counter()
+    result = asyncio.run(_hedged(primary, secondary).optimize_code("int x;", [], "cpp"))
+    assert result.optimized_code == "secondary"
+    assert time.perf_counter() - start < 1.0
+    assert primary.cancelled == 1
+
+
+def test_failed_primary_falls_back_without_waiting(monkeypatch, fake):
+    monkeypatch.setattr(settings, "AI_HEDGE_DEFAULT_DELAY", 30.0)
+    primary = fake("primary", fail=True)
+    secondary = fake("secondary")
+    hedged = _hedged(primary, secondary)
+    start = time.perf_counter()
+    text = asyncio.run(hedged.complete("s", "p"))
+    assert "secondary" in text
+    assert time.perf_counter() - start < 1.0
+
+
+def test_all_failing_returns_primary_degraded_result(fake):
+    hedged = _hedged(fake("primary", fail=True), fake("secondary", fail=True))
+    result = asyncio.run(hedged.optimize_code("int x;", [], "cpp"))
+    assert result.failed
+    assert result.optimized_code == "int x;"
+    assert "primary down" in result.chain_of_thought
+
+
+def test_all_failing_raises_the_primarys_error(fake):
+    # The hedge fails first, the slow primary after it.
+    hedged = _hedged(
+        fake("primary", delay=0.2, fail=True), fake("secondary", fail=True)
+    )
+    with pytest.raises(RuntimeError, match="primary down"):
+        asyncio.run(hedged.complete("s", "p"))
+
+
+def test_stream_is_hedged_on_first_delta(fake):
+    hedged = _hedged(fake("primary", delay=2.0), fake("secondary"))
+
+    async def collect():
+        return "".join([d async for d in hedged.stream_completion("int x;", [], "cpp")])
+
+    start = time.perf_counter()
+    assert "secondary" in asyncio.run(collect())
+    assert time.perf_counter() - start < 1.0
+
+
+def test_registry_builds_hedged_composite(monkeypatch, fake):
+    monkeypatch.setattr(provider_module, "_create_provider", lambda name: fake(name))
+    registry = ProviderRegistry()
+    hedged = registry.get("gemini+ollama")
+    assert isinstance(hedged, HedgedProvider)
+    assert hedged.providers == [registry.get("gemini"), registry.get("ollama")]
+    assert registry.get("gemini+ollama") is hedged
@@ -0,0 +1,216 @@
+import asyncio
+import difflib
+from pathlib import Path
+
+import pytest
+
+import app.db.database as db_module
+from app.analyzer import incremental
+from app.analyzer.cache import analysis_cache
+from app.analyzer.incremental import (
+    DiffError,
+    analyze_diff,
+    apply_unified_diff,
+    git_blob_sha,
+)
+
+SAMPLES = Path(__file__).resolve().parents[2] / "sample_code"
+
+BASE = """#include <vector>
+
+void bubble(int arr[], int n) {
+    for (int i = 0; i < n; i++) {
+        for (int j = 0; j < n - 1; j++) {
+            if (arr[j] > arr[j + 1]) {
+                std::swap(arr[j], arr[j + 1]);
+            }
+        }
+    }
+}
+
+int sum(std::vector<int>& v) {
+    int total = 0;
+    for (int i = 0; i < v.size(); i++) {
+        total += v[i];
+    }
+    return total;
+}
+
+void leak(int n) {
+    for (int i = 0; i < n; i++) {
+        int* p = new int[8];
+    }
+}
+"""
+
+
+def make_diff(old: str, new: str, context: int = 0) -> str:
+    return "\n".join(
+        difflib.unified_diff(
+            old.splitlines(), new.splitlines(), "a/f.cpp", "b/f.cpp",
+            n=context, lineterm="",
+        )
+    )
+
+
+@pytest.fixture(autouse=True)
+def clean_cache(temp_db):
+    analysis_cache.clear()
+    yield
+    analysis_cache.clear()
+
+
+def sort_key(p):
+    return (p.line_start, p.line_end, p.pattern_id)
+
+
+EDITS = [
+    # Insert lines above everything: all findings shift down.
+    lambda s: s.replace("#include <vector>\n", "#include <vector>\n#include <map>\n\n"),
+    # Fix the inner loop of the bubble sort.
+    lambda s: s.replace("for (int j = 0; j < n - 1; j++) {", "if (n) {"),
+    # Touch a line outside any loop.
+    lambda s: s.replace("int total = 0;", "long total = 0;"),
+    # Add a nested loop in a previously clean function.
+    lambda s: s.replace(
+        "        total += v[i];\n",
+        "        for (int k = 0; k < n; k++) { total += v[k]; }\n",
+    ),
+    # Delete the leaking function body line.
+    lambda s: s.replace("        int* p = new int[8];\n", ""),
+]
+
+
+@pytest.mark.parametrize("edit", EDITS)
+@pytest.mark.parametrize("context", [0, 3])
+def test_incremental_matches_full_analysis(engine, edit, context):
+    new = edit(BASE)
+    assert new != BASE
+    result = asyncio.run(analyze_diff(engine, BASE, make_diff(BASE, new, context), "cpp"))
+    assert result.code == new
+    assert result.patterns == sorted(engine.analyze(new, "cpp"), key=sort_key)
+
+
+def test_sample_files_round_trip(engine):
+    for path in SAMPLES.glob("*.cpp"):
+        base = path.read_text()
+        new = "// header\n" + base.replace("i++", "++i", 1)
+        result = asyncio.run(analyze_diff(engine, base, make_diff(base, new), "cpp"))
+        assert result.code == new
+        assert result.patterns == sorted(engine.analyze(new, "cpp"), key=sort_key)
+
+
+def test_only_changed_block_is_reanalyzed(engine):
+    new = BASE.replace("total += v[i];", "total += v[i] * 2;")
+    result = asyncio.run(analyze_diff(engine, BASE, make_diff(BASE, new), "cpp"))
+    assert not result.full_rescan
+    # The sum() loop is clean, so nothing the LLM needs to see changed,
+    # while the untouched bubble sort finding is carried over.
+    assert result.changed_patterns == []
+    assert any(p.pattern_id == "inefficient_sort" for p in result.patterns)
+
+
+def test_structural_edit_falls_back_to_full_scan(engine):
+    new = BASE.replace("int total = 0;", "int total = 0; /* running")
+    new = new.replace("return total;", "*/ return total;")
+    result = asyncio.run(analyze_diff(engine, BASE, make_diff(BASE, new), "cpp"))
+    assert result.full_rescan
+    assert result.patterns == sorted(engine.analyze(new, "cpp"), key=sort_key)
+
+
+@pytest.mark.parametrize("structural", [False, True])
+def test_known_file_scoped_finding_is_not_resent(engine, structural):
+    # memory_leak is file-scoped: an edit inside its span overlaps it, but
+    # the base already had it, so it is not a change.
+    new = BASE.replace("new int[8];", "new int[16];")
+    if structural:
+        new = new.replace("int total = 0;", "int total = 0; /* running")
+        new = new.replace("return total;", "*/ return total;")
+    diff = make_diff(BASE, new)
+    first = asyncio.run(analyze_diff(engine, BASE, diff, "cpp"))
+    # Served from the cache the first call filled.
+    second = asyncio.run(analyze_diff(engine, BASE, diff, "cpp"))
+    assert first.full_rescan == structural
+    for result in (first, second):
+        assert any(p.pattern_id == "memory_leak" for p in result.patterns)
+        assert any(p.pattern_id == "excessive_alloc" for p in result.changed_patterns)
+        assert all(p.pattern_id != "memory_leak" for p in result.changed_patterns)
+
+
+PY_BASE = """import requests
+
+
+def fetch(urls):
+    for u in urls:
+        requests.get(u)
+        x = 1
+    return 2
+"""
+
+PY_EDITS = [
+    # Delete the loop's last body line.
+    lambda s: s.replace("        x = 1\n", ""),
+    # Dedent it out of the loop.
+    lambda s: s.replace("        x = 1\n", "    x = 1\n"),
+]
+
+
+@pytest.mark.parametrize("edit", PY_EDITS)
+@pytest.mark.parametrize("context", [0, 3])
+def test_python_block_end_edits_keep_loop_findings(engine, edit, context):
+    new = edit(PY_BASE)
+    result = asyncio.run(analyze_diff(engine, PY_BASE, make_diff(PY_BASE, new, context), "python"))
+    expected = sorted(engine.analyze(new, "python"), key=sort_key)
+    assert any(p.pattern_id == "network_waste" for p in expected)
+    assert result.patterns == expected
+
+
+@pytest.mark.parametrize("edit", PY_EDITS)
+def test_touched_finding_block_is_reanalyzed(engine, edit, monkeypatch):
+    # Without the indentation fallback, the block around the dropped base
+    # finding must still be analyzed again.
+    monkeypatch.setattr(incremental, "_INDENT_LANGUAGES", ())
+    new = edit(PY_BASE)
+    result = asyncio.run(analyze_diff(engine, PY_BASE, make_diff(PY_BASE, new), "python"))
+    assert not result.full_rescan
+    assert result.patterns == sorted(engine.analyze(new, "python"), key=sort_key)
+
+
+def test_apply_handles_missing_newline_markers():
+    base = "a\nb"
+    diff = "@@ -2 +2,2 @@\n-b\n\\ No newline at end of file\n+b\n+c\n"
+    assert apply_unified_diff(base, diff).code == "a\nb\nc\n"
+
+
+def test_apply_rejects_mismatched_context():
+    with pytest.raises(DiffError):
+        apply_unified_diff("a\nb\n", "@@ -1 +1 @@\n-x\n+y\n")
+
+
+def test_git_blob_sha_matches_git():
+    # `printf 'hello\n' | git hash-object --stdin`
+    assert git_blob_sha("hello\n") == "ce013625030ba8dba906f756967f9e9ca394464a"
+
+
+def test_base_blob_read_touches_last_used_only_when_stale():
+    import aiosqlite
+
+    async def last_used(db):
+        cursor = await db.execute("SELECT last_used FROM source_blobs WHERE sha = 's'")
+        return (await cursor.fetchone())[0]
+
+    async def run():
+        await db_module.save_source_blob("s", BASE, max_rows=10)
+        async with aiosqlite.connect(db_module.DB_PATH) as db:
+            await db.execute("UPDATE source_blobs SET last_used = datetime('now', '-60 seconds')")
+            await db.commit()
+            recent = await last_used(db)
+            assert await db_module.get_source_blob("s", touch_after_seconds=300) == BASE
+            untouched = await last_used(db)
+            await db_module.get_source_blob("s", touch_after_seconds=30)
+            touched = await last_used(db)
+        return recent, untouched, touched
+
+    recent, untouched, touched = asyncio.run(run())
+    assert untouched == recent
+    assert touched > recent
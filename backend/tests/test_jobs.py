@@ -0,0 +1,163 @@
+import asyncio
+
+import pytest
+
+import app.db.database as db_module
+from app.config import settings
+from app.jobs import JobQueue
+
+
+@pytest.fixture(autouse=True)
+def job_settings(monkeypatch):
+    monkeypatch.setattr(settings, "JOB_RETRY_BASE_SECONDS", 0)
+    monkeypatch.setattr(settings, "JOB_POLL_SECONDS", 0.02)
+    monkeypatch.setattr(settings, "JOB_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(settings, "JOB_LEASE_SECONDS", 0.3)
+
+
+def test_job_runs_in_background_and_long_poll_returns_result(temp_db):
+    async def scenario():
+        release = asyncio.Event()
+
+        async def handler(app, job_id, request, last_attempt):
+            await release.wait()
+            return {"echo": request["x"], "app": app}
+
+        queue = JobQueue()
+        queue.register("echo", handler)
+        await queue.start("app", workers=2)
+        job_id = await queue.submit("echo", {"x": 1})
+        # Not finished yet: a short long-poll times out with the job running.
+        pending = await queue.wait(job_id, 0.1)
+        release.set()
+        done = await queue.wait(job_id, 5)
+        await queue.stop()
+        await db_module.close_db()
+        return pending, done
+
+    pending, done = asyncio.run(scenario())
+    assert pending["status"] == "running"
+    assert done["status"] == "done"
+    assert done["result"] == '{"echo": 1, "app": "app"}'
+    assert done["attempts"] == 1
+
+
+def test_timed_out_long_poll_forgets_the_job(temp_db):
+    async def scenario():
+        queue = JobQueue()
+        # No workers: the job stays queued and every long-poll times out.
+        await queue.start("app", workers=0)
+        job_id = await queue.submit("echo", {"x": 1})
+        job = await queue.wait(job_id, 0.05)
+        await queue.stop()
+        await db_module.close_db()
+        return job, queue._finished
+
+    job, finished = asyncio.run(scenario())
+    assert job["status"] == "queued"
+    assert finished == {}
+
+
+def test_failures_retry_then_fail(temp_db):
+    calls = []
+
+    async def scenario():
+        async def flaky(app, job_id, request, last_attempt):
+            calls.append(("flaky", last_attempt))
+            if len([c for c in calls if c[0] == "flaky"]) < 2:
+                raise RuntimeError("transient")
+            return {"ok": True}
+
+        async def broken(app, job_id, request, last_attempt):
+            calls.append(("broken", last_attempt))
+            raise RuntimeError("always")
+
+        queue = JobQueue()
+        queue.register("flaky", flaky)
+        queue.register("broken", broken)
+        await queue.start(None, workers=1)
+        flaky_id = await queue.submit("flaky", {})
+        broken_id = await queue.submit("broken", {})
+        results = await queue.wait(flaky_id, 5), await queue.wait(broken_id, 5)
+        await queue.stop()
+        await db_module.close_db()
+        return results
+
+    flaky, broken = asyncio.run(scenario())
+    assert (flaky["status"], flaky["attempts"]) == ("done", 2)
+    assert (broken["status"], broken["attempts"], broken["error"]) == ("failed", 3, "always")
+    assert [c for c in calls if c[0] == "broken"] == [
+        ("broken", False), ("broken", False), ("broken", True)
+    ]
+
+
+def test_jobs_interrupted_by_restart_are_resumed(temp_db):
+    async def scenario():
+        async def hang(app, job_id, request, last_attempt):
+            await asyncio.Event().wait()
+
+        first = JobQueue()
+        first.register("work", hang)
+        await first.start(None, workers=1)
+        job_id = await first.submit("work", {})
+        while (await first.wait(job_id, 0))["status"] != "running":
+            await asyncio.sleep(0.01)
+        # "Crash": workers are cancelled with the job still running, and
+        # its lease is no longer renewed.
+        await first.stop()
+
+        async def finish(app, job_id, request, last_attempt):
+            return {"resumed": True}
+
+        second = JobQueue()
+        second.register("work", finish)
+        await second.start(None, workers=1)
+        job = await second.wait(job_id, 5)
+        await second.stop()
+        # Before the loop closes: a cancelled query must not outlive it.
+        await db_module.close_db()
+        return job
+
+    job = asyncio.run(scenario())
+    assert job["status"] == "done"
+    assert job["attempts"] == 2
+
+
+def test_second_process_leaves_a_live_siblings_job_alone(temp_db):
+    calls = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def work(app, job_id, request, last_attempt):
+            calls.append(app)
+            await release.wait()
+            return {"by": app}
+
+        first, second = JobQueue(), JobQueue()
+        first.register("work", work)
+        second.register("work", work)
+        await first.start("first", workers=1)
+        job_id = await first.submit("work", {})
+        while (await first.wait(job_id, 0))["status"] != "running":
+            await asyncio.sleep(0.01)
+        # A sibling starting (and recovering) on the same database, for
+        # several lease periods, must not take over the running job.
+        await second.start("second", workers=1)
+        await asyncio.sleep(1)
+        running = await second.wait(job_id, 0)
+        release.set()
+        done = await second.wait(job_id, 5)
+        await first.stop()
+        await second.stop()
+        await db_module.close_db()
+        return running, done
+
+    running, done = asyncio.run(scenario())
+    assert (running["status"], running["attempts"]) == ("running", 1)
+    assert (done["status"], done["attempts"], done["result"]) == ("done", 1, '{"by": "first"}')
+    assert calls == ["first"]
+
+
+def test_unknown_job_is_none(temp_db):
+    assert asyncio.run(JobQueue().wait("missing", 0)) is None
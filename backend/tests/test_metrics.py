@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.analyzer.engine import AnalysisEngine
+from app.analyzer.patterns.memory import MemoryPatternDetector
+from app.metrics import (
+    ANALYSIS_PREFILTER_SKIPS,
+    DETECTOR_FINDINGS,
+    DETECTOR_SECONDS,
+    Counter,
+    Histogram,
+    Registry,
+)
+import app.metrics as metrics_module
+
+LEAKY = "void f(int n) {\n    for (int i = 0; i < n; i++) {\n        int* p = new int[8];\n    }\n}\n"
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = Registry()
+    monkeypatch.setattr(metrics_module, "REGISTRY", registry)
+    return registry
+
+
+def test_render_prometheus_text(registry):
+    requests = Counter("demo_requests_total", "Requests.", ("path",))
+    latency = Histogram("demo_seconds", "Latency.", buckets=(0.1, 1.0))
+    requests.inc(path='/a"b')
+    requests.inc(2, path='/a"b')
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+    text = registry.render()
+    assert "# TYPE demo_requests_total counter" in text
+    assert 'demo_requests_total{path="/a\\"b"} 3.0' in text
+    assert 'demo_seconds_bucket{le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{le="1.0"} 2' in text
+    assert 'demo_seconds_bucket{le="+Inf"} 3' in text
+    assert "demo_seconds_count 3" in text
+
+
+def test_snapshot_merge_round_trip(registry):
+    hits = Counter("demo_hits_total", "Hits.")
+    hits.inc(4)
+    snapshot = registry.snapshot_and_reset()
+    assert hits.value() == 0
+    registry.merge(snapshot)
+    registry.merge(snapshot)
+    assert hits.value() == 8
+
+
+def test_engine_records_per_detector_metrics():
+    engine = AnalysisEngine(mode="inline")
+    engine.register(MemoryPatternDetector())
+    before = DETECTOR_SECONDS.count(detector="MemoryPatternDetector")
+    findings = DETECTOR_FINDINGS.value(detector="MemoryPatternDetector")
+    skips = ANALYSIS_PREFILTER_SKIPS.value(language="cpp")
+
+    patterns = engine.analyze(LEAKY, "cpp")
+    engine.analyze("int x;\n", "cpp")
+
+    assert DETECTOR_SECONDS.count(detector="MemoryPatternDetector") == before + 1
+    assert DETECTOR_FINDINGS.value(detector="MemoryPatternDetector") == findings + len(patterns)
+    assert ANALYSIS_PREFILTER_SKIPS.value(language="cpp") == skips + 1
+
+
+def test_process_workers_ship_metrics_back():
+    engine = AnalysisEngine(mode="process", max_workers=1)
+    engine.register(MemoryPatternDetector())
+    before = DETECTOR_SECONDS.count(detector="MemoryPatternDetector")
+    try:
+        asyncio.run(engine.analyze_async(LEAKY, "cpp"))
+    finally:
+        engine.shutdown()
+    assert DETECTOR_SECONDS.count(detector="MemoryPatternDetector") == before + 1
+
+
+def test_metrics_endpoint():
+    from app.main import app as fastapi_app
+
+    engine = AnalysisEngine(mode="inline")
+    engine.register(MemoryPatternDetector())
+    fastapi_app.state.engine = engine
+    engine.analyze(LEAKY, "cpp")
+    response = TestClient(fastapi_app).get("/api/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'greenlinter_detector_seconds_count{detector="MemoryPatternDetector"}' in response.text
+    assert "# TYPE greenlinter_db_write_seconds histogram" in response.text
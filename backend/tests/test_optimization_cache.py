@@ -0,0 +1,196 @@
+import asyncio
+
+import aiosqlite
+import pytest
+
+import app.db.database as db_module
+from app.ai.cache import OptimizationCache
+from app.models import DetectedPattern, PatternSeverity
+
+CODE = "void f() { int* p = new int[4]; }\n"
+
+
+def _pattern(line: int, name: str = "Memory Allocation in Loop") -> DetectedPattern:
+    return DetectedPattern(
+        pattern_id="excessive_alloc",
+        name=name,
+        severity=PatternSeverity.HIGH,
+        line_start=line,
+        line_end=line + 2,
+        description="d",
+        suggestion="s",
+        estimated_energy_cost=80.0,
+        estimated_energy_saved=50.0,
+    )
+
+
+@pytest.fixture
+def counting_provider(fake_provider):
+    """``counting_provider(**kwargs)``: each optimization appends ``// v<n>``."""
+    return lambda **kwargs: fake_provider(suffix="// v{n}\n", model="m1", **kwargs)
+
+
+def _cache(**kwargs) -> OptimizationCache:
+    return OptimizationCache(
+        enabled=True,
+        ttl_seconds=kwargs.get("ttl_seconds", 3600),
+        max_rows=kwargs.get("max_rows", 100),
+    )
+
+
+def test_repeat_optimization_is_served_from_cache(temp_db, counting_provider):
+    cache, provider = _cache(), counting_provider()
+
+    async def scenario():
+        first = await cache.optimize(provider, "p", CODE, [_pattern(1)], "cpp")
+        second = await cache.optimize(provider, "p", CODE, [_pattern(1)], "cpp")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == second
+    assert provider.calls == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_key_ignores_finding_order_but_not_content():
+    a, b = _pattern(1), _pattern(5, "Network Call Inside Loop")
+    key = OptimizationCache.key("p", "m", CODE, [a, b], "cpp")
+    assert key == OptimizationCache.key("p", "m", CODE, [b, a], "cpp")
+    assert key != OptimizationCache.key("p", "m", CODE, [a], "cpp")
+    assert key != OptimizationCache.key("p", "m2", CODE, [a, b], "cpp")
+    assert key != OptimizationCache.key("q", "m", CODE, [a, b], "cpp")
+    assert key != OptimizationCache.key("p", "m", CODE + " ", [a, b], "cpp")
+
+
+def test_bypass_skips_lookup_and_refreshes(temp_db, counting_provider):
+    cache, provider = _cache(), counting_provider()
+
+    async def scenario():
+        await cache.optimize(provider, "p", CODE, [_pattern(1)], "cpp")
+        fresh = await cache.optimize(provider, "p", CODE, [_pattern(1)], "cpp", bypass=True)
+        again = await cache.optimize(provider, "p", CODE, [_pattern(1)], "cpp")
+        return fresh, again
+
+    fresh, again = asyncio.run(scenario())
+    assert provider.calls == 2
+    assert again == fresh
+
+
+def test_bypass_does_not_join_a_cached_lookup(temp_db, counting_provider):
+    cache, provider = _cache(), counting_provider()
+
+    async def scenario():
+        cached = await cache.optimize(provider, "p", CODE, [_pattern(1)], "cpp")
+        # Started together: the plain call answers from the cache, the
+        # bypass call must still generate.
+        plain, fresh = await asyncio.gather(
+            cache.optimize(provider, "p", CODE, [_pattern(1)], "cpp"),
+            cache.optimize(provider, "p", CODE, [_pattern(1)], "cpp", bypass=True),
+        )
+        return cached, plain, fresh
+
+    cached, plain, fresh = asyncio.run(scenario())
+    assert plain == cached
+    assert fresh.optimized_code.endswith("// v2\n")
+    assert provider.calls == 2
+
+
+def test_failed_results_are_not_cached(temp_db, counting_provider):
+    cache, provider = _cache(), counting_provider(degraded=True)
+
+    async def scenario():
+        for _ in range(2):
+            await cache.optimize(provider, "p", CODE, [_pattern(1)], "cpp")
+
+    asyncio.run(scenario())
+    assert provider.calls == 2
+
+
+def test_ttl_and_size_eviction(temp_db, counting_provider):
+    provider = counting_provider()
+
+    async def rows():
+        async with aiosqlite.connect(db_module.DB_PATH) as db:
+            cursor = await db.execute("SELECT COUNT(*) FROM optimization_cache")
+            return (await cursor.fetchone())[0]
+
+    async def scenario():
+        cache = _cache(max_rows=2)
+        for line in range(1, 5):
+            await cache.optimize(provider, "p", CODE, [_pattern(line)], "cpp")
+        assert await rows() == 2
+
+        # Age every entry past a 60s TTL: lookups miss and the next write
+        # drops them.
+        async with aiosqlite.connect(db_module.DB_PATH) as db:
+            await db.execute(
+                "UPDATE optimization_cache SET created_at = datetime('now', '-120 seconds')"
+            )
+            await db.commit()
+        short = _cache(ttl_seconds=60)
+        await short.optimize(provider, "p", CODE, [_pattern(4)], "cpp")
+        assert short.misses == 1
+        assert await rows() == 1
+
+    asyncio.run(scenario())
+    assert provider.calls == 5
+
+
+def test_concurrent_identical_requests_share_one_generation(temp_db, counting_provider):
+    provider = counting_provider(delay=0.1)
+    # Coalescing does not depend on the persistent cache.
+    cache = OptimizationCache(enabled=False, ttl_seconds=3600, max_rows=100)
+
+    async def scenario():
+        same = [cache.optimize(provider, "p", CODE, [_pattern(1)], "cpp") for _ in range(5)]
+        other = cache.optimize(provider, "p", CODE, [_pattern(2)], "cpp")
+        results = await asyncio.gather(*same, other)
+        # Released once done: a later call generates again.
+        again = await cache.optimize(provider, "p", CODE, [_pattern(1)], "cpp")
+        return results, again
+
+    results, again = asyncio.run(scenario())
+    assert provider.calls == 3
+    assert all(r is results[0] for r in results[:5])
+    assert results[5] is not results[0]
+    assert again.optimized_code.endswith("// v3\n")
+
+
+def test_coalesced_work_survives_a_cancelled_caller(temp_db, counting_provider):
+    cache, provider = _cache(), counting_provider(delay=0.1)
+
+    async def scenario():
+        first = asyncio.create_task(cache.optimize(provider, "p", CODE, [_pattern(1)], "cpp"))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(cache.optimize(provider, "p", CODE, [_pattern(1)], "cpp"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    result = asyncio.run(scenario())
+    assert result.optimized_code.endswith("// v1\n")
+    assert provider.calls == 1
+
+
+def test_hit_touches_last_used_only_when_stale(temp_db):
+    async def last_used(db):
+        cursor = await db.execute("SELECT last_used FROM optimization_cache WHERE key = 'k'")
+        return (await cursor.fetchone())[0]
+
+    async def run():
+        await db_module.save_cached_optimization("k", "{}", ttl_seconds=3600, max_rows=10)
+        async with aiosqlite.connect(db_module.DB_PATH) as db:
+            await db.execute(
+                "UPDATE optimization_cache SET last_used = datetime('now', '-60 seconds')"
+            )
+            await db.commit()
+            recent = await last_used(db)
+            await db_module.get_cached_optimization("k", 3600, touch_after_seconds=300)
+            untouched = await last_used(db)
+            await db_module.get_cached_optimization("k", 3600, touch_after_seconds=30)
+            touched = await last_used(db)
+        return recent, untouched, touched
+
+    recent, untouched, touched = asyncio.run(run())
+    assert untouched == recent
+    assert touched > recent
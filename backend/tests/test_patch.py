@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from app.ai.optimizer import choose_mode, run_optimization
+from app.ai.patch import (
+    Hunk,
+    PatchError,
+    apply_hunks,
+    editable_regions,
+    parse_hunks,
+)
+from app.config import settings
+from app.models import DetectedPattern, PatternSeverity
+
+CODE = "\n".join(f"line {i}" for i in range(1, 61))
+
+
+def _pattern(start: int, end: int) -> DetectedPattern:
+    return DetectedPattern(
+        pattern_id="inefficient_sorting",
+        name="Nested Loop",
+        severity=PatternSeverity.HIGH,
+        line_start=start,
+        line_end=end,
+        description="d",
+        suggestion="s",
+        estimated_energy_cost=80.0,
+        estimated_energy_saved=50.0,
+    )
+
+
+@pytest.fixture
+def patch_provider(fake_provider):
+    """``patch_provider(raw)``: completions answer ``raw``; a full-file
+    regeneration appends ``// FULL``."""
+    return lambda raw: fake_provider(reply=raw, suffix="\n// FULL")
+
+
+def test_editable_regions_merge_header_and_context():
+    regions = editable_regions(60, [_pattern(30, 32), _pattern(36, 37), _pattern(17, 18)])
+    assert regions == [(1, 21), (27, 40)]
+
+
+def test_parse_hunks_strips_echoed_line_numbers():
+    raw = "CHAIN OF THOUGHT:\nx\nHUNKS:\n@@ 30-31 @@\n```cpp\n   30| a\n   31| b\n```\n"
+    assert parse_hunks(raw) == [Hunk(30, 31, ["a", "b"])]
+
+
+def test_apply_hunks_bottom_up_with_length_changes():
+    regions = editable_regions(60, [_pattern(30, 32)])
+    patched = apply_hunks(
+        CODE, [Hunk(30, 32, ["new"]), Hunk(1, 1, ["#include <x>", "line 1"])], regions
+    )
+    lines = patched.split("\n")
+    assert lines[:2] == ["#include <x>", "line 1"]
+    assert lines[30] == "new" and lines[31] == "line 33"
+    assert len(lines) == 59
+
+
+@pytest.mark.parametrize(
+    "hunks",
+    [
+        [],
+        [Hunk(58, 61, [])],  # past the end of the file
+        [Hunk(45, 46, [])],  # outside every region
+        [Hunk(29, 31, []), Hunk(31, 33, [])],  # overlapping
+    ],
+)
+def test_apply_hunks_rejects_invalid(hunks):
+    with pytest.raises(PatchError):
+        apply_hunks(CODE, hunks, editable_regions(60, [_pattern(30, 32)]))
+
+
+def test_patch_mode_applies_hunks(patch_provider):
+    raw = (
+        "CHAIN OF THOUGHT:\nuse sort\n\nCHANGES SUMMARY:\n- sorted\n\n"
+        "HUNKS:\n@@ 30-32 @@\n```cpp\nstd::sort(v.begin(), v.end());\n```\n"
+    )
+    provider = patch_provider(raw)
+    result = asyncio.run(run_optimization(provider, CODE, [_pattern(30, 32)], "cpp", "patch"))
+    assert result.optimized_code.split("\n")[29] == "std::sort(v.begin(), v.end());"
+    assert result.chain_of_thought == "use sort"
+    assert result.changes_summary == "- sorted"
+    assert provider.optimize_calls == 0
+
+
+def test_invalid_patch_falls_back_to_full(patch_provider):
+    provider = patch_provider("HUNKS:\n@@ 50-51 @@\n```cpp\nx\n```\n")
+    result = asyncio.run(run_optimization(provider, CODE, [_pattern(30, 32)], "cpp", "patch"))
+    assert result.optimized_code == CODE + "\n// FULL"
+    assert provider.optimize_calls == 1
+
+
+def test_default_mode_is_full_file_unless_requested(monkeypatch):
+    monkeypatch.setattr(settings, "AI_PATCH_MIN_LINES", 50)
+    assert settings.AI_OUTPUT_MODE == "full"
+    assert choose_mode(CODE, [_pattern(30, 32)]) == "full"
+    assert choose_mode(CODE, [_pattern(30, 32)], "auto") == "patch"
+
+
+def test_choose_mode(monkeypatch):
+    monkeypatch.setattr(settings, "AI_OUTPUT_MODE", "auto")
+    monkeypatch.setattr(settings, "AI_PATCH_MIN_LINES", 50)
+    assert choose_mode(CODE, [_pattern(30, 32)]) == "patch"
+    assert choose_mode("short", []) == "full"
+    assert choose_mode(CODE, [_pattern(30, 32)], "full") == "full"
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import httpx
+import pytest
+from app.ai import provider as provider_module
+from app.ai.ollama_provider import OllamaProvider
+from app.ai.provider import (
+    SECTIONS,
+    IncrementalResponseParser,
+    ProviderLimiter,
+    ProviderRegistry,
+    parse_ai_response,
+)
+from app.models import DetectedPattern, PatternSeverity
+
+PATTERN = DetectedPattern(
+    pattern_id="inefficient_sort",
+    name="O(n²) Bubble Sort Pattern",
+    severity=PatternSeverity.HIGH,
+    line_start=1,
+    line_end=3,
+    description="d",
+    suggestion="s",
+    estimated_energy_cost=85.0,
+    estimated_energy_saved=60.0,
+)
+
+RESPONSE = "CHAIN OF THOUGHT:\nok\n\nCHANGES SUMMARY:\n- x\n\nOPTIMIZED CODE:\n```cpp\nint y;\n```"
+
+
+class _CountingOllama(OllamaProvider):
+    def __init__(self):
+        super().__init__()
+        self.clients = []
+        self.requests = 0
+
+    def _new_client(self):
+        def handler(request):
+            self.requests += 1
+            return httpx.Response(200, json={"response": RESPONSE})
+
+        client = httpx.AsyncClient(
+            base_url="http://ollama", transport=httpx.MockTransport(handler)
+        )
+        self.clients.append(client)
+        return client
+
+
+def test_registry_returns_the_same_provider():
+    registry = ProviderRegistry()
+    assert registry.get("ollama") is registry.get("ollama")
+    assert registry.get("ollama") is not registry.get("claude")
+    with pytest.raises(ValueError):
+        registry.get("nope")
+
+
+def test_client_is_reused_across_calls_and_closed():
+    provider = _CountingOllama()
+
+    async def scenario():
+        for _ in range(3):
+            result = await provider.optimize_code("int x;", [PATTERN], "cpp")
+            assert result.optimized_code == "int y;"
+        await provider.aclose()
+
+    asyncio.run(scenario())
+    assert provider.requests == 3
+    assert len(provider.clients) == 1
+    assert provider.clients[0].is_closed
+
+
+def test_new_event_loop_gets_a_new_client():
+    provider = _CountingOllama()
+
+    async def call():
+        await provider.optimize_code("int x;", [PATTERN], "cpp")
+
+    asyncio.run(call())
+    asyncio.run(call())
+    assert len(provider.clients) == 2
+
+
+def test_registry_aclose_closes_every_provider(monkeypatch):
+    created = []
+
+    def create(name):
+        created.append(_CountingOllama())
+        return created[-1]
+
+    monkeypatch.setattr(provider_module, "_create_provider", create)
+    registry = ProviderRegistry()
+
+    async def scenario():
+        registry.warm("ollama")
+        await registry.get("ollama").optimize_code("int x;", [PATTERN], "cpp")
+        await registry.aclose()
+
+    asyncio.run(scenario())
+    assert len(created) == 1
+    assert len(created[0].clients) == 1
+    assert created[0].clients[0].is_closed
+
+
+def test_limiter_bounds_concurrency_and_spaces_calls():
+    limiter = ProviderLimiter(max_concurrency=2, per_minute=600)  # 0.1s apart
+    state = {"active": 0, "peak": 0}
+    starts = []
+
+    async def call():
+        async with limiter:
+            starts.append(asyncio.get_running_loop().time())
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            await asyncio.sleep(0.05)
+            state["active"] -= 1
+
+    async def scenario():
+        await asyncio.gather(*(call() for _ in range(4)))
+
+    asyncio.run(scenario())
+    assert state["peak"] <= 2
+    gaps = [b - a for a, b in zip(starts, starts[1:])]
+    assert all(gap >= 0.09 for gap in gaps)
+
+
+def _feed_all(parser, text, size):
+    events = []
+    for i in range(0, len(text), size):
+        events.append((i + size, parser.feed(text[i:i + size])))
+    return events
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 64, 10_000])
+def test_incremental_parser_matches_full_parse(size):
+    raw = (
+        "Sure.\nCHAIN OF THOUGHT:\nUse std::sort.\n\n"
+        "CHANGES SUMMARY:\n- replaced bubble sort\n\n"
+        "OPTIMIZED CODE:\n```cpp\n#include <algorithm>\nvoid f() {}\n```\nDone."
+    )
+    parser = IncrementalResponseParser()
+    events = _feed_all(parser, raw, size)
+    rest, result = parser.close()
+    assert result == parse_ai_response(raw)
+    sections = [pair for _, ready in events for pair in ready] + rest
+    assert [name for name, _ in sections] == list(SECTIONS)
+    assert dict(sections) == {
+        "chain_of_thought": result.chain_of_thought,
+        "changes_summary": result.changes_summary,
+        "optimized_code": result.optimized_code,
+    }
+    if size < len(raw):
+        # Each section is sent as soon as it is complete, before the end.
+        sent_at = {name: end for end, ready in events for name, _ in ready}
+        assert sent_at["chain_of_thought"] <= raw.index("CHANGES SUMMARY:") + 16 + size
+        assert sent_at["optimized_code"] < raw.rindex("```") + 3 + size
+
+
+def test_incremental_parser_falls_back_at_close():
+    parser = IncrementalResponseParser()
+    assert parser.feed("just some code without headers") == []
+    rest, result = parser.close()
+    assert result.optimized_code == "just some code without headers"
+    assert dict(rest)["chain_of_thought"] == "AI reasoning not available."
+
+
+def test_ollama_stream_completion_yields_deltas():
+    lines = [
+        {"response": "CHAIN OF THOUGHT:\n", "done": False},
+        {"response": "ok", "done": False},
+        {"response": "", "done": True},
+    ]
+
+    class StreamingOllama(OllamaProvider):
+        def _new_client(self):
+            body = "\n".join(json.dumps(line) for line in lines).encode()
+            return httpx.AsyncClient(
+                base_url="http://ollama",
+                transport=httpx.MockTransport(lambda request: httpx.Response(200, content=body)),
+            )
+
+    async def collect():
+        provider = StreamingOllama()
+        return [d async for d in provider.stream_completion("int x;", [PATTERN], "cpp")]
+
+    assert asyncio.run(collect()) == ["CHAIN OF THOUGHT:\n", "ok"]
@@ -0,0 +1,135 @@
+from app.analyzer.patterns.network import NetworkPatternDetector
+from app.analyzer.patterns.sorting import SortingPatternDetector
+from app.analyzer.python_ast import collect
+from app.analyzer.source import SourceModel
+
+
+def _names(patterns):
+    return [p.name for p in patterns]
+
+
+def test_collect_returns_none_on_syntax_error():
+    assert collect("for i in range(n)\n    pass\n") is None
+
+
+def test_collect_loops_and_calls():
+    code = """
+for url in urls:
+    while True:
+        requests.get(url)
+        time.sleep(1)
+else:
+    requests.get(done)
+"""
+    facts = collect(code)
+    outer, inner = facts.loops
+    assert (outer.line, outer.end, outer.parent, outer.has_inner) == (2, 5, None, True)
+    assert (inner.line, inner.end, inner.parent, inner.infinite) == (3, 5, 0, True)
+    # The else: clause runs once, outside the loop body.
+    assert facts.network_calls == {0: [4], 1: [4]}
+    assert facts.sleep_calls == {0: [5], 1: [5]}
+
+
+def test_network_call_on_continuation_line():
+    code = """
+for item in items:
+    total = compute(
+        item,
+        requests.get(
+            item.url,
+        ),
+    )
+
+print("done")
+"""
+    patterns = NetworkPatternDetector().detect(code, "python")
+    assert _names(patterns) == ["Network Call Inside Loop"]
+    assert (patterns[0].line_start, patterns[0].line_end) == (2, 8)
+    assert "line(s) 5." in patterns[0].description
+
+
+def test_network_keywords_in_strings_and_comments_ignored():
+    code = '''
+for item in items:
+    log("requests.get(url) would be slow here")  # requests.get(x)
+    while_true = "while True:"
+'''
+    assert NetworkPatternDetector().detect(code, "python") == []
+
+
+def test_polling_nested_in_function():
+    code = """
+async def watch(session):
+    while 1:
+        resp = await self.session.get(STATUS_URL)
+        await asyncio.sleep(5)
+"""
+    patterns = NetworkPatternDetector().detect(code, "python")
+    assert "Polling Instead of Event-Driven" in _names(patterns)
+
+
+def test_duplicate_urls_from_ast():
+    code = """
+a = requests.get("https://api.example.com/users")
+b = requests.get(
+    "https://api.example.com/users"
+)
+c = requests.get("https://api.example.com/users" + suffix)
+"""
+    patterns = NetworkPatternDetector().detect(code, "python")
+    dupes = [p for p in patterns if p.name == "Duplicate Network Calls"]
+    assert len(dupes) == 1
+    assert "at lines 2, 3." in dupes[0].description
+
+
+def test_python_bubble_sort_detected():
+    code = """
+def bubble(arr):
+    n = len(arr)
+    for i in range(n):
+        for j in range(n - i - 1):
+            if arr[j] > arr[j + 1]:
+                arr[j], arr[j + 1] = arr[j + 1], arr[j]
+    return arr
+"""
+    patterns = SortingPatternDetector().detect(code, "python")
+    assert _names(patterns) == ["O(n²) Bubble Sort Pattern"]
+    assert (patterns[0].line_start, patterns[0].line_end) == (4, 7)
+    assert "sorted()" in patterns[0].suggestion
+
+
+def test_python_nested_iteration_detected():
+    code = """
+for a in xs:
+    for b in range(len(ys)):
+        pairs.append((a, b))
+"""
+    patterns = SortingPatternDetector().detect(code, "python")
+    assert _names(patterns) == ["O(n²) Nested Loop Iteration"]
+
+
+def test_syntax_error_falls_back_to_regex():
+    # Python 2 print statement: no AST, the regex rules still apply.
+    code = """
+print "polling"
+for url in urls:
+    response = requests.get(url)
+"""
+    source = SourceModel.build(code, "python")
+    assert source.python_facts is None
+    patterns = NetworkPatternDetector().detect_source(source)
+    assert _names(patterns) == ["Network Call Inside Loop"]
+
+
+def test_ast_path_respects_scope():
+    code = """
+for a in xs:
+    requests.get(a)
+
+for b in ys:
+    requests.get(b)
+"""
+    source = SourceModel.build(code, "python")
+    source.scope = [(4, 6)]
+    patterns = NetworkPatternDetector().detect_source(source)
+    assert [p.line_start for p in patterns] == [5]
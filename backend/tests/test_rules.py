@@ -0,0 +1,104 @@
+from app.analyzer.engine import AnalysisEngine
+from app.analyzer.patterns.base import PatternDetector
+from app.analyzer.patterns.memory import MemoryPatternDetector
+from app.analyzer.patterns.network import NetworkPatternDetector
+from app.analyzer.patterns.sorting import SortingPatternDetector
+from app.analyzer.source import KeywordIndex, SourceModel
+
+
+class RecordingDetector(PatternDetector):
+    def __init__(self, keywords=None):
+        self._keywords = keywords
+        self.calls = 0
+
+    @property
+    def pattern_id(self) -> str:
+        return "recording"
+
+    def keywords(self, language):
+        return self._keywords
+
+    def detect_source(self, source):
+        self.calls += 1
+        return []
+
+
+def test_keyword_index_marks_lines():
+    index = KeywordIndex(["for", "new", "malloc"])
+    hits = index.scan("int a;\nfor (;;) {\n  p = new int; q = malloc(1);\n}\nfor")
+    assert hits == {"for": [1, 4], "new": [2], "malloc": [2]}
+
+
+def test_keyword_index_aliases_contained_keywords():
+    index = KeywordIndex(["send", "sendto"])
+    hits = index.scan("sendto(x);\nsend(y);\n")
+    assert hits["send"] == [0, 1]
+    assert hits["sendto"] == [0, 1]  # superset; the full regex decides
+
+
+def test_keyword_index_overlapping_keywords():
+    index = KeywordIndex(["http.request", "requests."])
+    hits = index.scan("http.requests.get(u)\n")
+    assert hits["http.request"] == [0]
+    assert hits["requests."] == [0]
+
+
+def test_candidates_without_engine_index():
+    source = SourceModel.build("a\n// for\nfor x\n", "cpp")
+    # Comment lines are blanked before the prefilter runs.
+    assert source.candidates(["for"]) == [2]
+
+
+def test_clean_file_skips_all_detectors():
+    gated = RecordingDetector(frozenset({"malloc"}))
+    engine = AnalysisEngine()
+    engine.register(gated)
+    assert engine.analyze("int main() { return 0; }", "cpp") == []
+    assert gated.calls == 0
+
+
+def test_only_detectors_with_hits_run():
+    hit = RecordingDetector(frozenset({"malloc"}))
+    miss = RecordingDetector(frozenset({"curl_easy_perform"}))
+    unsupported = RecordingDetector(frozenset())
+    always = RecordingDetector(None)
+    engine = AnalysisEngine()
+    for d in (hit, miss, unsupported, always):
+        engine.register(d)
+    engine.analyze("void f() { char* p = malloc(4); }", "cpp")
+    assert (hit.calls, miss.calls, unsupported.calls, always.calls) == (1, 0, 0, 1)
+
+
+def test_engine_results_match_unfiltered_detectors():
+    code = """
+#include <curl/curl.h>
+void f(std::vector<int>& v) {
+    for (int i = 0; i < v.size(); i++) {
+        for (int j = 0; j < v.size(); j++) {
+            int temp = v[i];
+            v[i] = v[j];
+            v[j] = temp;
+        }
+    }
+    while (true) {
+        curl_easy_perform(curl);
+        sleep(1);
+    }
+    for (int k = 0; k < 3; k++) {
+        char* b = (char*)malloc(8);
+    }
+}
+"""
+    detectors = [
+        SortingPatternDetector(),
+        MemoryPatternDetector(),
+        NetworkPatternDetector(),
+    ]
+    engine = AnalysisEngine()
+    for d in detectors:
+        engine.register(d)
+    expected = [p for d in detectors for p in d.detect(code, "cpp")]
+    assert engine.analyze(code, "cpp") == expected
+    assert {p.pattern_id for p in expected} >= {
+        "inefficient_sort", "excessive_alloc", "memory_leak", "polling_pattern",
+    }
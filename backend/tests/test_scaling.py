@@ -0,0 +1,97 @@
+"""Analysis time must grow linearly with file length.
+
+Before the loop-span index, every loop header rescanned forward to find
+its body, so deep nesting or unmatched braces made analysis quadratic.
+"""
+
+import time
+
+import pytest
+
+
+# Quadratic behaviour already shows at these sizes; the slow run (pytest
+# --runslow) also checks the decades up to a million lines.
+SIZES = (2_000, 20_000)
+SLOW_SIZES = (10_000, 100_000, 1_000_000)
+
+# Allowed slowdown per 10x more lines (10 is perfectly linear; quadratic
+# would be 100).
+MAX_GROWTH_PER_DECADE = 25
+
+_CPP_UNIT = """void f(int n) {
+    for (int i = 0; i < n; i++) {
+        for (int j = 0; j < n; j++) {
+            a[j] = b[i];
+        }
+    }
+    while (x) { x--; }
+}
+"""
+
+_PY_UNIT = """def f(urls):
+    for url in urls:
+        for part in url:
+
+            total += len(part)
+    return total
+"""
+
+
+def _repeat(unit: str, lines: int) -> str:
+    return unit * (lines // unit.count("\n"))
+
+
+def _deeply_nested(lines: int) -> str:
+    # Every line opens a loop that is never closed.
+    return "for (;;) {\n" * lines
+
+
+@pytest.fixture(scope="module")
+def engine(make_engine):
+    return make_engine()
+
+
+def _timed(engine, code: str, language: str) -> float:
+    best = float("inf")
+    # Small inputs are noisy; take the best of a few runs.
+    for _ in range(3 if len(code) < 1_000_000 else 1):
+        start = time.perf_counter()
+        engine.analyze(code, language)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _assert_linear(engine, make_code, language, sizes) -> None:
+    timings = [_timed(engine, make_code(n), language) for n in sizes]
+    for smaller, larger in zip(timings, timings[1:]):
+        assert larger / max(smaller, 1e-4) < MAX_GROWTH_PER_DECADE, timings
+
+
+CASES = pytest.mark.parametrize(
+    "make_code,language",
+    [
+        (lambda n: _repeat(_CPP_UNIT, n), "cpp"),
+        (lambda n: _repeat(_PY_UNIT, n), "python"),
+        (_deeply_nested, "cpp"),
+    ],
+    ids=["cpp-many-loops", "python-many-loops", "cpp-unmatched-nesting"],
+)
+
+
+@CASES
+def test_analysis_time_grows_linearly(engine, make_code, language):
+    _assert_linear(engine, make_code, language, SIZES)
+
+
+@pytest.mark.slow
+@CASES
+def test_analysis_time_grows_linearly_up_to_a_million_lines(engine, make_code, language):
+    _assert_linear(engine, make_code, language, SLOW_SIZES)
+
+
+def test_unmatched_loop_body_runs_to_end_of_file(engine):
+    code = "void f() {\n    for (int i = 0; i < n; i++) {\n        int* p = new int;\n"
+    patterns = engine.analyze(code, "cpp")
+    alloc = [p for p in patterns if p.pattern_id == "excessive_alloc"]
+    assert len(alloc) == 1
+    assert alloc[0].line_end == len(code.split("\n"))
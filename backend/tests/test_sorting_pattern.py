@@ -64,9 +64,8 @@ for i in range(n):
         if arr[i] > arr[j]:
             arr[i], arr[j] = arr[j], arr[i]
 """
-    # Python detection not implemented for sorting yet
+    # Python goes through the AST backend (see test_python_ast.py)
     patterns = detector.detect(code, "python")
-    # Should not crash, may or may not detect
     assert isinstance(patterns, list)
 
 
@@ -0,0 +1,75 @@
+from app.analyzer.engine import AnalysisEngine
+from app.analyzer.patterns.memory import MemoryPatternDetector
+from app.analyzer.patterns.sorting import SortingPatternDetector
+from app.analyzer.source import SourceModel
+
+
+def test_braces_in_strings_and_comments_ignored():
+    code = """
+void f() {
+    const char* s = "{{{";
+    char c = '{';
+    // } stray brace in a comment
+    /* { another
+       } */
+}
+"""
+    source = SourceModel.build(code, "cpp")
+    assert source.depth[-1] == 0
+    assert max(source.depth) == 1
+
+
+def test_masked_views_keep_line_numbers():
+    code = 'int a; /* multi\nline */ int b;\nputs("x // y");'
+    source = SourceModel.build(code, "cpp")
+    assert len(source.code_lines) == len(source.lines) == 3
+    assert source.code_lines[1].strip() == "int b;"
+    assert "x // y" in source.text_lines[2]
+    assert "x" not in source.code_lines[2].replace("puts", "")
+
+
+def test_python_comments_and_strings_masked():
+    code = 'x = "for (i)"  # for (j)\nfor i in y:\n    pass'
+    source = SourceModel.build(code, "python")
+    assert "for" not in source.code_lines[0]
+    assert "for (i)" in source.text_lines[0]
+    assert "# for" not in source.text_lines[0]
+
+
+def test_comment_only_mask():
+    source = SourceModel.build("int a;\n// note\n\n", "cpp")
+    assert not source.is_comment_only(0)
+    assert source.is_comment_only(1)
+    assert not source.is_comment_only(2)
+
+
+def test_string_brace_does_not_extend_loop():
+    code = """
+void f(int n) {
+    for (int i = 0; i < n; i++) {
+        puts("{");
+    }
+    int* leak = new int[4];
+}
+"""
+    patterns = MemoryPatternDetector().detect(code, "cpp")
+    assert not [p for p in patterns if p.pattern_id == "excessive_alloc"]
+
+
+def test_engine_matches_individual_detectors():
+    code = """
+void sort(int arr[], int n) {
+    for (int i = 0; i < n; i++) {
+        for (int j = 0; j < n; j++) {
+            int* tmp = new int[1];
+            std::swap(arr[i], arr[j]);
+        }
+    }
+}
+"""
+    detectors = [SortingPatternDetector(), MemoryPatternDetector()]
+    engine = AnalysisEngine()
+    for d in detectors:
+        engine.register(d)
+    expected = [p for d in detectors for p in d.detect(code, "cpp")]
+    assert engine.analyze(code, "cpp") == expected
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import tracemalloc
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.analyzer.stream import StreamAnalysis, TopLevelSegmenter
+
+CPP_UNIT = """/* helper
+   with { a brace in a comment */
+void f%d(int n) {
+    for (int i = 0; i < n; i++) {
+        for (int j = 0; j < n - 1; j++) {
+            std::swap(a[j], a[j + 1]);
+        }
+        int* p = new int[4];
+    }
+    curl_easy_setopt(c, CURLOPT_URL("https://api.example.com/x"));
+}
+"""
+
+LOOP_UNIT = """void g%d(int n) {
+    for (int i = 0; i < n; i++) {
+        for (int j = 0; j < n; j++) { a[j] = b[i]; }
+        int* p = new int[4];
+    }
+}
+"""
+
+PY_UNIT = '''def f%d(urls):
+    """Docstring
+for x in fake:
+    """
+    for url in urls:
+        requests.get(url)
+    return 1
+
+'''
+
+
+def key(p):
+    return (p.line_start, p.line_end, p.pattern_id, p.description)
+
+
+async def chunked(text: str, size: int):
+    for i in range(0, len(text), size):
+        yield text[i:i + size].encode()
+
+
+def stream_patterns(engine, code, language, chunk=997, segment_lines=40):
+    async def collect():
+        stream = StreamAnalysis(engine, language, segment_lines, segment_lines * 4)
+        patterns = [p async for p in stream.run(chunked(code, chunk))]
+        return patterns, stream.total_lines
+
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize("unit,language", [(CPP_UNIT, "cpp"), (PY_UNIT, "python")])
+def test_stream_matches_full_analysis(engine, unit, language):
+    code = "".join(unit % i for i in range(60))
+    patterns, total_lines = stream_patterns(engine, code, language)
+    assert total_lines == len(code.split("\n"))
+    assert sorted(patterns, key=key) == sorted(engine.analyze(code, language), key=key)
+
+
+def test_file_scoped_state_spans_segments(engine):
+    allocs = "void a() {\n    int* p = new int[4];\n}\n" * 30
+    frees = "void b() {\n    delete[] p;\n}\n" * 30
+    patterns, _ = stream_patterns(engine, allocs + frees, "cpp", segment_lines=10)
+    assert not any(p.pattern_id == "memory_leak" for p in patterns)
+
+
+def test_segments_never_start_inside_comment():
+    segmenter = TopLevelSegmenter("cpp", segment_lines=4, max_segment_lines=1000)
+    code = "int a;\n/*\n" + "x\n" * 20 + "*/\nint b;\nint c;\n"
+    segments = segmenter.feed(code) + segmenter.close()
+    assert "\n".join(s for _, s in segments) == code
+    for _, segment in segments:
+        assert segment.count("/*") == segment.count("*/")
+
+
+def test_peak_memory_does_not_grow_with_file_size(engine):
+
+    async def peak(units: int) -> int:
+        async def chunks():
+            for i in range(units):
+                yield (LOOP_UNIT % i).encode()
+
+        tracemalloc.start()
+        async for _ in StreamAnalysis(engine, "cpp", 200, 800).run(chunks()):
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak
+
+    # Findings are yielded, not kept; file-scoped state here is a few
+    # counters (duplicate-URL state would grow with the number of calls).
+    small, large = asyncio.run(peak(500)), asyncio.run(peak(5000))
+    assert large < small * 3
+
+
+def test_stream_endpoint_emits_ndjson(engine):
+    from app.main import app as fastapi_app
+
+    fastapi_app.state.engine = engine
+    client = TestClient(fastapi_app)
+    code = "".join(CPP_UNIT % i for i in range(5))
+    response = client.post(
+        "/api/analyze/stream?filename=big.c&language=cpp", content=code.encode()
+    )
+    assert response.status_code == 200
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert records[-1]["event"] == "summary"
+    assert records[-1]["lines"] == len(code.split("\n"))
+    findings = [r for r in records if r["event"] == "finding"]
+    assert records[-1]["patterns_count"] == len(findings) > 0
+
+    upload = client.post(
+        "/api/analyze/upload?language=cpp",
+        files={"file": ("big.c", code.encode())},
+        data={"note": "ignored"},
+    )
+    assert [json.loads(l) for l in upload.text.splitlines()][-1] == records[-1]
+
+
+def test_stream_endpoint_ends_with_error_when_engine_stays_saturated(engine, monkeypatch):
+    from app.analyzer.engine import EngineSaturated
+    from app.config import settings
+    from app.main import app as fastapi_app
+
+    calls = []
+
+    async def saturated_after_first(code, language):
+        calls.append(code)
+        if len(calls) > 1:
+            raise EngineSaturated(retry_after=0)
+        return engine.analyze_segment(code, language)
+
+    monkeypatch.setattr(engine, "analyze_segment_async", saturated_after_first)
+    monkeypatch.setattr(settings, "ANALYSIS_SATURATED_MAX_WAIT_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "STREAM_SEGMENT_LINES", 40)
+    fastapi_app.state.engine = engine
+    code = "".join(CPP_UNIT % i for i in range(20))
+    response = TestClient(fastapi_app).post(
+        "/api/analyze/stream?filename=big.c&language=cpp", content=code.encode()
+    )
+    assert response.status_code == 200
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert records[-1]["event"] == "error"
+    assert records[-1]["filename"] == "big.c"
+    assert all(r["event"] != "summary" for r in records)
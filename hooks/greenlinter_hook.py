@@ -5,12 +5,15 @@ import json
 import os
 import subprocess
 import sys
+import time
 import urllib.request
 import urllib.error
 
 API_URL = os.environ.get("GREENLINTER_API_URL", "http://localhost:8000")
 ENABLED = os.environ.get("GREENLINTER_ENABLED", "true").lower() == "true"
+NO_CACHE = os.environ.get("GREENLINTER_NO_CACHE", "false").lower() == "true"
 PROVIDER = os.environ.get("GREENLINTER_PROVIDER", "") or os.environ.get("AI_PROVIDER", "ollama")
+TIMEOUT = float(os.environ.get("GREENLINTER_TIMEOUT", "180"))
 EXTENSIONS = (".cpp", ".hpp", ".cc", ".h", ".c")
 
 
@@ -30,20 +33,80 @@ def get_staged_content(filename):
     return result.stdout
 
 
-def call_api(files):
-    payload = json.dumps({
-        "files": [{"filename": f["filename"], "code": f["code"]} for f in files],
-        "provider": PROVIDER,
-    }).encode("utf-8")
+def git_rev(spec):
+    result = subprocess.run(
+        ["git", "rev-parse", "--verify", "-q", spec],
+        capture_output=True, text=True,
+    )
+    return result.stdout.strip() if result.returncode == 0 else ""
+
+
+def get_staged_diff(filename):
+    result = subprocess.run(
+        ["git", "diff", "--cached", "-U0", "HEAD", "--", filename],
+        capture_output=True, text=True,
+    )
+    return result.stdout
 
+
+def build_file_payload(filename):
+    """Send only the staged diff when the file exists in HEAD.
+
+    The server keeps file contents by blob SHA; if it does not know the base
+    it answers with ``needs_full_content`` and the file is resent in full.
+    """
+    base_sha = git_rev(f"HEAD:{filename}")
+    if base_sha:
+        return {
+            "filename": filename,
+            "base_sha": base_sha,
+            "new_sha": git_rev(f":{filename}"),
+            "diff": get_staged_diff(filename),
+        }
+    return {"filename": filename, "code": get_staged_content(filename)}
+
+
+def _request(method, path, body=None, timeout=30):
     req = urllib.request.Request(
-        f"{API_URL}/api/hook",
-        data=payload,
+        f"{API_URL}{path}",
+        data=json.dumps(body).encode("utf-8") if body is not None else None,
         headers={"Content-Type": "application/json"},
+        method=method,
     )
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read().decode())
+
+
+def call_api(files):
+    """Run the hook request as a background job and long-poll its result.
+
+    The server keeps (and caches) the result even if we give up after
+    TIMEOUT seconds. Servers without /api/jobs get the blocking /api/hook.
+    """
+    body = {
+        "files": files,
+        "provider": PROVIDER,
+        "no_cache": NO_CACHE,
+    }
     try:
-        with urllib.request.urlopen(req, timeout=180) as resp:
-            return json.loads(resp.read().decode())
+        try:
+            job = _request("POST", "/api/jobs", {"kind": "hook", "request": body})
+        except urllib.error.HTTPError as e:
+            if e.code != 404:
+                raise
+            return _request("POST", "/api/hook", body, timeout=TIMEOUT)
+
+        deadline = time.monotonic() + TIMEOUT
+        while job["status"] not in ("done", "failed"):
+            wait = min(30, deadline - time.monotonic())
+            if wait <= 0:
+                print(f"  Warning: GreenLinter job {job['id']} still running", file=sys.stderr)
+                return None
+            job = _request("GET", f"/api/jobs/{job['id']}?wait={wait:.0f}", timeout=wait + 30)
+        if job["status"] == "failed":
+            print(f"  Warning: GreenLinter job failed: {job['error']}", file=sys.stderr)
+            return None
+        return job["result"]
     except (urllib.error.URLError, TimeoutError) as e:
         print(f"  Warning: Could not reach GreenLinter API: {e}", file=sys.stderr)
         return None
@@ -61,9 +124,23 @@ def main():
     print("GreenLinter: Analyzing staged files for energy efficiency")
     print("=" * 60)
 
-    files = [{"filename": f, "code": get_staged_content(f)} for f in staged]
+    files = [build_file_payload(f) for f in staged]
     response = call_api(files)
 
+    if response:
+        resend = [
+            {"filename": r["filename"], "code": get_staged_content(r["filename"])}
+            for r in response.get("results", [])
+            if r.get("needs_full_content")
+        ]
+        if resend:
+            retry = call_api(resend)
+            if retry:
+                by_name = {r["filename"]: r for r in retry.get("results", [])}
+                response["results"] = [
+                    by_name.get(r["filename"], r) for r in response["results"]
+                ]
+
     if not response:
         print("  Skipping optimization (API unavailable)")
         sys.exit(0)
@@ -72,7 +149,9 @@ def main():
 
     for result in response.get("results", []):
         filename = result["filename"]
-        if result["had_issues"]:
+        if result.get("needs_full_content"):
+            print(f"  Skipped: {filename} (server could not analyze the diff)")
+        elif result["had_issues"]:
             had_optimizations = True
             # Write optimized code back to working tree
             with open(filename, "w") as f: